@@ -1,13 +1,264 @@
 import appdaemon.plugins.hass.hassapi as hass
-import datetime
+import collections
+import itertools
+import json
+import logging
+import logging.handlers
+import math
+import os
 import traceback
 
+# Stages of the overload reaction chain, from the phase sensor sample that
+# triggered the alert to the charging sensor confirming that charging stopped
+LATENCY_STAGES = ("detection", "delivery", "queue", "command", "confirmation", "total")
+
+
+class LatencyHistogram:
+    """
+    Latency histogram with logarithmic buckets.
+
+    Bucket i counts latencies up to min_latency * growth**i seconds, so percentiles
+    have the same relative resolution from milliseconds to minutes.
+    """
+
+    def __init__(self, min_latency=0.01, max_latency=3600.0, growth=1.25):
+        self.min_latency = min_latency
+        self.log_growth = math.log(growth)
+        self.bounds = [min_latency]
+        while self.bounds[-1] < max_latency:
+            self.bounds.append(self.bounds[-1] * growth)
+        self.counts = [0] * (len(self.bounds) + 1)  # The last bucket counts latencies over max_latency
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency):
+        """Count a latency in seconds."""
+        latency = max(latency, 0.0)
+        if latency <= self.min_latency:
+            index = 0
+        else:
+            index = min(math.ceil(math.log(latency / self.min_latency) / self.log_growth - 1e-9), len(self.bounds))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket holding the given percentile, or None without samples."""
+        if not self.count:
+            return None
+        rank = max(math.ceil(self.count * percent / 100), 1)
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        """Return count, mean, p50, p95, p99 and max rounded for publishing."""
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+        return {
+            "count": self.count,
+            "mean": rounded(self.total / self.count if self.count else None),
+            "p50": rounded(self.percentile(50)),
+            "p95": rounded(self.percentile(95)),
+            "p99": rounded(self.percentile(99)),
+            "max": rounded(self.max if self.count else None),
+        }
+
+
+class LoadForecaster:
+    """
+    Short-horizon forecast of the load on one phase that is not controlled by the app.
+
+    Two parts are trained incrementally with every sample:
+
+    - a least squares line over the last window seconds, kept as running sums so
+      adding and expiring a sample costs O(1), which follows a load that is ramping up
+    - a time-of-day profile of profile_bins bins, each the highest one-minute mean
+      load of the bin averaged over the past days (exponentially weighted with
+      profile_alpha), which knows about loads that recur at the same time every day
+      (cooking, a heat pump cycling in the morning) while ignoring inrush spikes
+    """
+
+    def __init__(self, window=600.0, profile_bins=96, profile_alpha=0.3, profile=None):
+        self.window = window
+        self.samples = collections.deque()
+        self.origin = None
+        self.sum_t = self.sum_y = self.sum_tt = self.sum_ty = 0.0
+        self.profile_bins = profile_bins
+        self.bin_seconds = 86400 / profile_bins
+        self.profile_alpha = profile_alpha
+        self.profile = list(profile) if profile and len(profile) == profile_bins else [None] * profile_bins
+        self.current_bin = None
+        self.bin_peak = None
+        self.current_minute = None
+        self.minute_sum = 0.0
+        self.minute_count = 0
+
+    def add(self, timestamp, value, seconds_of_day):
+        """Add a sample of the uncontrolled load in amperes."""
+        if self.origin is None or (self.samples and self.samples[0][0] - self.origin > self.window):
+            self.rebase(timestamp)
+        self.samples.append((timestamp, value))
+        self.accumulate(timestamp, value, 1)
+        while self.samples and self.samples[0][0] < timestamp - self.window:
+            self.accumulate(*self.samples.popleft(), -1)
+
+        minute = int(seconds_of_day // 60)
+        if minute != self.current_minute:
+            self.close_minute()
+            self.current_minute = minute
+        index = int(seconds_of_day // self.bin_seconds) % self.profile_bins
+        if index != self.current_bin:
+            self.close_bin()
+            self.current_bin = index
+        self.minute_sum += value
+        self.minute_count += 1
+
+    def accumulate(self, timestamp, value, sign):
+        t = timestamp - self.origin
+        self.sum_t += sign * t
+        self.sum_y += sign * value
+        self.sum_tt += sign * t * t
+        self.sum_ty += sign * t * value
+
+    def rebase(self, timestamp):
+        """Move the time origin close to the samples and recompute the sums, which keeps them accurate."""
+        self.origin = self.samples[0][0] if self.samples else timestamp
+        self.sum_t = self.sum_y = self.sum_tt = self.sum_ty = 0.0
+        for sample in self.samples:
+            self.accumulate(*sample, 1)
+
+    def close_minute(self):
+        """Update the peak of the current time-of-day bin with the mean of the finished minute."""
+        if self.minute_count:
+            mean = self.minute_sum / self.minute_count
+            self.bin_peak = mean if self.bin_peak is None else max(self.bin_peak, mean)
+        self.minute_sum = 0.0
+        self.minute_count = 0
+
+    def close_bin(self):
+        """Fold the peak of the finished time-of-day bin into the profile."""
+        if self.current_bin is not None and self.bin_peak is not None:
+            previous = self.profile[self.current_bin]
+            self.profile[self.current_bin] = self.bin_peak if previous is None else previous + self.profile_alpha * (self.bin_peak - previous)
+        self.bin_peak = None
+
+    def trend(self, timestamp):
+        """Value of the least squares line at the given time."""
+        n = len(self.samples)
+        mean_y = self.sum_y / n
+        variance = self.sum_tt - self.sum_t * self.sum_t / n
+        if n < 2 or variance <= 1e-9:
+            return mean_y
+        slope = (self.sum_ty - self.sum_t * self.sum_y / n) / variance
+        return mean_y + slope * (timestamp - self.origin - self.sum_t / n)
+
+    def predict(self, timestamp, seconds_of_day, horizon):
+        """
+        Predict the highest load over the next horizon seconds.
+
+        Returns:
+            float: Predicted load in amperes, or None without samples
+        """
+        if not self.samples:
+            return None
+        predicted = max(self.trend(timestamp), self.trend(timestamp + horizon))
+        first = int(seconds_of_day // self.bin_seconds)
+        last = int((seconds_of_day + horizon) // self.bin_seconds)
+        for index in range(first, last + 1):
+            peak = self.profile[index % self.profile_bins]
+            if peak is not None:
+                predicted = max(predicted, peak)
+        return predicted
+
+
+def allocate_currents(loads, capacity):
+    """
+    Split the current available on each phase across the controlled loads.
+
+    Running loads keep the current they need to run, since they draw it until they
+    are stopped. Loads waiting to start are admitted by priority if they fit; a load
+    that only fits if lower priority loads on its phases stop preempts them. What is
+    left is shared by priority tier with weighted max-min fairness (progressive
+    filling): within a tier every adjustable load grows in proportion to its weight
+    until it reaches its maximum or one of its phases is full.
+
+    Args:
+        loads (list): Dicts with name, phases, priority, weight, floor (current the
+            load needs to run), cap (most it can use), running, candidate (waiting to
+            start) and adjustable (can use any current between floor and cap).
+        capacity (dict): Current available to the loads on every phase in amperes.
+
+    Returns:
+        tuple: ({name: allocated current}, {name: [running loads it preempts]})
+    """
+    remaining = dict(capacity)
+    allocation = {load["name"]: 0.0 for load in loads}
+    preempted = {}
+
+    def reserve(load, current):
+        allocation[load["name"]] += current
+        for phase in load["phases"]:
+            remaining[phase] -= current
+
+    for load in loads:
+        if load["running"]:
+            reserve(load, load["floor"])
+
+    candidates = sorted((load for load in loads if load["candidate"]), key=lambda load: (-load["priority"], -load["weight"]))
+    for load in candidates:
+        victims = []
+        if any(remaining[phase] < load["floor"] for phase in load["phases"]):
+            lower = sorted((other for other in loads
+                            if other["running"] and other["priority"] < load["priority"] and allocation[other["name"]] > 0
+                            and set(other["phases"]) & set(load["phases"])),
+                           key=lambda other: (other["priority"], other["weight"]))
+            for other in lower:
+                victims.append(other)
+                reserve(other, -allocation[other["name"]])
+                if all(remaining[phase] >= load["floor"] for phase in load["phases"]):
+                    break
+            if any(remaining[phase] < load["floor"] for phase in load["phases"]):
+                # Even stopping every lower priority load would not make room
+                for other in victims:
+                    reserve(other, other["floor"])
+                continue
+        reserve(load, load["floor"])
+        if victims:
+            preempted[load["name"]] = [other["name"] for other in victims]
+
+    for priority in sorted({load["priority"] for load in loads}, reverse=True):
+        growing = [load for load in loads if load["priority"] == priority and load["adjustable"]
+                   and allocation[load["name"]] > 0 and allocation[load["name"]] < load["cap"]]
+        while growing:
+            weights = {}
+            for load in growing:
+                for phase in load["phases"]:
+                    weights[phase] = weights.get(phase, 0.0) + load["weight"]
+            step = min(min((load["cap"] - allocation[load["name"]]) / load["weight"] for load in growing),
+                       min(max(remaining[phase], 0.0) / weight for phase, weight in weights.items()))
+            for load in growing:
+                reserve(load, load["weight"] * step)
+            full = {phase for phase in weights if remaining[phase] <= 1e-9}
+            growing = [load for load in growing
+                       if allocation[load["name"]] < load["cap"] - 1e-9 and not full & set(load["phases"])]
+
+    return allocation, preempted
+
+
 class EVChargeControl(hass.Hass):
     """
     AppDaemon app that controls EV charging based on phase current events.
     
     This app listens for events from the phase_current_alert app and controls
-    EV charging to prevent overloading the electrical system.
+    EV charging to prevent overloading the electrical system. Several chargers and
+    other switchable loads on the same phases can be controlled by one instance,
+    which splits the available current between them.
     """
     
     def initialize(self):
@@ -16,16 +267,18 @@ class EVChargeControl(hass.Hass):
             self.log("EV Charge Control app initializing")
             
             # Get configuration parameters
-            self.charging_sensor = self.args.get("charging_sensor")
             self.min_available_current = float(self.args.get("min_available_current", 6))
             self.overload_threshold = float(self.args.get("overload_threshold", 4))
-            self.device_id = self.args.get("device_id")
-            self.stop_charge_service = self.args.get("stop_charge_service")
-            self.start_charge_service = self.args.get("start_charge_service")
+            
+            # Stop charging when the breaker model predicts a trip within this many seconds
+            self.trip_reaction_time = float(self.args.get("trip_reaction_time", 120))
             
             # Get event name to listen for
             self.event_name = self.args.get("event_name", "phase_current_alert.threshold_exceeded")
             
+            # Only react to events of this panel when the alert app watches several panels
+            self.alert_panel = self.args.get("alert_panel")
+            
             # Get phase thresholds from phase_current_alert app or from config
             self.threshold_l1 = float(self.args.get("threshold_l1", 16))
             self.threshold_l2 = float(self.args.get("threshold_l2", 16))
@@ -39,28 +292,167 @@ class EVChargeControl(hass.Hass):
             # Notification service
             self.notification_service = self.args.get("notification_service", "notify/mobile_app")
             
+            # Rate limiting of charging current changes in modulate mode
+            self.set_current_interval = float(self.args.get("set_current_interval", 10))
+            self.set_current_drop_time = float(self.args.get("set_current_drop_time", 8))
+            self.set_current_hysteresis = float(self.args.get("set_current_hysteresis", 2))
+            self.set_current_settle_time = float(self.args.get("set_current_settle_time", 30))
+
+            # Seconds the available current has to stay sufficient before charging is resumed
+            self.resume_hold_time = float(self.args.get("resume_hold_time", 30))
+
+            # Live cache of the phase currents, kept up to date by state listeners
+            self.phase_currents = {self.sensor_l1: None, self.sensor_l2: None, self.sensor_l3: None}
+            self.phase_thresholds = {self.sensor_l1: self.threshold_l1, self.sensor_l2: self.threshold_l2, self.sensor_l3: self.threshold_l3}
+            self.phase_sensors = {"L1": self.sensor_l1, "L2": self.sensor_l2, "L3": self.sensor_l3}
+
+            # Charger commands run one at a time per load on the AppDaemon executor, so slow
+            # cloud calls never block the callbacks; each is confirmed with the charging sensor
+            self.command_timeout = float(self.args.get("command_timeout", 90))
+            self.command_retries = int(self.args.get("command_retries", 3))
+            self.command_retry_backoff = float(self.args.get("command_retry_backoff", 15))
+            self.command_ids = itertools.count(1)
+
+            # Controlled loads (chargers, heat pumps, ...) and their state
+            self.loads = self.parse_loads()
+            self.loads_by_name = {load["name"]: load for load in self.loads}
+            self.loads_by_sensor = {load["charging_sensor"]: load for load in self.loads}
+            # Whole-amp phase capacities of the last allocation, to skip unchanged readings
+            self.last_capacity = None
+
+            # Runtime files are kept in data_dir, AppDaemon's configuration directory by default
+            self.data_dir = self.args.get("data_dir") or getattr(self, "config_dir", None) or os.path.dirname(os.path.abspath(__file__))
+
+            # Charging is only resumed if the forecast of the household load leaves enough
+            # current for forecast_horizon seconds (0 disables the forecast)
+            self.forecast_horizon = float(self.args.get("forecast_horizon", 900))
+            self.forecast_window = float(self.args.get("forecast_window", 600))
+            self.forecast_profile_alpha = float(self.args.get("forecast_profile_alpha", 0.3))
+            self.forecast_profile_file = self.data_file("forecast_profile_file", "ev_charge_control_forecast_profile.json")
+            self.forecasters = self.create_forecasters()
+
+            # Overload reaction latency, published per stage as sensors and to a rotating log file
+            self.latency_entity_prefix = self.args.get("latency_entity_prefix", "sensor.ev_charge_control_latency")
+            self.latency_log_file = self.data_file("latency_log_file", "ev_charge_control_latency.jsonl")
+            self.latency_log_max_bytes = int(self.args.get("latency_log_max_bytes", 1024 * 1024))
+            self.latency_log_backups = int(self.args.get("latency_log_backups", 3))
+            self.latency_slo_p95 = self.args.get("latency_slo_p95")
+            self.latency_slo_min_samples = int(self.args.get("latency_slo_min_samples", 5))
+            self.latency_histograms = {stage: LatencyHistogram() for stage in LATENCY_STAGES}
+            self.latency_slo_violated = False
+            self.latency_logger = self.create_latency_logger()
+
             # Time tracking for notification throttling
             self.last_notification_time = None
             
-            # Flag to track if charging was stopped by this app
-            self.charging_stopped_by_app = False
-            
             # Set up listener for the event
             self.listen_event(self.threshold_exceeded_event, self.event_name)
             self.log(f"Listening for events: {self.event_name}")
             
-            # Set up listener for charging sensor
-            self.listen_state(self.charging_state_changed, self.charging_sensor)
-            self.log(f"Monitoring charging sensor: {self.charging_sensor}")
+            # Set up listeners for the charging sensors
+            for load in self.loads:
+                load["charging_state"] = self.get_state(load["charging_sensor"])
+                self.listen_state(self.charging_state_changed, load["charging_sensor"])
+                if load["current_sensor"]:
+                    load["measured_current"] = self.parse_current(self.get_state(load["current_sensor"]))
+                    self.listen_state(self.load_current_changed, load["current_sensor"], load=load["name"])
+                self.log(f"Monitoring charging sensor of {load['name']}: {load['charging_sensor']} ({load['charge_mode']} mode, priority {load['priority']}, weight {load['weight']})")
             
-            # Schedule a regular check for resuming charging
-            self.run_every(self.check_if_can_resume_charging, "now", 60)
+            # Keep the phase current cache up to date; allocations are recomputed on every update
+            for sensor in self.phase_currents:
+                self.phase_currents[sensor] = self.parse_current(self.get_state(sensor))
+                self.listen_state(self.phase_current_changed, sensor)
+            self.update_allocations(force=True)
+            if self.forecasters and self.forecast_profile_file:
+                self.run_every(self.save_forecast_profiles, "now+3600", 3600)
             
-            self.log("EV Charge Control initialized")
+            self.log(f"EV Charge Control initialized with {len(self.loads)} load(s)")
             
         except Exception as e:
             self.log(f"Error in initialize: {e}", level="ERROR")
             self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def data_file(self, option, default):
+        """Return the path of a runtime file: the option or default, relative to data_dir; empty if disabled."""
+        name = self.args.get(option, default)
+        return os.path.join(self.data_dir, name) if name else ""
+
+    def parse_loads(self):
+        """Build the controlled loads from the loads option, or a single charger from the top level options.
+
+        Returns:
+            list: One dict per load with its configuration and state
+        """
+        configs = self.args.get("loads")
+        if not configs:
+            # Legacy configuration: one charger configured at the top level
+            configs = [{
+                "name": self.args.get("name", "EV"),
+                "device_id": self.args.get("device_id"),
+                "charging_sensor": self.args.get("charging_sensor"),
+                "stop_charge_service": self.args.get("stop_charge_service"),
+                "start_charge_service": self.args.get("start_charge_service"),
+                "charge_mode": self.args.get("charge_mode", "switch"),
+                "set_current_service": self.args.get("set_current_service"),
+                "set_current_field": self.args.get("set_current_field", "current"),
+                "min_current": self.args.get("min_charge_current", 6),
+                "max_current": self.args.get("max_charge_current", 16),
+                "resume_current": self.min_available_current,
+            }]
+
+        loads = []
+        for index, config in enumerate(configs):
+            name = config.get("name", f"load_{index + 1}")
+            charge_mode = config.get("charge_mode", "switch")
+            if charge_mode == "modulate" and not config.get("set_current_service"):
+                self.log(f"{name}: charge_mode is modulate but no set_current_service is configured, falling back to switch mode", level="WARNING")
+                charge_mode = "switch"
+            min_current = int(config.get("min_current", 6))
+            max_current = int(config.get("max_current", 16))
+            phases = [self.phase_sensors.get(str(phase).upper(), phase) for phase in config.get("phases", ["L1", "L2", "L3"])]
+            loads.append({
+                "name": name,
+                "device_id": config.get("device_id"),
+                "charging_sensor": config.get("charging_sensor"),
+                "current_sensor": config.get("current_sensor"),
+                "stop_charge_service": config.get("stop_charge_service"),
+                "start_charge_service": config.get("start_charge_service"),
+                "charge_mode": charge_mode,
+                "set_current_service": config.get("set_current_service"),
+                "set_current_field": config.get("set_current_field", "current"),
+                "min_current": min_current,
+                "max_current": max_current,
+                # Allocation needed to start the load; switch loads need their full current by default
+                "resume_current": float(config.get("resume_current", min_current if charge_mode == "modulate" else max_current)),
+                "priority": int(config.get("priority", 0)),
+                "weight": float(config.get("weight", 1)),
+                "phases": phases,
+                # State
+                "charging_state": None,
+                "measured_current": None,
+                "stopped_by_app": False,
+                # Last charging current sent to the charger; assumed to be the maximum until the first change
+                "charge_current": max_current,
+                "previous_charge_current": max_current,
+                "last_current_change": None,
+                # Since when a different current has been allowed (direction +1 higher, -1 lower),
+                # and the allocation closest to the setpoint in that period
+                "adjust_since": None,
+                "adjust_direction": 0,
+                "adjust_current": None,
+                "adjust_timer": None,
+                "resume_timer": None,
+                "forecast_blocked": False,
+                "command_queue": collections.deque(),
+                "active_command": None,
+                "command_timer": None,
+                "command_backoff_timer": None,
+            })
+        return loads
+
+    def label(self, load, message):
+        """Prefix a message with the load name when several loads are controlled."""
+        return f"{load['name']}: {message}" if len(self.loads) > 1 else message
     
     def threshold_exceeded_event(self, event_name, data, kwargs):
         """Handle threshold exceeded events from phase_current_alert."""
@@ -75,16 +467,37 @@ class EVChargeControl(hass.Hass):
             if phase is None or current_value is None or threshold is None:
                 self.log("Invalid event data received", level="WARNING")
                 return
+            
+            if self.alert_panel and data.get("panel", self.alert_panel) != self.alert_panel:
+                self.log(f"Ignoring event from panel {data.get('panel')}", level="DEBUG")
+                return
+            
+            # Timestamps of the reaction chain; the alert app adds sample_time and event_time
+            latency = {"received": self.get_now_ts()}
+            if data.get("sample_time") is not None and data.get("event_time") is not None:
+                latency.update(sample_time=float(data["sample_time"]), event_time=float(data["event_time"]), phase=phase)
+
+            # The lowest priority load running on the phase is stopped first
+            load = self.select_load_to_stop(phase)
+
+            # Thermal events (a predicted breaker trip without an alert rule) are only acted on
+            # when the trip is coming; rule events carry time_to_trip too, but go by the excess current
+            if data.get("rule") == "thermal":
+                self.handle_trip_prediction(load, phase, current_value, threshold, data.get("time_to_trip"), latency)
+                return
                 
             # Check if charging control is needed
-            if self.get_state(self.charging_sensor) == "on":
+            if load is not None:
                 # Calculate how much the current exceeds the threshold
                 excess_current = current_value - threshold
                 
-                # If excess current is greater than the overload threshold, stop charging
-                if excess_current > self.overload_threshold and not self.charging_stopped_by_app:
+                # If excess current is greater than the overload threshold, lower the charging
+                # current of a modulated load if that is enough, otherwise stop charging
+                if excess_current > self.overload_threshold:
                     self.log(f"Current exceeds threshold by {excess_current:.1f}A which is more than the overload threshold of {self.overload_threshold}A")
-                    self.stop_charging(phase, current_value, threshold)
+                    if load["charge_mode"] == "modulate" and self.reduce_charging_current(load, phase, excess_current):
+                        return
+                    self.stop_charging(load, phase, current_value, threshold, latency)
                 else:
                     self.log(f"Current exceeds threshold by {excess_current:.1f}A which is within the overload threshold of {self.overload_threshold}A")
                     
@@ -92,22 +505,85 @@ class EVChargeControl(hass.Hass):
             self.log(f"Error in threshold_exceeded_event: {e}", level="ERROR")
             self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
     
+    def select_load_to_stop(self, phase):
+        """Return the running load to stop for an overload on the phase, or None.
+
+        Loads not yet stopped by the app are considered, lowest priority first, then
+        lowest weight, then the last configured. Loads on other phases are only
+        skipped when the phase name is one of L1, L2 and L3.
+        """
+        sensor = self.phase_sensors.get(str(phase).upper())
+        running = [load for load in self.loads
+                   if load["charging_state"] == "on" and not load["stopped_by_app"]
+                   and (sensor is None or sensor in load["phases"])]
+        if not running:
+            return None
+        return min(reversed(running), key=lambda load: (load["priority"], load["weight"]))
+
+    def handle_trip_prediction(self, load, phase, current_value, threshold, time_to_trip, latency=None):
+        """Stop charging if the breaker on the phase is predicted to trip soon.
+        
+        Args:
+            load: Load to stop, or None if no load is running on the phase
+            phase: Phase name from the event
+            current_value: Current of the phase in amperes
+            threshold: Threshold of the phase in amperes
+            time_to_trip: Predicted seconds until the breaker trips, or None if no trip is coming
+            latency: Timestamps of the reaction chain so far
+        """
+        if time_to_trip is None or float(time_to_trip) > self.trip_reaction_time:
+            self.log(f"No breaker trip expected on {phase} within {self.trip_reaction_time} seconds (time to trip: {time_to_trip}), keeping charging")
+            return
+        
+        if load is not None:
+            self.log(f"Breaker on {phase} is predicted to trip in {float(time_to_trip):.0f} seconds")
+            self.stop_charging(load, phase, current_value, threshold, latency)
+
+    def reduce_charging_current(self, load, phase, excess_current):
+        """Lower the charging current of a modulated load to take an overload off the phase.
+
+        A decrease sent less than set_current_settle_time seconds ago is assumed to
+        still be on its way and counted against the excess.
+
+        Returns:
+            bool: True if the lowered current is enough, False if charging has to stop
+        """
+        now = self.get_now_ts()
+        if load["last_current_change"] is not None and now - load["last_current_change"] < self.set_current_settle_time:
+            excess_current -= max(load["previous_charge_current"] - load["charge_current"], 0)
+            if excess_current <= self.overload_threshold:
+                self.log(self.label(load, f"Charging current on {phase} is already being lowered to {load['charge_current']}A"))
+                return True
+        current = math.floor(load["charge_current"] - excess_current)
+        if current < load["min_current"]:
+            return False
+        self.set_charging_current(load, current, load["charge_current"] - excess_current)
+        return True
+    
     def charging_state_changed(self, entity, attribute, old, new, kwargs):
-        """Handle state changes for the charging sensor."""
+        """Handle state changes for the charging sensors."""
         try:
+            load = self.loads_by_sensor[entity]
             if new != old:
-                self.log(f"Charging state changed from {old} to {new}")
+                self.log(self.label(load, f"Charging state changed from {old} to {new}"))
+                load["charging_state"] = new
+
+                command = load["active_command"]
+                if command is not None and command["target_state"] == new:
+                    self.finish_command(load, command)
                 
                 # Only reset the flag when charging resumes (turns on)
-                if new == "on" and self.charging_stopped_by_app:
-                    self.log("Charging resumed externally, resetting charging_stopped_by_app flag")
-                    self.charging_stopped_by_app = False
+                if new == "on" and load["stopped_by_app"]:
+                    self.log(self.label(load, "Charging resumed externally, resetting charging_stopped_by_app flag"))
+                    load["stopped_by_app"] = False
+                
+                self.update_allocations(force=True)
                     
         except Exception as e:
             self.log(f"Error in charging_state_changed: {e}", level="ERROR")
             self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
     
-    def stop_charging(self, phase, current_value, threshold):
+    def stop_charging(self, load, phase, current_value, threshold, latency=None):
         """Stop the EV charging."""
         try:
             log_message = f"Stopping charging due to high current on {phase}: {current_value}A (threshold: {threshold}A + {self.overload_threshold}A)"
@@ -115,78 +591,365 @@ class EVChargeControl(hass.Hass):
             
             # Control charging with common method
             self.control_charging(
+                load=load,
                 action="stop",
-                service=self.stop_charge_service,
+                service=load["stop_charge_service"],
                 log_message=log_message,
                 notification_message=notification_message,
-                set_charging_stopped_value=True
+                set_charging_stopped_value=True,
+                latency=latency
             )
                 
         except Exception as e:
             self.log(f"Error stopping charging: {e}", level="ERROR")
             self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def pause_charging(self, load, allocated_current):
+        """Stop a modulated load whose allocation stays below its minimum charging current."""
+        active = load["active_command"]
+        if active is not None and active["action"] == "stop":
+            return  # Still waiting for the charger to stop
+        self.control_charging(
+            load=load,
+            action="stop",
+            service=load["stop_charge_service"],
+            log_message=f"Stopping charging: only {allocated_current:.1f}A is available, below the minimum charging current of {load['min_current']}A",
+            notification_message=f"🔌 Charging stopped: only {allocated_current:.1f}A is available, less than the {load['min_current']}A minimum charging current. Charging will resume when load decreases.",
+            set_charging_stopped_value=True
+        )
     
-    def check_if_can_resume_charging(self, kwargs=None):
-        """Check if charging can be resumed based on available current."""
+    def parse_current(self, state):
+        """Convert a phase sensor state to amperes, or None if it is unavailable."""
+        if state in [None, "unavailable", "unknown"]:
+            return None
         try:
-            # Only check if we previously stopped charging and charging is still off
-            if not self.charging_stopped_by_app or self.get_state(self.charging_sensor) == "on":
+            return float(state)
+        except (TypeError, ValueError):
+            return None
+
+    def phase_current_changed(self, entity, attribute, old, new, kwargs):
+        """Update the phase current cache, train the load forecast and recompute the allocations."""
+        try:
+            self.phase_currents[entity] = self.parse_current(new)
+            if self.forecasters and self.phase_currents[entity] is not None:
+                now = self.get_now_ts()
+                controlled = sum(self.load_draw(load, now) for load in self.loads if entity in load["phases"])
+                self.forecasters[entity].add(now, self.phase_currents[entity] - controlled, self.seconds_of_day())
+            self.update_allocations()
+        except Exception as e:
+            self.log(f"Error in phase_current_changed: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def load_current_changed(self, entity, attribute, old, new, kwargs):
+        """Update the measured current of a load."""
+        try:
+            self.loads_by_name[kwargs["load"]]["measured_current"] = self.parse_current(new)
+        except Exception as e:
+            self.log(f"Error in load_current_changed: {e}", level="ERROR")
+
+    def load_draw(self, load, now):
+        """Estimate the current a load draws on each of its phases.
+
+        The load's current sensor is used when configured. Otherwise a modulated
+        charger is assumed to draw its setpoint (the higher of the old and new
+        setpoint until set_current_settle_time has passed after a change, so a
+        change that has not taken effect yet is not corrected again) and a
+        switched load its maximum current.
+        """
+        if load["charging_state"] != "on":
+            return 0.0
+        if load["measured_current"] is not None:
+            return load["measured_current"]
+        if load["charge_mode"] != "modulate":
+            return float(load["max_current"])
+        if load["last_current_change"] is not None and now - load["last_current_change"] < self.set_current_settle_time:
+            return float(max(load["previous_charge_current"], load["charge_current"]))
+        return float(load["charge_current"])
+
+    def compute_allocations(self, now, forecast=False):
+        """Compute the current every load may use.
+
+        The capacity of a phase is its threshold minus the load that is not
+        controlled by this app (the measured current minus the estimated draw of
+        the controlled loads on it). With forecast set, the highest uncontrolled
+        load predicted over forecast_horizon seconds is used where it is higher.
+
+        Returns:
+            tuple: (capacity per phase, allocation per load, preemptions per load),
+            or None while a phase sensor is unavailable
+        """
+        if any(current is None for current in self.phase_currents.values()):
+            return None
+
+        draws = {load["name"]: self.load_draw(load, now) for load in self.loads}
+        capacity = {}
+        for sensor, current in self.phase_currents.items():
+            controlled = sum(draws[load["name"]] for load in self.loads if sensor in load["phases"])
+            capacity[sensor] = self.phase_thresholds[sensor] - (current - controlled)
+            if forecast:
+                predicted = self.forecasters[sensor].predict(now, self.seconds_of_day(), self.forecast_horizon)
+                if predicted is not None:
+                    capacity[sensor] = min(capacity[sensor], self.phase_thresholds[sensor] - predicted)
+
+        requests = []
+        for load in self.loads:
+            running = load["charging_state"] == "on"
+            adjustable = load["charge_mode"] == "modulate"
+            if running:
+                floor = float(load["min_current"]) if adjustable else draws[load["name"]]
+            else:
+                floor = load["resume_current"]
+            requests.append({
+                "name": load["name"],
+                "phases": load["phases"],
+                "priority": load["priority"],
+                "weight": load["weight"],
+                "floor": floor,
+                "cap": float(load["max_current"]) if adjustable else floor,
+                "running": running,
+                "candidate": not running and load["stopped_by_app"],
+                "adjustable": adjustable,
+            })
+        allocation, preempted = allocate_currents(requests, capacity)
+        return capacity, allocation, preempted
+
+    def update_allocations(self, force=False):
+        """Recompute the allocations and send the commands that differ from the current state.
+
+        A phase reading that leaves every phase capacity unchanged in whole amperes
+        is skipped, unless a load is waiting to raise its charging current or for
+        the load forecast to allow resuming.
+        """
+        try:
+            now = self.get_now_ts()
+            result = self.compute_allocations(now)
+            if result is None:
+                return
+            capacity, allocation, preempted = result
+            forecast_allocation = None
+
+            key = tuple(math.floor(capacity[sensor]) for sensor in self.phase_currents)
+            pending = any(load["adjust_since"] is not None or load["forecast_blocked"] for load in self.loads)
+            if not force and key == self.last_capacity and not pending:
+                return
+            self.last_capacity = key
+
+            for load in self.loads:
+                allocated = allocation[load["name"]]
+                if load["charging_state"] == "on":
+                    self.cancel_resume_timer(load)
+                    load["forecast_blocked"] = False
+                    if load["charge_mode"] == "modulate" and not load["stopped_by_app"]:
+                        # Running loads keep their minimum current in the allocation; a phase
+                        # that cannot carry it takes the shortfall off the modulated load
+                        shortfall = min(capacity[sensor] - sum(allocation[other["name"]] for other in self.loads if sensor in other["phases"])
+                                        for sensor in load["phases"])
+                        self.modulate_charging_current(load, allocated + min(shortfall, 0.0), now)
+                elif load["stopped_by_app"]:
+                    available = min(capacity[sensor] for sensor in load["phases"])
+                    if self.forecasters and allocated >= load["resume_current"]:
+                        if forecast_allocation is None:
+                            forecast_allocation = self.compute_allocations(now, forecast=True)[1]
+                        if forecast_allocation[load["name"]] < load["resume_current"]:
+                            if load["resume_timer"] is not None or not load["forecast_blocked"]:
+                                self.log(self.label(load, f"Available current is {available:.1f}A, but only {forecast_allocation[load['name']]:.1f}A is forecast for the next {self.forecast_horizon:.0f} seconds, not resuming yet"))
+                            load["forecast_blocked"] = True
+                            allocated = forecast_allocation[load["name"]]
+                        else:
+                            load["forecast_blocked"] = False
+                    self.check_if_can_resume_charging(load, allocated, available)
+                else:
+                    self.cancel_resume_timer(load)
+                    load["forecast_blocked"] = False
+
+        except Exception as e:
+            self.log(f"Error updating allocations: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def check_if_can_resume_charging(self, load, allocated_current, available_current):
+        """Check if charging can be resumed based on the allocated current.
+
+        Charging is resumed once enough current has been allocated continuously
+        for resume_hold_time seconds; any update without enough headroom restarts
+        the hold period.
+        """
+        if allocated_current < load["resume_current"]:
+            if load["resume_timer"] is not None:
+                self.log(self.label(load, f"Available current dropped to {allocated_current:.1f}A, restarting resume hold period"), level="DEBUG")
+            self.cancel_resume_timer(load)
+        elif self.resume_hold_time <= 0:
+            self.resume_hold_elapsed({"load": load["name"]})
+        elif load["resume_timer"] is None:
+            self.log(self.label(load, f"Available current is {available_current:.1f}A, resuming charging if it holds for {self.resume_hold_time} seconds"))
+            load["resume_timer"] = self.run_in(self.resume_hold_elapsed, self.resume_hold_time, load=load["name"])
+
+    def resume_hold_elapsed(self, kwargs):
+        """Resume charging if the allocated current stayed sufficient for the whole hold period.
+
+        If the load only fits by preempting lower priority loads, those are stopped
+        first and the load is started by a later allocation once they are off.
+        """
+        try:
+            load = self.loads_by_name[kwargs["load"]]
+            load["resume_timer"] = None
+            if not load["stopped_by_app"] or load["charging_state"] == "on":
+                return
+            now = self.get_now_ts()
+            result = self.compute_allocations(now)
+            if result is None:
+                return
+            capacity, allocation, preempted = result
+            allocated_current = allocation[load["name"]]
+            if allocated_current < load["resume_current"]:
+                return
+            if self.forecasters and self.compute_allocations(now, forecast=True)[1][load["name"]] < load["resume_current"]:
                 return
                 
-            # Check if there's enough available current
-            has_enough_current, available_current = self.check_available_current()
-            
-            if has_enough_current:
-                self.resume_charging(available_current)
-                
+            victims = [self.loads_by_name[name] for name in preempted.get(load["name"], [])]
+            if victims:
+                for victim in victims:
+                    self.preempt_load(victim, load)
+                return
+            self.resume_charging(load, allocated_current, min(capacity[sensor] for sensor in load["phases"]))
         except Exception as e:
-            self.log(f"Error checking if charging can be resumed: {e}", level="ERROR")
+            self.log(f"Error in resume_hold_elapsed: {e}", level="ERROR")
             self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
-    
-    def check_available_current(self):
-        """Check if there is enough available current to resume charging.
+
+    def cancel_resume_timer(self, load):
+        """Cancel a pending resume hold timer."""
+        if load["resume_timer"] is not None:
+            self.cancel_timer(load["resume_timer"])
+            load["resume_timer"] = None
+
+    def preempt_load(self, load, waiting):
+        """Stop a running load to make room for a higher priority one."""
+        self.control_charging(
+            load=load,
+            action="stop",
+            service=load["stop_charge_service"],
+            log_message=f"Stopping to make room for {waiting['name']} (priority {waiting['priority']})",
+            notification_message=f"🔌 Charging stopped to make room for {waiting['name']}. It will resume when there is enough current for both.",
+            set_charging_stopped_value=True
+        )
+
+    def modulate_charging_current(self, load, allocated_current, now):
+        """Adjust the charging current of a load to its allocation.
         
-        Returns:
-            tuple: (has_enough_current, available_current)
+        The allocation is rounded down to whole amperes and limited to the range of
+        the charger. Every step is held back until the new current has been allowed
+        continuously for a while, and then only goes as far as the whole period
+        allowed: a raise for set_current_interval seconds (so it also comes at least
+        that long after the previous change) up to the lowest allowed current, a
+        decrease for set_current_drop_time seconds down to the highest allowed
+        current. A decrease also needs the allocation to be more than
+        set_current_hysteresis amperes below the setpoint, so noise around a whole
+        ampere does not move the setpoint. If even the highest allocation of a
+        decrease period is more than set_current_hysteresis amperes below the minimum
+        current, charging is stopped and resumed as in switch mode, load forecast
+        included. Faster decreases are left to the threshold events of the Phase
+        Current Alert app.
         """
+        allowed_current = math.floor(allocated_current + 1e-9)
+
+        if min(allowed_current, load["max_current"]) > load["charge_current"]:
+            direction, hold_time = 1, self.set_current_interval
+        elif allocated_current < load["charge_current"] - self.set_current_hysteresis and \
+                (allowed_current < load["charge_current"] or allocated_current < load["min_current"] - self.set_current_hysteresis):
+            direction, hold_time = -1, self.set_current_drop_time
+        else:
+            self.cancel_adjust(load)
+            return
+
+        if load["adjust_since"] is None or load["adjust_direction"] != direction:
+            # Re-evaluate at the end of the period even if no phase reading changes
+            self.cancel_adjust(load)
+            load["adjust_since"] = now
+            load["adjust_direction"] = direction
+            load["adjust_current"] = allocated_current
+            load["adjust_timer"] = self.run_in(self.adjust_hold_elapsed, hold_time, load=load["name"])
+            return
+
+        if direction > 0:
+            load["adjust_current"] = min(load["adjust_current"], allocated_current)
+        else:
+            load["adjust_current"] = max(load["adjust_current"], allocated_current)
+        if now - load["adjust_since"] < hold_time:
+            return
+        if load["adjust_current"] < load["min_current"] - self.set_current_hysteresis:
+            self.cancel_adjust(load)
+            self.pause_charging(load, load["adjust_current"])
+            return
+        current = max(load["min_current"], min(load["max_current"], math.floor(load["adjust_current"] + 1e-9)))
+        if current != load["charge_current"]:
+            self.set_charging_current(load, current, allocated_current)
+        else:
+            self.cancel_adjust(load)
+
+    def adjust_hold_elapsed(self, kwargs):
+        """Recompute the allocations when a load may change its charging current."""
         try:
-            # Get the current state of each phase
-            l1_state = self.get_state(self.sensor_l1)
-            l2_state = self.get_state(self.sensor_l2)
-            l3_state = self.get_state(self.sensor_l3)
-            
-            # Skip check if any sensor is unavailable
-            if any(state in [None, "unavailable", "unknown"] for state in [l1_state, l2_state, l3_state]):
-                return False, 0
-                
-            # Calculate available current for each phase
-            l1_current = float(l1_state)
-            l2_current = float(l2_state)
-            l3_current = float(l3_state)
-            
-            l1_available = self.threshold_l1 - l1_current
-            l2_available = self.threshold_l2 - l2_current
-            l3_available = self.threshold_l3 - l3_current
-            
-            # The minimum available current across all phases
-            min_available = min(l1_available, l2_available, l3_available)
-            
-            return min_available >= self.min_available_current, min_available
-            
+            self.loads_by_name[kwargs["load"]]["adjust_timer"] = None
+            self.update_allocations(force=True)
         except Exception as e:
-            self.log(f"Error checking available current: {e}", level="ERROR")
-            return False, 0
-    
-    def resume_charging(self, available_current):
-        """Resume the EV charging."""
+            self.log(f"Error in adjust_hold_elapsed: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def cancel_adjust(self, load):
+        """Stop waiting to change the charging current of a load."""
+        load["adjust_since"] = None
+        load["adjust_direction"] = 0
+        if load["adjust_timer"] is not None:
+            self.cancel_timer(load["adjust_timer"])
+            load["adjust_timer"] = None
+
+    def set_charging_current(self, load, current, allocated_current):
+        """Send a new charging current to the charger.
+
+        Args:
+            load: Load to set the current of
+            current: Charging current in whole amperes
+            allocated_current: Allocation the current was calculated from
+        """
+        parts = load["set_current_service"].split('/')
+        if len(parts) != 2:
+            self.log(f"Invalid service format for setting the charging current: {load['set_current_service']}", level="ERROR")
+            return
+
+        self.log(self.label(load, f"Setting charging current from {load['charge_current']}A to {current}A (allocated current: {allocated_current:.1f}A)"))
+        self.queue_command(load, {
+            "action": "set_current",
+            "service": load["set_current_service"],
+            "data": {"device_id": load["device_id"], load["set_current_field"]: current},
+            "target_state": None,
+        })
+        load["previous_charge_current"] = load["charge_current"]
+        load["charge_current"] = current
+        load["last_current_change"] = self.get_now_ts()
+        self.cancel_adjust(load)
+
+    def resume_charging(self, load, allocated_current, available_current):
+        """Resume the EV charging.
+
+        Args:
+            load: Load to resume
+            allocated_current: Current allocated to the load
+            available_current: Capacity of the most loaded phase of the load
+        """
         try:
-            log_message = f"Resuming charging, available current: {available_current}A (minimum required: {self.min_available_current}A)"
-            notification_message = f"⚡ Charging resumed: Available current is now {available_current:.1f}A (minimum required: {self.min_available_current}A)."
+            if load["charge_mode"] == "modulate":
+                # Start with the current that fits instead of the last setpoint
+                current = max(load["min_current"], min(load["max_current"], math.floor(allocated_current + 1e-9)))
+                if current != load["charge_current"]:
+                    self.set_charging_current(load, current, allocated_current)
+
+            log_message = f"Resuming charging, available current: {available_current:.1f}A (minimum required: {load['resume_current']}A)"
+            notification_message = f"⚡ Charging resumed: Available current is now {available_current:.1f}A (minimum required: {load['resume_current']}A)."
             
             # Control charging with common method
             self.control_charging(
+                load=load,
                 action="resume",
-                service=self.start_charge_service,
+                service=load["start_charge_service"],
                 log_message=log_message,
                 notification_message=notification_message,
                 set_charging_stopped_value=False
@@ -196,37 +959,317 @@ class EVChargeControl(hass.Hass):
             self.log(f"Error resuming charging: {e}", level="ERROR")
             self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
             
-    def control_charging(self, action, service, log_message, notification_message, set_charging_stopped_value):
+    def control_charging(self, load, action, service, log_message, notification_message, set_charging_stopped_value, latency=None):
         """Common method to control charging (stop or resume).
         
+        The command is queued and sent in the background; the load's stopped flag is
+        updated and the notification sent once the charging sensor confirms it.
+
         Args:
+            load: The load to control
             action: The action being performed ("stop" or "resume")
             service: The service to call (stop_charge_service or start_charge_service)
             log_message: Message to log
             notification_message: Message to send as notification
-            set_flag: Value to set for charging_stopped_by_app flag
+            set_charging_stopped_value: Value to set for the load's stopped by app flag
+            latency: Timestamps of the reaction chain that led to the command, if any
         """
         try:
             # Log the action
-            self.log(log_message)
+            self.log(self.label(load, log_message))
             
-            # Call the service to control charging
             parts = service.split('/')
-            if len(parts) == 2:
-                domain, service_name = parts
-                self.call_service(f"{domain}/{service_name}", device_id=self.device_id)
-            else:
+            if len(parts) != 2:
                 self.log(f"Invalid service format for {action} charging: {service}", level="ERROR")
                 return
             
-            self.charging_stopped_by_app = set_charging_stopped_value
-            
-            # Send notification
-            self.send_notification(notification_message)
+            self.queue_command(load, {
+                "action": action,
+                "service": service,
+                "data": {"device_id": load["device_id"]},
+                "target_state": "off" if set_charging_stopped_value else "on",
+                "charging_stopped_value": set_charging_stopped_value,
+                "notification_message": self.label(load, notification_message),
+                "latency": latency,
+            })
             
         except Exception as e:
             self.log(f"Error in control_charging ({action}): {e}", level="ERROR")
             self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def queue_command(self, load, command):
+        """Queue a command for a load and start it if no other command of the load is running.
+
+        A command that repeats the running one is dropped, and a queued command of the
+        same kind (stop/resume or set current) is replaced, so only the latest intent is sent.
+
+        Args:
+            load: The load the command is for
+            command: Dict with action, service, data and target_state (charging sensor
+                state that confirms the command, None to confirm when the call returns)
+        """
+        command["kind"] = "current" if command["target_state"] is None else "charging"
+        command["load"] = load["name"]
+        active = load["active_command"]
+        if active is not None and active["service"] == command["service"] and active["data"] == command["data"]:
+            self.log(self.label(load, f"{command['action']} command is already running, ignoring duplicate"), level="DEBUG")
+            return
+
+        for queued in [queued for queued in load["command_queue"] if queued["kind"] == command["kind"]]:
+            self.log(self.label(load, f"Replacing queued {queued['action']} command with {command['action']}"), level="DEBUG")
+            load["command_queue"].remove(queued)
+
+        command["id"] = next(self.command_ids)
+        command["attempt"] = 0
+        load["command_queue"].append(command)
+        self.dispatch_next_command(load)
+
+    def dispatch_next_command(self, load):
+        """Send the next queued command of a load to the charger on the executor."""
+        try:
+            if load["active_command"] is not None or load["command_backoff_timer"] is not None:
+                return
+
+            while load["command_queue"]:
+                command = load["command_queue"].popleft()
+                if command["target_state"] is not None and load["charging_state"] == command["target_state"]:
+                    if command["attempt"] > 0:
+                        # The charger followed an earlier attempt while waiting for the retry
+                        load["active_command"] = command
+                        self.finish_command(load, command)
+                        return
+                    self.log(self.label(load, f"Charging is already {load['charging_state']}, skipping {command['action']} command"))
+                    continue
+                
+                command["attempt"] += 1
+                load["active_command"] = command
+                if command.get("latency") is not None:
+                    command["latency"].setdefault("dispatched", self.get_now_ts())
+                load["command_timer"] = self.run_in(self.command_timed_out, self.command_timeout, load=load["name"], command_id=command["id"])
+                self.log(self.label(load, f"Sending {command['action']} command (attempt {command['attempt']} of {self.command_retries + 1})"))
+                self.submit_to_executor(self.execute_command, load["name"], command["id"], command["service"], command["data"],
+                                        callback=self.command_returned)
+                return
+
+        except Exception as e:
+            self.log(f"Error dispatching charger command: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def command_backoff_elapsed(self, kwargs):
+        """Send the next command of a load after the retry backoff."""
+        load = self.loads_by_name[kwargs["load"]]
+        load["command_backoff_timer"] = None
+        self.dispatch_next_command(load)
+
+    def execute_command(self, load_name, command_id, service, data):
+        """Call the charger service. Runs on the executor, not on the app thread.
+
+        Returns:
+            dict: Load name, command id and the error message, or None if the call succeeded
+        """
+        try:
+            self.call_service(service, **data)
+            return {"load": load_name, "command_id": command_id, "error": None}
+        except Exception as e:
+            return {"load": load_name, "command_id": command_id, "error": str(e)}
+
+    def command_returned(self, kwargs):
+        """Handle the result of a charger service call."""
+        try:
+            result = kwargs.get("result") or {}
+            load = self.loads_by_name.get(result.get("load"))
+            command = load["active_command"] if load is not None else None
+            if command is None or command["id"] != result.get("command_id"):
+                return  # The command already timed out or was confirmed
+
+            if command.get("latency") is not None:
+                command["latency"]["returned"] = self.get_now_ts()
+
+            if result.get("error"):
+                self.retry_command(load, command, f"service call failed: {result['error']}")
+            elif command["target_state"] is None or load["charging_state"] == command["target_state"]:
+                self.finish_command(load, command)
+            else:
+                self.log(self.label(load, f"{command['action']} command sent, waiting for {load['charging_sensor']} to turn {command['target_state']}"), level="DEBUG")
+
+        except Exception as e:
+            self.log(f"Error handling charger command result: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def command_timed_out(self, kwargs):
+        """Retry the running command of a load if it was not confirmed in time."""
+        try:
+            load = self.loads_by_name[kwargs["load"]]
+            command = load["active_command"]
+            if command is not None and command["id"] == kwargs.get("command_id"):
+                load["command_timer"] = None
+                self.retry_command(load, command, f"not confirmed within {self.command_timeout} seconds")
+        except Exception as e:
+            self.log(f"Error handling charger command timeout: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def retry_command(self, load, command, reason):
+        """Requeue a failed command with exponential backoff, or give up after the last retry."""
+        self.end_active_command(load)
+        if command["attempt"] > self.command_retries:
+            self.log(self.label(load, f"{command['action']} command failed after {command['attempt']} attempts: {reason}"), level="ERROR")
+            if command["target_state"] is not None:
+                self.send_notification(self.label(load, f"⚠️ Charger did not {command['action']} charging after {command['attempt']} attempts ({reason})."))
+            self.dispatch_next_command(load)
+            return
+
+        delay = self.command_retry_backoff * 2 ** (command["attempt"] - 1)
+        self.log(self.label(load, f"{command['action']} command {reason}, retrying in {delay:.0f} seconds"), level="WARNING")
+        if not any(queued["kind"] == command["kind"] for queued in load["command_queue"]):
+            load["command_queue"].appendleft(command)
+        load["command_backoff_timer"] = self.run_in(self.command_backoff_elapsed, delay, load=load["name"])
+
+    def finish_command(self, load, command):
+        """Complete a confirmed command and start the next one."""
+        self.end_active_command(load)
+        if command["target_state"] is not None:
+            self.log(self.label(load, f"{command['action']} command confirmed, charging is {command['target_state']}"))
+            load["stopped_by_app"] = command["charging_stopped_value"]
+            self.send_notification(command["notification_message"])
+            if command.get("latency") is not None:
+                self.record_latency(command["latency"], command["attempt"])
+        self.dispatch_next_command(load)
+
+    def end_active_command(self, load):
+        """Clear the running command of a load and its timeout."""
+        load["active_command"] = None
+        if load["command_timer"] is not None:
+            self.cancel_timer(load["command_timer"])
+            load["command_timer"] = None
+
+    def create_forecasters(self):
+        """Create a load forecaster per phase, with the time-of-day profiles saved by a previous run."""
+        if self.forecast_horizon <= 0:
+            return {}
+        profiles = {}
+        if self.forecast_profile_file and os.path.exists(self.forecast_profile_file):
+            try:
+                with open(self.forecast_profile_file) as f:
+                    profiles = json.load(f)
+            except (OSError, ValueError) as e:
+                self.log(f"Could not load the load profiles from {self.forecast_profile_file}: {e}", level="WARNING")
+        return {
+            sensor: LoadForecaster(self.forecast_window, profile_alpha=self.forecast_profile_alpha, profile=profiles.get(sensor))
+            for sensor in self.phase_currents
+        }
+
+    def save_forecast_profiles(self, kwargs):
+        """Save the time-of-day load profiles, so they survive restarts."""
+        try:
+            profiles = {sensor: forecaster.profile for sensor, forecaster in self.forecasters.items()}
+            temporary = f"{self.forecast_profile_file}.tmp"
+            with open(temporary, "w") as f:
+                json.dump(profiles, f)
+            os.replace(temporary, self.forecast_profile_file)
+        except Exception as e:
+            self.log(f"Error saving the load profiles: {e}", level="ERROR")
+
+    def seconds_of_day(self):
+        """Return the seconds since local midnight, the position in the load profiles."""
+        now = self.datetime()
+        return now.hour * 3600 + now.minute * 60 + now.second
+
+    def create_latency_logger(self):
+        """Create the logger writing one JSON line per overload reaction, or None if disabled."""
+        if not self.latency_log_file:
+            return None
+        handler = logging.handlers.RotatingFileHandler(
+            self.latency_log_file, maxBytes=self.latency_log_max_bytes, backupCount=self.latency_log_backups)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger = logging.getLogger(f"ev_charge_control.latency.{self.name}")
+        for old_handler in list(logger.handlers):
+            logger.removeHandler(old_handler)
+            old_handler.close()
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        return logger
+
+    def terminate(self):
+        """Save the load profiles and close the latency log file when the app is terminated."""
+        try:
+            if self.forecasters and self.forecast_profile_file:
+                self.save_forecast_profiles({})
+            if self.latency_logger is not None:
+                for handler in list(self.latency_logger.handlers):
+                    self.latency_logger.removeHandler(handler)
+                    handler.close()
+        except Exception as e:
+            self.log(f"Error during termination: {e}", level="ERROR")
+
+    def record_latency(self, latency, attempts):
+        """Record the stage latencies of a confirmed stop and publish them.
+
+        Args:
+            latency: Timestamps of the reaction chain (sample_time, event_time, received,
+                dispatched and returned); sample_time/event_time are missing for
+                events of older alert app versions
+            attempts: Number of times the command was sent
+        """
+        try:
+            confirmed = self.get_now_ts()
+            received = latency["received"]
+            dispatched = latency.get("dispatched", received)
+            returned = min(latency.get("returned", confirmed), confirmed)
+            stages = {
+                "queue": dispatched - received,
+                "command": returned - dispatched,
+                "confirmation": confirmed - returned,
+            }
+            if "sample_time" in latency:
+                stages["detection"] = latency["event_time"] - latency["sample_time"]
+                stages["delivery"] = received - latency["event_time"]
+                stages["total"] = confirmed - latency["sample_time"]
+
+            for stage, seconds in stages.items():
+                self.latency_histograms[stage].add(seconds)
+            self.log("Overload reaction latency: " +  ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stages.items()))
+
+            if self.latency_logger is not None:
+                entry = {"timestamp": str(self.datetime()), "phase": latency.get("phase"), "attempts": attempts}
+                entry.update({stage: round(seconds, 3) for stage, seconds in stages.items()})
+                self.latency_logger.info(json.dumps(entry))
+
+            self.publish_latency()
+            self.check_latency_slo()
+
+        except Exception as e:
+            self.log(f"Error recording latency: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def publish_latency(self):
+        """Publish the p95 and summary of every stage histogram as a sensor."""
+        for stage, histogram in self.latency_histograms.items():
+            if not histogram.count:
+                continue
+            summary = histogram.summary()
+            self.set_state(
+                f"{self.latency_entity_prefix}_{stage}",
+                state=summary["p95"],
+                attributes=dict(summary, unit_of_measurement="s", friendly_name=f"EV overload reaction {stage} latency p95"),
+            )
+
+    def check_latency_slo(self):
+        """Alert once when the p95 of the total reaction latency goes over latency_slo_p95."""
+        if self.latency_slo_p95 is None:
+            return
+        histogram = self.latency_histograms["total"]
+        if histogram.count < self.latency_slo_min_samples:
+            return
+        p95 = histogram.percentile(95)
+        violated = p95 > float(self.latency_slo_p95)
+        if violated and not self.latency_slo_violated:
+            self.log(f"Overload reaction latency p95 of {p95:.1f}s is over the SLO of {self.latency_slo_p95}s", level="WARNING")
+            self.fire_event("ev_charge_control.latency_slo_exceeded", p95=round(p95, 3), slo=float(self.latency_slo_p95), count=histogram.count)
+            self.send_notification(f"⏱️ Charging stops are slow: 95% of overload reactions took up to {p95:.0f}s (target: {self.latency_slo_p95}s).")
+        elif not violated and self.latency_slo_violated:
+            self.log(f"Overload reaction latency p95 of {p95:.1f}s is back within the SLO of {self.latency_slo_p95}s")
+        self.latency_slo_violated = violated
             
     def send_notification(self, message):
         """Send a notification with throttling.
@@ -236,7 +1279,7 @@ class EVChargeControl(hass.Hass):
         """
         try:
             # Only send notification if we haven't sent one recently
-            now = datetime.datetime.now()
+            now = self.datetime()
             if self.last_notification_time is None or (now - self.last_notification_time).total_seconds() >= 60:
                 parts = self.notification_service.split('/')
                 if len(parts) == 2:
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# test_ev_charge_control.py - Tests for the current allocation of ev_charge_control.py
+# This file is NOT an AppDaemon app and should NOT be loaded by AppDaemon
+#
+# Usage:
+#   python -m pytest test_ev_charge_control.py
+
+import math
+import os
+import sys
+import types
+
+# ev_charge_control.py imports the AppDaemon hassapi; allocate_currents does not use it
+for name in ("appdaemon", "appdaemon.plugins", "appdaemon.plugins.hass"):
+    sys.modules.setdefault(name, types.ModuleType(name))
+sys.modules.setdefault("appdaemon.plugins.hass.hassapi", types.SimpleNamespace(Hass=object))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ev_charge_control import allocate_currents
+
+PHASES = ["l1", "l2", "l3"]
+
+
+def load(name, floor=6.0, cap=16.0, priority=0, weight=1.0, running=True, adjustable=True, phases=PHASES):
+    """Return an allocation request as compute_allocations builds it."""
+    return {
+        "name": name,
+        "phases": phases,
+        "priority": priority,
+        "weight": weight,
+        "floor": floor,
+        "cap": cap if adjustable else floor,
+        "running": running,
+        "candidate": not running,
+        "adjustable": adjustable,
+    }
+
+
+def capacity(amperes):
+    return {phase: float(amperes) for phase in PHASES}
+
+
+def test_lowest_priority_is_preempted_first():
+    loads = [
+        load("garage", priority=1),
+        load("guest", priority=0),
+        load("car", priority=2, running=False),
+    ]
+    # 14 A fits two minimum currents, not three
+    allocation, preempted = allocate_currents(loads, capacity(14))
+    assert preempted == {"car": ["guest"]}
+    assert allocation["guest"] == 0
+    assert math.isclose(allocation["garage"] + allocation["car"], 14)
+    assert allocation["car"] >= 6 and allocation["garage"] >= 6
+
+
+def test_waiting_load_does_not_preempt_higher_priority():
+    loads = [load("car", priority=2), load("guest", priority=0, running=False)]
+    allocation, preempted = allocate_currents(loads, capacity(10))
+    assert preempted == {}
+    assert allocation == {"car": 10, "guest": 0}
+
+
+def test_no_preemption_when_stopping_everything_is_not_enough():
+    loads = [load("guest", priority=0), load("car", priority=2, running=False, floor=16)]
+    allocation, preempted = allocate_currents(loads, capacity(12))
+    assert preempted == {}
+    # The lower priority load keeps running and gets the spare current
+    assert allocation == {"guest": 12, "car": 0}
+
+
+def test_weights_split_spare_capacity():
+    loads = [load("car", weight=2.0, cap=32), load("van", weight=1.0, cap=32)]
+    allocation, _ = allocate_currents(loads, capacity(30))
+    # 12 A of minimums, the other 18 A shared 2:1
+    assert math.isclose(allocation["car"], 18)
+    assert math.isclose(allocation["van"], 12)
+
+
+def test_cap_hands_rest_to_other_loads():
+    loads = [load("car", weight=1.0, cap=8), load("van", weight=1.0, cap=32)]
+    allocation, _ = allocate_currents(loads, capacity(30))
+    assert math.isclose(allocation["car"], 8)
+    assert math.isclose(allocation["van"], 22)
+
+
+def test_switched_loads_keep_their_current():
+    loads = [load("heater", floor=10, adjustable=False), load("car", cap=32)]
+    allocation, _ = allocate_currents(loads, capacity(25))
+    assert allocation == {"heater": 10, "car": 15}
+
+
+def test_zero_capacity():
+    loads = [load("car"), load("guest", running=False)]
+    allocation, preempted = allocate_currents(loads, capacity(0))
+    # A running load keeps its minimum, since it draws it until it is stopped; nothing is added
+    assert allocation == {"car": 6, "guest": 0}
+    assert preempted == {}
+
+    allocation, preempted = allocate_currents([load("car", running=False)], capacity(0))
+    assert allocation == {"car": 0}
+    assert preempted == {}
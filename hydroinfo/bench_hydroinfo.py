@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# bench_hydroinfo.py - Benchmark script for the table extractors of hydroinfo.py
+# This file is NOT an AppDaemon app and should NOT be loaded by AppDaemon
+#
+# Runs every extractor of table_extractors.py on the station pages in fixtures/, checks
+# the rows against fixtures/expected.json and reports the time to the first row (what
+# HydrologyData needs), the time to all rows and the peak memory of parsing a page.
+# Backends whose package is not installed are skipped. bs4 is the old full-page parse,
+# measured for comparison only: its html.parser tree nests rows and cells that the page
+# leaves unclosed, which the others read as a browser does, so the app no longer offers it.
+#
+# The pages in fixtures/ are reconstructed from the layout of the vizugy.hu station page,
+# to cover what a real page rarely shows at a given time: a missing reading first,
+# unclosed rows, no table. --capture saves a real page; --write-expected then adds its rows.
+#
+# With --schedule it instead simulates a station publishing hourly readings with a random
+# delay, and compares fetching every hour with the publication aligned schedule of
+# polling.py by fetches per new reading and how old a reading is when it is first seen.
+#
+# Usage:
+#   python bench_hydroinfo.py                        # all backends, all fixtures
+#   python bench_hydroinfo.py --repeat 200 streaming lxml
+#   python bench_hydroinfo.py --capture szeged "https://www.vizugy.hu/?mapModule=OpGrafikon&AllomasVOA=...&mapData=Idosor"
+#   python bench_hydroinfo.py --write-expected lxml  # regenerate expected.json after adding a page
+#   python bench_hydroinfo.py --schedule --days 30
+
+import argparse
+import bisect
+import glob
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import importlib.util
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from polling import PublicationSchedule
+from table_extractors import EXTRACTORS, bs4_rows, get_extractor
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EXPECTED_FILE = os.path.join(FIXTURES, "expected.json")
+
+
+def load_fixtures():
+    """Return {fixture name: page text} of the saved station pages."""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return pages
+
+
+def load_extractor(name):
+    """Return the extractor with the given name, including the bs4 parse the app no longer offers."""
+    if name != "bs4":
+        return get_extractor(name)
+    if importlib.util.find_spec("bs4") is None:
+        raise ImportError("No module named 'bs4'")
+    return bs4_rows
+
+
+def capture(name, url):
+    """Save a station page to fixtures/, as the app receives it."""
+    request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        text = response.read().decode(response.headers.get_content_charset() or "utf-8")
+    path = os.path.join(FIXTURES, f"{name}.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def best_time(function, repeat):
+    """Return the shortest of repeat runs of function, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(name, pages, expected, repeat):
+    """
+    Benchmark one extractor on all pages.
+
+    Returns:
+        dict: Totals over the pages of the first row and all rows times and the largest
+        peak memory, and the pages whose rows differ from the expected rows.
+    """
+    extractor = load_extractor(name)
+    result = {"first": 0.0, "all": 0.0, "peak": 0, "wrong": []}
+    for page_name, text in pages.items():
+        if list(extractor(text)) != expected.get(page_name):
+            result["wrong"].append(page_name)
+        result["first"] += best_time(lambda: next(iter(extractor(text)), None), repeat)
+        result["all"] += best_time(lambda: list(extractor(text)), repeat)
+        tracemalloc.start()
+        list(extractor(text))
+        result["peak"] = max(result["peak"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return result
+
+
+def run_schedule(days, delay_mean, delay_sd, seed=1):
+    """
+    Simulate the fetches of a station publishing a reading every hour.
+
+    Each reading is published delay_mean minutes (standard deviation delay_sd) after
+    its time. Both designs record every fetch in a PublicationSchedule for the metrics;
+    "fixed" fetches every hour from a random minute, "adaptive" when the schedule plans.
+
+    Returns:
+        dict: Metrics per design, with the fetches per day.
+    """
+    rng = random.Random(seed)
+    cadence = 3600
+    end = int(days * 86400)
+    published = sorted((reading_time + max(60.0, rng.gauss(delay_mean * 60, delay_sd * 60)), reading_time) for reading_time in range(0, end + cadence, cadence))
+    publication_times = [publication for publication, _ in published]
+    latest = []
+    for _, reading_time in published:
+        latest.append(max(reading_time, latest[-1]) if latest else reading_time)
+
+    results = {}
+    start = rng.uniform(0, cadence)
+    for design in ("fixed", "adaptive"):
+        schedule = PublicationSchedule()
+        now = start
+        while now < end:
+            count = bisect.bisect_right(publication_times, now)
+            schedule.observe(now, latest[count - 1] if count else None, cadence)
+            now = now + cadence if design == "fixed" else max(schedule.next_fetch, now + 10)
+        results[design] = dict(schedule.metrics(), fetches_per_day=round(schedule.fetches / days, 1))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the table extractors of hydroinfo.py on saved station pages")
+    parser.add_argument("backends", nargs="*", default=list(EXTRACTORS) + ["bs4"], help="Extractors to run")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per page, the fastest one counts")
+    parser.add_argument("--write-expected", metavar="BACKEND", help="Write expected.json with the rows of this extractor and exit")
+    parser.add_argument("--capture", nargs=2, metavar=("NAME", "URL"), help="Save the station page at URL as fixtures/NAME.html and exit")
+    parser.add_argument("--schedule", action="store_true", help="Simulate the fetch schedules instead")
+    parser.add_argument("--days", type=float, default=14, help="Simulated days of --schedule")
+    parser.add_argument("--delay", type=float, default=20, help="Mean publication delay of --schedule in minutes")
+    parser.add_argument("--delay-sd", type=float, default=4, help="Standard deviation of the publication delay in minutes")
+    options = parser.parse_args()
+
+    if options.schedule:
+        print(f"{options.days:g} days of hourly readings published after {options.delay:g} +- {options.delay_sd:g} minutes")
+        for design, result in run_schedule(options.days, options.delay, options.delay_sd).items():
+            print(f"{design}: {result['fetches_per_day']} fetches per day, {result['fetches_per_update']} per new reading, "
+                  f"readings first seen {result['detection_delay_min']} minutes after their time"
+                  + (f", learned publication delay {result['publication_delay_min']} minutes" if design == "adaptive" else ""))
+        sys.exit(0)
+
+    if options.capture:
+        path = capture(*options.capture)
+        print(f"Saved {path}, add its rows with --write-expected lxml")
+        sys.exit(0)
+
+    pages = load_fixtures()
+    if options.write_expected:
+        extractor = get_extractor(options.write_expected)
+        # One row per line, so a changed page shows up as a readable diff
+        with open(EXPECTED_FILE, "w", encoding="utf-8") as f:
+            f.write("{\n" + ",\n".join(
+                f"{json.dumps(name)}: [" + ",".join(f"\n  {json.dumps(row, ensure_ascii=False)}" for row in extractor(text)) + "\n]"
+                for name, text in pages.items()) + "\n}\n")
+        print(f"Wrote the rows of {len(pages)} pages to {EXPECTED_FILE}")
+        sys.exit(0)
+
+    with open(EXPECTED_FILE, encoding="utf-8") as f:
+        expected = json.load(f)
+    print(f"{len(pages)} pages, {sum(len(text) for text in pages.values()) // 1024} KiB, fastest of {options.repeat} runs")
+    failed = False
+    for name in options.backends:
+        try:
+            result = run(name, pages, expected, options.repeat)
+        except ImportError as e:
+            print(f"{name}: skipped ({e})")
+            continue
+        failed = failed or (bool(result["wrong"]) and name != "bs4")
+        correct = f"wrong rows in {', '.join(result['wrong'])}" if result["wrong"] else "all rows correct"
+        print(f"{name}: first row {result['first'] / len(pages) * 1000:.3f} ms, all rows {result['all'] / len(pages) * 1000:.3f} ms per page, "
+              f"peak memory {result['peak'] // 1024} KiB, {correct}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,214 @@
+import bisect
+import calendar
+import datetime
+import math
+import sqlite3
+import threading
+from array import array
+
+# Readings of the stations of HydrologyData: an in-memory series per station for the
+# derived sensors, and a SQLite store that keeps every reading across restarts.
+#
+# Times are the local times of the website (e.g. "2025.03.10. 08:00") as seconds since
+# the epoch, as if they were UTC, so they need no time zone and compare and subtract
+# as they are. A missing value is NaN in the series and NULL in the store.
+TIMESTAMP_FORMAT = "%Y.%m.%d. %H:%M"
+MISSING = float("nan")
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def parse_timestamp(text):
+    """
+    Convert a timestamp of the website to seconds.
+
+    Returns:
+        int: The time, or None if the text is not a timestamp.
+    """
+    try:
+        return calendar.timegm(datetime.datetime.strptime(text.strip(), TIMESTAMP_FORMAT).timetuple())
+    except ValueError:
+        return None
+
+
+def format_timestamp(seconds):
+    """Convert seconds back to the timestamp format of the website."""
+    return (EPOCH + datetime.timedelta(seconds=seconds)).strftime(TIMESTAMP_FORMAT)
+
+
+def local_now():
+    """Return the current local time in seconds, on the same scale as parse_timestamp."""
+    return calendar.timegm(datetime.datetime.now().timetuple())
+
+
+class Series:
+    """
+    Readings of one station in time order, one array per column.
+
+    Each time is kept once: a reading whose time is already in the series is
+    ignored. Readings older than keep_seconds before the latest one are dropped.
+    """
+
+    def __init__(self, keep_seconds):
+        self.keep_seconds = keep_seconds
+        self.times = array("q")
+        self.water_levels = array("d")
+        self.water_temperatures = array("d")
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def last_time(self):
+        """The time of the latest reading, None if the series is empty."""
+        return self.times[-1] if self.times else None
+
+    def merge(self, readings):
+        """
+        Add readings, skipping the times already in the series.
+
+        Args:
+            readings (iterable): (time, water level, water temperature) tuples in any
+                order, None for a missing value.
+
+        Returns:
+            list: The readings that were added, in time order.
+        """
+        added = []
+        for time, water_level, water_temperature in sorted(readings, key=lambda reading: reading[0]):
+            index = bisect.bisect_left(self.times, time)
+            if index < len(self.times) and self.times[index] == time:
+                continue
+            # Almost always an append; older readings fill a gap
+            self.times.insert(index, time)
+            self.water_levels.insert(index, MISSING if water_level is None else water_level)
+            self.water_temperatures.insert(index, MISSING if water_temperature is None else water_temperature)
+            added.append((time, water_level, water_temperature))
+        self.trim()
+        return added
+
+    def trim(self):
+        """Drop the readings older than keep_seconds before the latest one."""
+        if not self.times:
+            return
+        count = bisect.bisect_left(self.times, self.times[-1] - self.keep_seconds)
+        if count:
+            del self.times[:count]
+            del self.water_levels[:count]
+            del self.water_temperatures[:count]
+
+    def cadence(self, default=3600, samples=24):
+        """Return the median seconds between the last readings, default with fewer than two."""
+        times = self.times[-samples - 1:]
+        gaps = sorted(later - earlier for earlier, later in zip(times, times[1:]))
+        return gaps[len(gaps) // 2] if gaps else default
+
+    def latest(self, column):
+        """
+        Return the latest reading with a value in a column.
+
+        Returns:
+            tuple: (time, value), or None if the column has no value.
+        """
+        for index in range(len(self.times) - 1, -1, -1):
+            if not math.isnan(column[index]):
+                return self.times[index], column[index]
+        return None
+
+    def value_at(self, column, time, tolerance):
+        """Return the latest value at or before time, if it is at most tolerance seconds older."""
+        index = bisect.bisect_right(self.times, time) - 1
+        while index >= 0 and time - self.times[index] <= tolerance:
+            if not math.isnan(column[index]):
+                return column[index]
+            index -= 1
+        return None
+
+    def change(self, column, seconds, tolerance=3600):
+        """
+        Return how much a column changed in the last seconds, up to its latest value.
+
+        Returns:
+            float: The change, or None without a value at both ends.
+        """
+        latest = self.latest(column)
+        if latest is None:
+            return None
+        previous = self.value_at(column, latest[0] - seconds, tolerance)
+        return None if previous is None else latest[1] - previous
+
+    def slope(self, column, seconds):
+        """
+        Return the least squares slope of a column over the last seconds, per hour.
+
+        Returns:
+            float: The slope, or None with fewer than two values.
+        """
+        latest = self.latest(column)
+        if latest is None:
+            return None
+        start = bisect.bisect_left(self.times, latest[0] - seconds)
+        points = [(self.times[index], column[index]) for index in range(start, len(self.times)) if not math.isnan(column[index])]
+        if len(points) < 2:
+            return None
+        mean_time = sum(time for time, _ in points) / len(points)
+        mean_value = sum(value for _, value in points) / len(points)
+        spread = sum((time - mean_time) ** 2 for time, _ in points)
+        if not spread:
+            return None
+        return sum((time - mean_time) * (value - mean_value) for time, value in points) / spread * 3600
+
+
+class HistoryStore:
+    """
+    SQLite store of the readings of all stations.
+
+    One connection is shared by the AppDaemon worker threads, guarded by a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS readings ("
+                "station TEXT NOT NULL, time INTEGER NOT NULL, water_level INTEGER, water_temperature REAL, "
+                "PRIMARY KEY (station, time)) WITHOUT ROWID"
+            )
+
+    def load(self, station, since):
+        """
+        Return the readings of a station from the given time on.
+
+        Returns:
+            list: (time, water level, water temperature) tuples in time order.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT time, water_level, water_temperature FROM readings WHERE station = ? AND time >= ? ORDER BY time",
+                (station, since),
+            ).fetchall()
+
+    def last_time(self, station):
+        """Return the time of the latest stored reading of a station, None if there is none."""
+        with self.lock:
+            return self.connection.execute("SELECT MAX(time) FROM readings WHERE station = ?", (station,)).fetchone()[0]
+
+    def append(self, station, readings):
+        """
+        Store readings of a station in one transaction, ignoring the times already stored.
+
+        Returns:
+            int: The number of readings stored.
+        """
+        with self.lock, self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO readings (station, time, water_level, water_temperature) VALUES (?, ?, ?, ?)",
+                [(station, time, water_level, water_temperature) for time, water_level, water_temperature in readings],
+            )
+            return self.connection.total_changes - before
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
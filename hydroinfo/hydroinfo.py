@@ -1,128 +1,477 @@
 import hassapi as hass
+import hashlib
 import json
+import os
+import random
 import requests
+import threading
 import time
 import datetime
-from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
-from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from history import HistoryStore, Series, format_timestamp, local_now, parse_timestamp
+from polling import PublicationSchedule
+from table_extractors import get_extractor
 
 BASE_URL_TEMPLATE = "https://www.vizugy.hu/?mapModule=OpGrafikon&AllomasVOA={allomas_voa}&mapData=Idosor"
 
+# Stations due within this many seconds are fetched in the current cycle, and cycles are at least this far apart
+DUE_SLACK = 30
+MIN_CYCLE_DELAY = 10
+
+# Entity name and friendly name of a station configured with the single allomas_voa option
+LEGACY_STATION_NAME = "agard"
+LEGACY_FRIENDLY_NAME = "Agárd"
+
+# The fake_useragent data, loaded on first use and kept for the app instances that follow
+USER_AGENT_SOURCE = None
+
+
+def random_user_agent():
+    """Return a random browser User-Agent, loading fake_useragent and its data only once"""
+    global USER_AGENT_SOURCE
+    if USER_AGENT_SOURCE is None:
+        from fake_useragent import UserAgent
+        USER_AGENT_SOURCE = UserAgent()
+    return USER_AGENT_SOURCE.random
+
+
+class Station:
+    """A monitored station, with its sensors and the state of its conditional requests."""
+
+    def __init__(self, allomas_voa, name, friendly_name=None):
+        """
+        Args:
+            allomas_voa (str): The station identifier (VOA code).
+            name (str): Name used in the entity ids, e.g. "agard" for sensor.agard_water_level.
+            friendly_name (str): Name used in the friendly names, defaults to the name in title case.
+        """
+        self.allomas_voa = allomas_voa
+        self.name = name
+        self.friendly_name = friendly_name or name.replace("_", " ").title()
+        self.url = BASE_URL_TEMPLATE.format(allomas_voa=allomas_voa)
+        self.host = urlsplit(self.url).hostname
+        self.water_level_entity = f"sensor.{name}_water_level"
+        self.water_temperature_entity = f"sensor.{name}_water_temperature"
+        self.water_level_trend_entity = f"sensor.{name}_water_level_trend"
+        self.water_level_rate_entity = f"sensor.{name}_water_level_rate"
+        self.water_temperature_trend_entity = f"sensor.{name}_water_temperature_trend"
+
+        # Readings of the last hours, set up by the app from the history store
+        self.series = None
+
+        # Planned fetches, set up by the app
+        self.schedule = None
+
+        # Validators and hash of the last processed page, so an unchanged page is neither parsed nor published
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+        self.fetched = None
+
+        # Fetch statistics, summed over the stations when they are published
+        self.stats = {
+            "requests": 0,
+            "not_modified": 0,
+            "unchanged": 0,
+            "updated": 0,
+            "errors": 0,
+            "bytes_transferred": 0,
+            "last_bytes": 0,
+        }
+        self.last_status = None
+        self.request_time = 0.0
+
+        # Read that outlived the deadline of its cycle; the station is not read again until it is done
+        self.pending = None
+
+
+class HostRateLimiter:
+    """
+    Spaces the requests to the same host.
+
+    Each request reserves the next free slot of its host, min_interval plus a random
+    jitter of up to jitter seconds after the previous one, and waits for it outside
+    the lock, so requests to different hosts never wait for each other.
+    """
+
+    def __init__(self, min_interval, jitter):
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host):
+        """Block until a request to the host may be sent."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.min_interval + random.uniform(0, self.jitter)
+        if slot > now:
+            time.sleep(slot - now)
+
+
 class HydrologyData(hass.Hass):
     def initialize(self):
+        startup_start = time.time()
         self.log(f"HydrologyData initializing at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}", level="INFO")
         
-        # Retrieve the 'allomas_voa' parameter from configuration
-        self.allomas_voa = self.args.get("allomas_voa")
-        if not self.allomas_voa:
-            self.log("Missing 'allomas_voa' in configuration", level="ERROR")
+        # Stations from the 'stations' list, or the single 'allomas_voa' with the original entity names
+        self.stations = self._load_stations()
+        if not self.stations:
+            self.log("Missing 'stations' or 'allomas_voa' in configuration", level="ERROR")
             return
         
-        self.log(f"Using allomas_voa: {self.allomas_voa}", level="INFO")
+        for station in self.stations:
+            self.log(f"Using allomas_voa: {station.allomas_voa} for {station.friendly_name} ({station.name})", level="INFO")
+
+        # Extractor of the table rows: streaming (default) or lxml
+        self.parser = self.args.get("parser", "streaming")
+        try:
+            self.extract_rows = get_extractor(self.parser)
+        except (ValueError, ImportError) as e:
+            self.log(f"Cannot use parser {self.parser}: {e}, using streaming", level="ERROR")
+            self.parser = "streaming"
+            self.extract_rows = get_extractor(self.parser)
+
+        # One pooled session for all requests, with explicit connect and read timeouts, created by the first cycle
+        self.timeout = (float(self.args.get("connect_timeout", 5)), float(self.args.get("read_timeout", 30)))
+        self.max_workers = max(1, min(int(self.args.get("max_workers", 4)), len(self.stations)))
+        self.session = None
+
+        # The stations are fetched and parsed concurrently, the requests to one host spaced by the rate limit
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hydroinfo")
 
-        # Schedule the `read_data` function to run every hour
-        interval_seconds = 1 * 60 * 60
-        self.log(f"Scheduling read_data to run every {interval_seconds} seconds", level="INFO")
+        # The cycles run on their own thread, so no AppDaemon worker thread waits for the website,
+        # and the stations that are not done by cycle_deadline seconds are left to the next cycle
+        self.cycle_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hydroinfo_cycle")
+        self.cycle = None
+        self.cycle_deadline = float(self.args.get("cycle_deadline", sum(self.timeout) + 30))
+        self.rate_limiter = HostRateLimiter(float(self.args.get("rate_limit", 0.5)), float(self.args.get("jitter", 0.25)))
+
+        # Fetch statistics of all stations, published to stats_entity
+        self.stats_entity = self.args.get("stats_entity", "sensor.hydroinfo_fetch")
+
+        # Every reading of the pages is kept: the last hours in memory for the derived sensors, all in the history store
+        self.trend_hours = float(self.args.get("trend_hours", 24))
+        self.rate_hours = float(self.args.get("rate_hours", 3))
+        self.history_hours = max(float(self.args.get("history_hours", 48)), self.trend_hours + 1, self.rate_hours)
+        # Relative to data_dir, AppDaemon's configuration directory by default
+        data_dir = self.args.get("data_dir") or getattr(self, "config_dir", None) or os.path.dirname(os.path.abspath(__file__))
+        self.history_file = self.args.get("history_file", "hydroinfo_history.db")
+        if self.history_file:
+            self.history_file = os.path.join(data_dir, self.history_file)
+        self.store = None
+        if self.history_file:
+            try:
+                self.store = HistoryStore(self.history_file)
+            except Exception as e:
+                self.log(f"Could not open the history store {self.history_file}: {e}", level="WARNING")
+        self._load_history()
+
+        # Each station is fetched just after its next reading is expected to be published, a missed reading
+        # with the next one unless max_retries is set; or every interval without adaptive_schedule
+        self.interval = float(self.args.get("interval", 3600))
+        self.adaptive_schedule = bool(self.args.get("adaptive_schedule", True))
+        for station in self.stations:
+            station.schedule = PublicationSchedule(
+                min_backoff=float(self.args.get("retry_interval", 120)),
+                max_retries=int(self.args.get("max_retries", 0)),
+                max_interval=self.interval,
+                margin=float(self.args.get("publication_margin", 60)),
+            )
+        self.timer = None
+        self.log(f"Scheduling read_data {'after the expected publications' if self.adaptive_schedule else f'every {self.interval:g} seconds'}", level="INFO")
         
-        # Run immediately and then every hour
+        self.startup_time = time.time() - startup_start
+        self.log(f"HydrologyData initialized in {self.startup_time * 1000:.0f} ms", level="INFO")
+
+        # Start the first cycle, each cycle schedules the next one
         self.log("Running read_data immediately", level="INFO")
         self.read_data({})
-        
-        # Schedule for future runs
-        self.run_every(self.read_data, "now+10", interval_seconds)
 
-    def _fetch_data(self):
-        """Fetch data from the water monitoring website"""
-        user_agent = UserAgent().random
-        headers = {"User-Agent": user_agent}
+    def terminate(self):
+        """Stop the fetch threads and close the connections"""
+        if hasattr(self, "executor"):
+            self.cycle_executor.shutdown(wait=False, cancel_futures=True)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if self.session:
+                self.session.close()
+        if getattr(self, "store", None):
+            self.store.close()
+
+    def _load_history(self):
+        """Fill the series of the stations with their latest stored readings"""
+        for station in self.stations:
+            station.series = Series(self.history_hours * 3600)
+            if not self.store:
+                continue
+            try:
+                last_time = self.store.last_time(station.name)
+                if last_time is not None:
+                    station.series.merge(self.store.load(station.name, last_time - station.series.keep_seconds))
+            except Exception as e:
+                self.log(f"Could not load the history of {station.name}: {e}", level="WARNING")
+                continue
+            if len(station.series):
+                self.log(f"Loaded {len(station.series)} readings of {station.name} up to {format_timestamp(station.series.last_time)}", level="INFO")
+
+    def _load_stations(self):
+        """
+        Build the stations from the configuration
+
+        Returns:
+            list: The stations, empty if none is configured
+        """
+        stations = []
+        for index, config in enumerate(self.args.get("stations") or []):
+            if isinstance(config, str):
+                config = {"allomas_voa": config}
+            allomas_voa = config.get("allomas_voa")
+            if not allomas_voa:
+                self.log(f"Missing 'allomas_voa' in station {index + 1}, skipping it", level="ERROR")
+                continue
+            name = config.get("name") or f"hydroinfo_{index + 1}"
+            if any(station.name == name for station in stations):
+                self.log(f"Duplicate station name {name}, skipping allomas_voa {allomas_voa}", level="ERROR")
+                continue
+            stations.append(Station(allomas_voa, name, config.get("friendly_name")))
+
+        allomas_voa = self.args.get("allomas_voa")
+        if allomas_voa and not stations:
+            stations.append(Station(allomas_voa, LEGACY_STATION_NAME, LEGACY_FRIENDLY_NAME))
+        return stations
+
+    def _create_session(self):
+        """Create the HTTP session, keeping the connection to the website open between requests"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        user_agent = random_user_agent()
+        session.headers.update({"User-Agent": user_agent, "Accept-Encoding": "gzip, deflate"})
         self.log(f"Generated User-Agent: {user_agent}", level="INFO")
+        return session
+
+    def _fetch_data(self, station):
+        """
+        Fetch the page of a station from the water monitoring website
+
+        Runs on the fetch threads, so it only touches the station.
+
+        Returns:
+            Response: The response with the page, None on an error or if the page has not changed
+        """
+        headers = {}
+        if station.etag:
+            headers["If-None-Match"] = station.etag
+        if station.last_modified:
+            headers["If-Modified-Since"] = station.last_modified
 
-        base_url = BASE_URL_TEMPLATE.format(allomas_voa=self.allomas_voa)
-        self.log(f"Requesting data from URL: {base_url}", level="INFO")
+        self.rate_limiter.wait(station.host)
+        self.log(f"Requesting data from URL: {station.url}", level="INFO")
 
+        stats = station.stats
         request_start = time.time()
-        response = requests.get(base_url, headers=headers, verify=True)
-        request_time = time.time() - request_start
-        self.log(f"HTTP request completed in {request_time:.2f} seconds with status code: {response.status_code}", level="INFO")
+        try:
+            response = self.session.get(station.url, headers=headers, timeout=self.timeout, verify=True)
+        except requests.RequestException as e:
+            stats["errors"] += 1
+            station.request_time, station.last_status = time.time() - request_start, None
+            self.log(f"HTTP request for {station.name} failed: {e}", level="ERROR")
+            return None
+        station.request_time, station.last_status = time.time() - request_start, response.status_code
+        self.log(f"HTTP request for {station.name} completed in {station.request_time:.2f} seconds with status code: {response.status_code}", level="INFO")
         
+        stats["requests"] += 1
+        stats["last_bytes"] = int(response.headers.get("Content-Length", len(response.content)))
+        stats["bytes_transferred"] += stats["last_bytes"]
+
+        if response.status_code == 304:
+            stats["not_modified"] += 1
+            self.log(f"Page of {station.name} not modified since the last request", level="INFO")
+            return None
+
         if response.status_code != 200:
-            self.log(f"HTTP error: {response.status_code}", level="ERROR")
+            stats["errors"] += 1
+            self.log(f"HTTP error for {station.name}: {response.status_code}", level="ERROR")
             return None
             
+        # The website does not always send validators, so the content is compared as well
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        if content_hash == station.content_hash:
+            stats["unchanged"] += 1
+            self.log(f"Page of {station.name} unchanged since the last request, skipping parsing", level="INFO")
+            return None
+
+        # Kept once the page is processed, so a page that failed is fetched and parsed again
+        station.fetched = (response.headers.get("ETag"), response.headers.get("Last-Modified"), content_hash)
         return response
 
-    def _parse_html(self, response):
-        """Parse HTML content and extract the data table"""
-        parse_start = time.time()
-        self.log("Parsing HTML content", level="INFO")
-        
-        html_content = BeautifulSoup(response.content, "html.parser")
-        table = html_content.find("table", class_="vizmercelista")
-        
-        parse_time = time.time() - parse_start
-        self.log(f"HTML parsing completed in {parse_time:.2f} seconds", level="INFO")
-        
-        if not table:
-            self.log("The 'vizmercelista' table was not found.", level="ERROR")
-            return None
-            
-        return table
+    def _publish_stats(self, cycle_time, stations):
+        """Publish the cycle time, the transfer statistics and the freshness of all stations"""
+        totals = {key: sum(station.stats[key] for station in self.stations) for key in self.stations[0].stats}
+        slowest = max(stations, key=lambda station: station.request_time)
 
-    def _process_water_level(self, timestamp, water_level):
-        """Process and update water level sensor"""
-        if not water_level or not water_level.isdigit():
-            self.log(f"Invalid water level value: {water_level}", level="WARNING")
-            return False
-            
-        water_level_value = int(water_level)
+        # Freshness against request count: fetches per new reading and how old a reading was when it was first seen
+        schedules = [station.schedule for station in self.stations]
+        fetches = sum(schedule.fetches for schedule in schedules)
+        updates = sum(schedule.updates for schedule in schedules)
+        detections = sum(schedule.detections for schedule in schedules)
+        now = local_now()
+        ages = [now - station.series.last_time for station in self.stations if station.series.last_time is not None]
+        freshness = {
+            "fetches_per_update": round(fetches / updates, 2) if updates else None,
+            "detection_delay_min": round(sum(schedule.detection_delay_total for schedule in schedules) / detections / 60, 1) if detections else None,
+            "data_age_min": round(max(ages) / 60) if ages else None,
+            "publication_delay_min": {station.name: station.schedule.metrics()["publication_delay_min"] if self.adaptive_schedule else None
+                                      for station in self.stations},
+            "next_fetch": {station.name: format_timestamp(station.schedule.next_fetch) for station in self.stations},
+        }
         self.set_state(
-            "sensor.agard_water_level",
-            state=water_level_value,
-            unit_of_measurement="cm",
+            self.stats_entity,
+            state=round(cycle_time * 1000),
             attributes={
+                "unit_of_measurement": "ms",
                 "state_class": "measurement",
-                "last_changed": timestamp,
-                "unit_of_measurement": "cm",
-                "friendly_name": "Agárd Water Level",
-                "device_class": "measurement",
+                "friendly_name": "Hydroinfo Fetch Time",
+                **totals,
+                "last_status": {station.name: station.last_status for station in self.stations},
+                "slowest_station": slowest.name,
+                "slowest_request_ms": round(slowest.request_time * 1000),
+                "startup_ms": round(self.startup_time * 1000),
+                **freshness,
             },
         )
-        self.log(f"Water level sensor updated: {timestamp} - {water_level_value} cm")
-        return True
 
-    def _process_water_temperature(self, timestamp, water_temp):
-        """Process and update water temperature sensor"""
+    def _parse_html(self, response):
+        """
+        Extract the rows of the data table
+        
+        Returns:
+            iterator: The cell texts of each row after the header, parsed as they are consumed
+        """
+        # Decoding with the declared charset avoids the charset detection of response.text
+        text = response.content.decode(response.encoding or "utf-8", errors="replace")
+        return self.extract_rows(text)
+
+    def _read_station(self, station):
+        """
+        Fetch and parse the page of a station, on a fetch thread
+
+        The rows are newest first, so parsing stops at the first row that is already in
+        the series: after a downtime all the missed rows are read, otherwise only the new ones.
+
+        Returns:
+            tuple: (rows newer than the series, whether a row already in the series was
+            reached), None if the page was not fetched or has not changed
+        """
+        response = self._fetch_data(station)
+        if not response:
+            return None
+
+        # The extractor only parses as far as the rows are consumed
+        parse_start = time.time()
+        last_time = station.series.last_time
+        rows = []
+        known = False
+        for cols in self._parse_html(response):
+            row_time = parse_timestamp(cols[0]) if cols else None
+            if last_time is not None and row_time is not None and row_time <= last_time:
+                known = True
+                break
+            rows.append(cols)
+        parse_time = time.time() - parse_start
+        self.log(f"HTML parsing of {station.name} with the {self.parser} parser completed in {parse_time:.3f} seconds, {len(rows)} new rows read", level="INFO")
+        return rows, known
+
+    def _parse_water_level(self, water_level):
+        """Convert a water level cell, None if it has no valid value"""
+        if not water_level.isdigit():
+            if water_level:
+                self.log(f"Invalid water level value: {water_level}", level="WARNING")
+            return None
+        return int(water_level)
+
+    def _parse_water_temperature(self, water_temp):
+        """Convert a water temperature cell, None if it has no valid value"""
         if not water_temp:
-            return False
+            return None
             
         if water_temp == '-':
-            self.log(f"Water temperature not available (value is '-')", level="INFO")
-            return False
+            self.log(f"Water temperature not available (value is '-')", level="DEBUG")
+            return None
             
         if not water_temp.replace('.', '', 1).isdigit():
             self.log(f"Invalid water temperature value: {water_temp}", level="WARNING")
-            return False
+            return None
             
         try:
-            water_temp_value = float(water_temp)
+            return float(water_temp)
+        except ValueError as e:
+            self.log(f"Failed to convert water temperature value: {water_temp} - Error: {e}", level="WARNING")
+            return None
+
+    def _publish_station(self, station):
+        """Update the sensors of a station from the latest readings of its series"""
+        series = station.series
+        latest = series.latest(series.water_levels)
+        if latest:
+            timestamp, water_level_value = format_timestamp(latest[0]), int(latest[1])
             self.set_state(
-                "sensor.agard_water_temperature",
+                station.water_level_entity,
+                state=water_level_value,
+                unit_of_measurement="cm",
+                attributes={
+                    "state_class": "measurement",
+                    "last_changed": timestamp,
+                    "unit_of_measurement": "cm",
+                    "friendly_name": f"{station.friendly_name} Water Level",
+                    "device_class": "measurement",
+                },
+            )
+            self.log(f"Water level sensor of {station.name} updated: {timestamp} - {water_level_value} cm")
+
+        latest = series.latest(series.water_temperatures)
+        if latest:
+            timestamp, water_temp_value = format_timestamp(latest[0]), latest[1]
+            self.set_state(
+                station.water_temperature_entity,
                 state=water_temp_value,
                 unit_of_measurement="°C",
                 attributes={
                     "state_class": "measurement",
                     "last_changed": timestamp,
                     "unit_of_measurement": "°C",
-                    "friendly_name": "Agárd Water Temperature",
+                    "friendly_name": f"{station.friendly_name} Water Temperature",
                     "device_class": "temperature",
                 },
             )
-            self.log(f"Water temperature sensor updated: {timestamp} - {water_temp_value} °C")
-            return True
-        except ValueError as e:
-            self.log(f"Failed to convert water temperature value: {water_temp} - Error: {e}", level="WARNING")
-            return False
+            self.log(f"Water temperature sensor of {station.name} updated: {timestamp} - {water_temp_value} °C")
+
+        # Derived sensors, only when there are enough readings for them
+        trend_seconds = self.trend_hours * 3600
+        derived = (
+            (station.water_level_trend_entity, series.change(series.water_levels, trend_seconds), "cm", f"Water Level Trend {self.trend_hours:g}h", 0),
+            (station.water_level_rate_entity, series.slope(series.water_levels, self.rate_hours * 3600), "cm/h", "Water Level Rate", 2),
+            (station.water_temperature_trend_entity, series.change(series.water_temperatures, trend_seconds), "°C", f"Water Temperature Trend {self.trend_hours:g}h", 1),
+        )
+        for entity, value, unit, name, digits in derived:
+            if value is None:
+                continue
+            self.set_state(
+                entity,
+                state=round(value, digits) if digits else round(value),
+                unit_of_measurement=unit,
+                attributes={
+                    "state_class": "measurement",
+                    "unit_of_measurement": unit,
+                    "friendly_name": f"{station.friendly_name} {name}",
+                },
+            )
+        return bool(len(series))
 
     def _is_valid_row(self, cols):
         """Check if a row has enough valid data"""
@@ -133,55 +482,130 @@ class HydrologyData(hass.Hass):
         return non_empty_count >= 2
 
     def read_data(self, kwargs):
+        """Start a fetch cycle on the cycle thread, returning at once"""
+        if self.cycle and not self.cycle.done():
+            self.log("The previous read_data cycle is still running, skipping this one", level="WARNING")
+            return
+        self.cycle = self.cycle_executor.submit(self._run_cycle)
+
+    def _run_cycle(self):
+        """Fetch, parse and publish the due stations, on the cycle thread (AppDaemon's API is thread safe)"""
         start_time = time.time()
         self.log(f"Starting read_data at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}", level="INFO")
         
         try:
-            # Fetch data from the website
-            response = self._fetch_data()
-            if not response:
-                return
-
-            # Parse the HTML content
-            table = self._parse_html(response)
-            if not table:
-                return
-
-            # Process the data rows
-            processed_water_level = False
-            processed_water_temp = False
-            
-            # Iterate through the rows, skipping the header row
-            allomas_list = islice(table.find_all("tr"), 1, None)
-            
-            for row in allomas_list:
-                # Extract columns from the row
-                cols = [ele.text.strip() for ele in row.find_all("td")]
-                self.log(f"Extracted columns: {cols}")
-                
-                # Skip invalid rows
-                if not self._is_valid_row(cols):
-                    self.log(f"Not enough valid data, skipping row: {cols}", level="WARNING")
+            if self.session is None:
+                self.session = self._create_session()
+
+            # Publish the late reads of earlier cycles that have finished since, and look
+            # again later at the ones still running
+            for station in self.stations:
+                if station.pending is None:
                     continue
-                
-                timestamp = cols[0]
-                water_level = cols[1]  # Vízállás (cm)
-                water_temp = cols[3]  # Vízhő (°C)
-                
-                # Process water level if not already processed
-                if not processed_water_level:
-                    processed_water_level = self._process_water_level(timestamp, water_level)
-                
-                # Process water temperature
-                processed_water_temp = self._process_water_temperature(timestamp, water_temp)
-                
-                # Stop processing after the first valid row with temperature
-                if processed_water_temp:
-                    break
-                    
+                if station.pending.done():
+                    future, station.pending = station.pending, None
+                    self._finish_read(station, future)
+                else:
+                    station.schedule.next_fetch = local_now() + self.cycle_deadline
+
+            due = [station for station in self.stations
+                   if station.pending is None and station.schedule.next_fetch <= local_now() + DUE_SLACK]
+
+            # Fetch and parse the due stations concurrently, publishing each one as it completes
+            futures = {self.executor.submit(self._read_station, station): station for station in due}
+            try:
+                for future in as_completed(futures, timeout=self.cycle_deadline):
+                    self._finish_read(futures.pop(future), future)
+            except TimeoutError:
+                # A running read cannot be cancelled, so it is kept on its station and
+                # published by a later cycle, and the station is not read again meanwhile
+                for future, station in futures.items():
+                    station.stats["errors"] += 1
+                    self.log(f"Reading {station.name} did not finish within {self.cycle_deadline:g} seconds", level="ERROR")
+                    if not future.cancel():
+                        station.pending = future
+                        station.schedule.next_fetch = local_now() + self.cycle_deadline
+                    else:
+                        self._plan_station(station)
+
+            if due:
+                self._publish_stats(time.time() - start_time, due)
+
         except Exception as e:
             # Log any unexpected errors
             self.log(f"An error occurred: {e}", level="ERROR")
         finally:
+            self._schedule_next_cycle()
             execution_time = time.time() - start_time
             self.log(f"read_data execution completed in {execution_time:.2f} seconds at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}", level="INFO")
+
+    def _finish_read(self, station, future):
+        """Publish the result of a finished read of a station and plan its next fetch"""
+        try:
+            result = future.result()
+            if result is not None:
+                self._process_rows(station, *result)
+        except Exception as e:
+            station.stats["errors"] += 1
+            self.log(f"Reading {station.name} failed: {e}", level="ERROR")
+        finally:
+            self._plan_station(station)
+
+    def _plan_station(self, station):
+        """Record the fetch of a station and plan its next one"""
+        now = local_now()
+        updated = station.schedule.observe(now, station.series.last_time, station.series.cadence())
+        if not self.adaptive_schedule:
+            station.schedule.next_fetch = now + self.interval
+        delay = station.schedule.delay() if self.adaptive_schedule else None
+        self.log(
+            f"{'New' if updated else 'No new'} reading of {station.name}, next fetch at {format_timestamp(station.schedule.next_fetch)}"
+            + (f" (publication delay {delay / 60:.0f} minutes)" if delay is not None else ""),
+            level="INFO",
+        )
+
+    def _schedule_next_cycle(self):
+        """Run read_data when the next station is due"""
+        next_fetch = min(station.schedule.next_fetch for station in self.stations)
+        self.timer = self.run_in(self.read_data, max(next_fetch - local_now(), MIN_CYCLE_DELAY))
+
+    def _process_rows(self, station, rows, known):
+        """Add the new rows of a station to its series and the history store, and publish its sensors"""
+        if not rows and not known:
+            self.log(f"The 'vizmercelista' table of {station.name} was not found.", level="ERROR")
+            return
+
+        readings = []
+        for cols in rows:
+            self.log(f"Extracted columns: {cols}", level="DEBUG")
+            
+            # Skip invalid rows
+            if not self._is_valid_row(cols):
+                self.log(f"Not enough valid data, skipping row: {cols}", level="WARNING")
+                continue
+            
+            row_time = parse_timestamp(cols[0])
+            if row_time is None:
+                self.log(f"Invalid timestamp, skipping row: {cols}", level="WARNING")
+                continue
+            water_level = self._parse_water_level(cols[1])  # Vízállás (cm)
+            water_temp = self._parse_water_temperature(cols[3])  # Vízhő (°C)
+            if water_level is not None or water_temp is not None:
+                readings.append((row_time, water_level, water_temp))
+
+        if not readings and not known:
+            return
+
+        added = station.series.merge(readings)
+        if added and self.store:
+            try:
+                self.store.append(station.name, added)
+            except Exception as e:
+                self.log(f"Could not store the readings of {station.name}: {e}", level="WARNING")
+        if len(added) > 1:
+            self.log(f"Added {len(added)} readings of {station.name} from {format_timestamp(added[0][0])} to {format_timestamp(added[-1][0])}", level="INFO")
+
+        if self._publish_station(station):
+            # Only a page that was processed is skipped next time
+            station.etag, station.last_modified, station.content_hash = station.fetched
+            station.stats["updated"] += 1
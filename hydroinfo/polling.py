@@ -0,0 +1,137 @@
+# Fetch schedule of a station of HydrologyData, aligned with when the website publishes
+# its readings instead of a fixed interval.
+#
+# A reading for time T appears on the page some delay after T. The next fetch is planned
+# a margin after the expected publication of the next reading, T + cadence + delay. Each
+# planned fetch either finds that reading or not, and the planned delay follows these
+# outcomes to the given quantile of the publication delays (stochastic approximation):
+# a miss moves it later by a step, a hit earlier by step * (1 - quantile) / quantile, so
+# it settles where that share of the fetches find their reading. The step starts large
+# and shrinks, so a new station is learned in a few readings.
+#
+# A fetch that misses its reading is not retried (up to max_retries times if set): the
+# next fetch is planned for the following reading, and brings both. So the schedule never
+# fetches more often than once per reading, the same as fetching every cadence.
+#
+# Times are seconds on the scale of the readings (history.parse_timestamp), so a
+# constant offset between the clock of the website and ours ends up in the delay.
+MIN_STEP = 60
+INITIAL_STEP = 900
+
+
+class PublicationSchedule:
+    """Learns the publication delay of a station and plans its fetches."""
+
+    def __init__(self, min_backoff=120, max_interval=3600, margin=60, quantile=0.97, max_retries=0):
+        """
+        Args:
+            min_backoff (float): Seconds before the first retry of a missed reading.
+            max_interval (float): Longest time between two fetches.
+            margin (float): Seconds to wait after the expected publication time.
+            quantile (float): Share of the planned fetches that should find their reading;
+                higher means fewer readings seen an interval late but the others seen later.
+            max_retries (int): Retries of a missed reading before waiting for the next one,
+                each one a fetch more than fetching every cadence.
+        """
+        self.min_backoff = min_backoff
+        self.max_interval = max_interval
+        self.margin = margin
+        self.quantile = quantile
+        self.max_retries = max_retries
+        self.planned_delay = 0.0
+        self.outcomes = 0
+        self.last_data_time = None
+        self.last_check = None
+        self.target = None
+        self.planned = False
+        self.retries = 0
+        self.backoff = 0
+        self.next_fetch = 0
+
+        # Freshness against request count, reported as metrics
+        self.fetches = 0
+        self.updates = 0
+        self.detections = 0
+        self.detection_delay_total = 0.0
+
+    def delay(self):
+        """Return the planned publication delay in seconds, None before the first planned fetch."""
+        return self.planned_delay if self.outcomes else None
+
+    def observe(self, now, last_data_time, cadence):
+        """
+        Record a fetch and plan the next one.
+
+        Args:
+            now (float): Time of the fetch.
+            last_data_time (int): Time of the latest reading after the fetch, None if there is none.
+            cadence (float): Seconds between the readings of the station.
+
+        Returns:
+            bool: Whether the fetch brought a new latest reading.
+        """
+        self.fetches += 1
+        updated = last_data_time is not None and (self.last_data_time is None or last_data_time > self.last_data_time)
+        found = updated and self.target is not None and last_data_time >= self.target
+        if self.planned and self.retries == 0:
+            # The planned fetch of a reading: follow its outcome
+            self.outcomes += 1
+            step = max(MIN_STEP, INITIAL_STEP / self.outcomes ** 0.5)
+            if found:
+                self.planned_delay = max(self.planned_delay - step * (1 - self.quantile) / self.quantile, 0.0)
+            else:
+                self.planned_delay += step
+        if updated:
+            if self.last_check is not None and self.last_data_time is not None:
+                # Every new reading counts, also the ones a missed fetch left for this one
+                reading_time = last_data_time
+                while reading_time > self.last_data_time:
+                    self.detections += 1
+                    self.detection_delay_total += now - reading_time
+                    reading_time -= cadence or last_data_time - self.last_data_time
+            self.updates += 1
+            self.last_data_time = last_data_time
+        if found or self.target is None or self.retries >= self.max_retries:
+            self.retries = 0
+            self.backoff = 0
+        else:
+            self.retries += 1
+            self.backoff = min(self.backoff * 2, self.max_interval) if self.backoff else self.min_backoff
+        self.last_check = now
+        self.next_fetch = self.plan(now, cadence)
+        return updated
+
+    def plan(self, now, cadence):
+        """Return the time of the next fetch, and set the reading it is planned for."""
+        self.planned = False
+        if self.last_data_time is None or not cadence:
+            self.target = None
+            return now + self.max_interval
+        if self.retries:
+            # Retry of a missed reading with exponential backoff
+            return min(now + self.backoff, now + self.max_interval)
+        # The reading after the latest one, or after the one the last fetch missed
+        target = self.last_data_time + cadence
+        if self.target is not None and target <= self.target:
+            target = self.target + cadence
+        expected = target + self.planned_delay + self.margin
+        while expected <= now:
+            target += cadence
+            expected += cadence
+        self.target = target
+        if target > now + self.max_interval:
+            # The reading is not even taken within max_interval: an early fetch, which says nothing about the delay
+            return now + self.max_interval
+        self.planned = True
+        return expected
+
+    def metrics(self):
+        """Return the request count and freshness metrics."""
+        delay = self.delay()
+        return {
+            "fetches": self.fetches,
+            "updates": self.updates,
+            "fetches_per_update": round(self.fetches / self.updates, 2) if self.updates else None,
+            "detection_delay_min": round(self.detection_delay_total / self.detections / 60, 1) if self.detections else None,
+            "publication_delay_min": round(delay / 60, 1) if delay is not None else None,
+        }
@@ -0,0 +1,163 @@
+import html.parser
+import importlib.util
+
+# Extractors of the rows of the "vizmercelista" table of a vizugy.hu station page,
+# used by HydrologyData. Each extractor is a function taking the page as text and
+# yielding the cell texts of every table row after the header row, lazily, so the
+# caller can stop at the first row it needs:
+#
+#   streaming  html.parser on the table only, rows yielded as they complete (default)
+#   lxml       lxml.html on the table only, needs the optional lxml package
+#
+# bs4_rows is the previous BeautifulSoup parse of the whole page. It is not offered by
+# get_extractor: html.parser nests the rows and cells a page leaves unclosed, so it
+# returns wrong rows for such pages. bench_hydroinfo.py still measures it for comparison.
+TABLE_CLASS = "vizmercelista"
+CHUNK_SIZE = 256
+
+
+def find_table(text, table_class=TABLE_CLASS):
+    """
+    Locate the table with the given class without parsing the page.
+
+    Returns:
+        tuple: (start, end) offsets of the table, end is None if the table is not
+        closed, or None if the class does not appear in the page.
+    """
+    position = text.find(table_class)
+    while position >= 0:
+        start = text.rfind("<table", 0, position)
+        # The class has to be in the opening tag of the table, not in a later tag
+        if start >= 0 and text.find(">", start, position) < 0:
+            end = text.find("</table>", position)
+            return start, (end + len("</table>") if end >= 0 else None)
+        position = text.find(table_class, position + 1)
+    return None
+
+
+class RowCollector(html.parser.HTMLParser):
+    """Collect the cell texts of the rows of one table, fed from its opening tag."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.row = None
+        self.cell = None
+        self.depth = 0
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.depth += 1
+        elif self.depth != 1:
+            return
+        elif tag == "tr":
+            self.close_row()
+            self.row = []
+        elif tag == "td" and self.row is not None:
+            self.close_cell()
+            self.cell = []
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            self.depth -= 1
+            if self.depth <= 0:
+                self.close_row()
+                self.done = True
+        elif self.depth != 1:
+            return
+        elif tag == "td":
+            self.close_cell()
+        elif tag == "tr":
+            self.close_row()
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+    def close_cell(self):
+        if self.cell is not None:
+            self.row.append("".join(self.cell).strip())
+            self.cell = None
+
+    def close_row(self):
+        # Rows and cells may be left unclosed in HTML
+        if self.row is not None:
+            self.close_cell()
+            self.rows.append(self.row)
+            self.row = None
+
+
+def streaming_rows(text):
+    """Yield the rows of the table, parsing only as much of it as the caller consumes."""
+    location = find_table(text)
+    if location is None:
+        return
+    start, end = location
+    if end is None:
+        end = len(text)
+    collector = RowCollector()
+    header = True
+    for offset in range(start, end, CHUNK_SIZE):
+        collector.feed(text[offset:min(offset + CHUNK_SIZE, end)])
+        if offset + CHUNK_SIZE >= end:
+            collector.close()
+            collector.close_row()
+        rows, collector.rows = collector.rows, []
+        for row in rows:
+            if header:
+                header = False
+                continue
+            yield row
+        if collector.done:
+            return
+
+
+def lxml_rows(text):
+    """Yield the rows of the table, parsed with lxml."""
+    import lxml.html
+
+    location = find_table(text)
+    if location is None:
+        return
+    start, end = location
+    table = lxml.html.fragment_fromstring(text[start:end])
+    rows = table.iter("tr")
+    next(rows, None)
+    for row in rows:
+        yield [cell.text_content().strip() for cell in row.iterchildren("td")]
+
+
+def bs4_rows(text):
+    """Yield the rows of the table, parsed with BeautifulSoup from the whole page (wrong rows if rows are left unclosed)."""
+    from bs4 import BeautifulSoup
+
+    table = BeautifulSoup(text, "html.parser").find("table", class_=TABLE_CLASS)
+    if not table:
+        return
+    rows = table.find_all("tr")
+    for row in rows[1:]:
+        yield [cell.text.strip() for cell in row.find_all("td")]
+
+
+EXTRACTORS = {
+    "streaming": streaming_rows,
+    "lxml": lxml_rows,
+}
+
+
+def get_extractor(name):
+    """
+    Return the extractor with the given name.
+
+    Raises:
+        ValueError: If there is no such extractor.
+        ImportError: If the extractor's package is not installed.
+    """
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown parser {name!r}, expected one of {', '.join(EXTRACTORS)}")
+    # Fail at startup rather than at the first page, without importing the package yet
+    package = {"lxml": "lxml"}.get(name)
+    if package and importlib.util.find_spec(package) is None:
+        raise ImportError(f"No module named {package!r}")
+    return EXTRACTORS[name]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# test_history.py - Test script for the Series of history.py
+# This file is NOT an AppDaemon app and should NOT be loaded by AppDaemon
+#
+# Usage:
+#   python -m pytest test_history.py
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from history import Series
+
+HOUR = 3600
+
+
+def test_merge_skips_known_times():
+    series = Series(keep_seconds=10 * HOUR)
+    added = series.merge([(2 * HOUR, 120, 4.5), (HOUR, 110, None)])
+    assert added == [(HOUR, 110, None), (2 * HOUR, 120, 4.5)]
+    assert list(series.times) == [HOUR, 2 * HOUR]
+    assert math.isnan(series.water_temperatures[0])
+
+    # A known time is ignored even with another value; an older reading fills its gap
+    added = series.merge([(2 * HOUR, 999, 9.9), (HOUR + HOUR // 2, 115, 4.4), (3 * HOUR, 130, 4.6)])
+    assert added == [(HOUR + HOUR // 2, 115, 4.4), (3 * HOUR, 130, 4.6)]
+    assert list(series.times) == [HOUR, HOUR + HOUR // 2, 2 * HOUR, 3 * HOUR]
+    assert list(series.water_levels) == [110, 115, 120, 130]
+    assert series.last_time == 3 * HOUR
+
+
+def test_merge_trims_old_readings():
+    series = Series(keep_seconds=2 * HOUR)
+    series.merge([(hour * HOUR, hour, None) for hour in range(5)])
+    # Readings exactly keep_seconds before the latest one are kept
+    assert list(series.times) == [2 * HOUR, 3 * HOUR, 4 * HOUR]
+    assert len(series) == 3
+    # Readings older than the kept ones are dropped right away
+    series.merge([(HOUR, 1, None)])
+    assert list(series.times) == [2 * HOUR, 3 * HOUR, 4 * HOUR]
+
+
+def test_change():
+    series = Series(keep_seconds=24 * HOUR)
+    series.merge([(0, 100, None), (HOUR, 105, None), (2 * HOUR, None, None), (3 * HOUR, 112, None)])
+    # From the latest value back to the value at or before that time
+    assert series.change(series.water_levels, 3 * HOUR) == 12
+    # The missing value at 2 h is skipped for the one at 1 h, within the tolerance
+    assert series.change(series.water_levels, HOUR) == 7
+    assert series.change(series.water_levels, HOUR, tolerance=HOUR / 2) is None
+    # No value before the series started
+    assert series.change(series.water_levels, 4 * HOUR) is None
+    assert series.change(series.water_temperatures, HOUR) is None
+
+
+def test_slope_with_gaps():
+    series = Series(keep_seconds=24 * HOUR)
+    # 2 cm per hour, with missing values that must not count as zeros
+    series.merge([(hour * HOUR, None if hour in (2, 3) else 100 + 2 * hour, None) for hour in range(7)])
+    assert math.isclose(series.slope(series.water_levels, 6 * HOUR), 2.0)
+    # Only the values within the last seconds of the latest value count
+    series.merge([(7 * HOUR, 200, None)])
+    assert math.isclose(series.slope(series.water_levels, HOUR), 200 - 112)
+    # Fewer than two values
+    assert series.slope(series.water_temperatures, 6 * HOUR) is None
+    series.merge([(8 * HOUR, None, 5.0)])
+    assert series.slope(series.water_temperatures, 6 * HOUR) is None
+
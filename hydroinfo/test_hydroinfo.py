@@ -36,6 +36,9 @@ class MockHass:
         # Immediately run the callback for testing
         callback({})
 
+    def run_in(self, callback, delay, **kwargs):
+        logger.info(f"Scheduled {callback.__name__} to run in {delay:.0f} seconds")
+
 # Create a mock hassapi module
 sys.modules['hassapi'] = type('hassapi', (), {'Hass': MockHass})
 
@@ -50,8 +53,9 @@ if __name__ == "__main__":
     # Configure the app with the allomas_voa from the YAML file
     hydrology_data.args = {"allomas_voa": "1649619E-97AB-11D4-BB62-00508BA24287"}
     
-    # Initialize the app
+    # Initialize the app, which returns before the first cycle has run, and wait for the cycle
     hydrology_data.initialize()
+    hydrology_data.cycle.result()
     
     # Print the final states
     print("\nFinal states:")
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# bench_phase_current_alert.py - Benchmark script for phase_current_alert.py
+# This file is NOT an AppDaemon app and should NOT be loaded by AppDaemon
+#
+# Usage:
+#   python bench_phase_current_alert.py                 # synthetic trace
+#   python bench_phase_current_alert.py trace.csv       # recorded trace (timestamp,phase,current)
+#   python bench_phase_current_alert.py traces/*.trace  # traces of PhaseCurrentRecorder
+#   python bench_phase_current_alert.py --p1            # P1 telegram parser throughput only
+
+import sys
+import os
+import csv
+import datetime
+import math
+import random
+import time
+import types
+
+
+def load_app_module():
+    """Import phase_current_alert without AppDaemon installed."""
+    if "hassapi" not in sys.modules:
+        sys.modules["hassapi"] = types.SimpleNamespace(Hass=object)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import phase_current_alert
+    return phase_current_alert
+
+
+def load_csv_trace(path):
+    """Load a trace of (timestamp, phase, current) rows from a CSV file."""
+    trace = []
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            try:
+                trace.append((float(row[0]), row[1], float(row[2])))
+            except (ValueError, IndexError):
+                continue
+    trace.sort(key=lambda sample: sample[0])
+    return trace
+
+
+def synthetic_trace(hours=24, seed=1, base_load=10.0):
+    """
+    Generate a 1 Hz trace of three phases with a base load (by default
+    including an EV charging on all phases), an oven on L1, inrush spikes
+    and a few real overloads.
+    """
+    rng = random.Random(seed)
+    trace = []
+    oven_until = 0
+    overload_until = 0
+    overload_current = 0.0
+    for second in range(hours * 3600):
+        if second >= oven_until and rng.random() < 1 / 3600:
+            oven_until = second + rng.randint(600, 2400)
+        if second >= overload_until and rng.random() < 1 / 7200:
+            overload_until = second + rng.randint(60, 600)
+            overload_current = rng.uniform(6, 20)
+        for phase in ("L1", "L2", "L3"):
+            current = rng.uniform(1, 4) + base_load
+            if phase == "L1" and second < oven_until:
+                current += 8
+            if phase == "L2" and second < overload_until:
+                current += overload_current
+            if rng.random() < 0.001:
+                current += rng.uniform(20, 40)  # motor inrush spike
+            trace.append((float(second), phase, current))
+    return trace
+
+
+def heat_pump_trace(days=3, seed=2, start=datetime.datetime(2026, 1, 5)):
+    """
+    Generate a 1 Hz trace of three phases with a small base load and loads that
+    recur at the same time every day: a heat pump on L1 that cycles 15 minutes
+    on (ramping up to 9 A over 3 minutes) and 15 minutes off from 6:00 to 9:00
+    and from 17:00 to 22:00, and a 7 A load on L2 from 18:00 to 19:00.
+
+    The trace starts at local midnight of start, so the time of day of the
+    samples matches what the apps see during a replay.
+    """
+    rng = random.Random(seed)
+    origin = start.timestamp()
+    trace = []
+    for second in range(days * 86400):
+        second_of_day = second % 86400
+        heating = 6 * 3600 <= second_of_day < 9 * 3600 or 17 * 3600 <= second_of_day < 22 * 3600
+        for phase in ("L1", "L2", "L3"):
+            current = rng.uniform(1, 4)
+            if phase == "L1" and heating and second_of_day % 1800 < 900:
+                current += 9 * min(second_of_day % 1800 / 180, 1.0)
+            if phase == "L2" and 18 * 3600 <= second_of_day < 19 * 3600:
+                current += 7
+            trace.append((origin + second, phase, round(current, 2)))
+    return trace
+
+
+def create_bank(module, circuits, rating, curve="C"):
+    """Create a circuit bank where every breaker has the same rating and curve."""
+    magnetic = module.TRIP_CURVES[curve]["magnetic_min"]
+    return module.CircuitBank([rating] * circuits, [rating] * circuits, [magnetic] * circuits)
+
+
+def bench_per_sample_cost(module, trace, rating):
+    """Measure the cost of adding a sample to the circuit bank."""
+    phases = sorted({phase for timestamp, phase, current in trace})
+    index = {phase: i for i, phase in enumerate(phases)}
+    bank = create_bank(module, len(phases), rating)
+    start = time.perf_counter()
+    for timestamp, phase, current in trace:
+        bank.add(index[phase], current, timestamp)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(trace) * 1e9
+
+
+def bench_scale(module, circuits, seconds=60, seed=1):
+    """
+    Feed every circuit one sample per second and run the vectorized evaluation
+    once per second, as the app does at 1 Hz.
+
+    Returns:
+        tuple: (mean seconds spent per 1 second tick, worst tick in seconds)
+    """
+    rng = random.Random(seed)
+    bank = create_bank(module, circuits, 16.0)
+    rules = [{"metric": "sustained", "duration": 5}, {"metric": "percentile", "percentile": 90, "factor": 1.5}]
+    ticks = []
+    for second in range(seconds):
+        start = time.perf_counter()
+        for circuit in range(circuits):
+            bank.add(circuit, rng.uniform(0, 24), float(second))
+        bank.evaluate(rules, float(second))
+        bank.time_to_trip(float(second))
+        bank.thermal_load(float(second))
+        ticks.append(time.perf_counter() - start)
+    return sum(ticks) / len(ticks), max(ticks)
+
+
+def bench_prediction_accuracy(module, trace, rating, reaction_time):
+    """
+    Compare every trip prediction with the moment the model actually reached
+    its trip point later in the trace.
+    """
+    per_phase = {}
+    for timestamp, phase, current in trace:
+        per_phase.setdefault(phase, []).append((timestamp, current))
+
+    errors = []
+    lead_times = []
+    false_alarms = 0
+    warnings = 0
+    trips = 0
+    for phase, samples in per_phase.items():
+        bank = create_bank(module, 1, rating)
+        predictions = []
+        trip_times = []
+        tripped = False
+        for timestamp, current in samples:
+            bank.add(0, current, timestamp)
+            if bank.heat[0] >= bank.trip_heat or current >= bank.magnetic_currents[0]:
+                if not tripped:
+                    trip_times.append(timestamp)
+                    tripped = True
+                # A real breaker would have opened here, start over with a cold one
+                bank = create_bank(module, 1, rating)
+                bank.add(0, current, timestamp)
+                continue
+            tripped = False
+            predicted = bank.time_to_trip(timestamp)[0]
+            if not math.isnan(predicted):
+                predictions.append((timestamp, predicted))
+
+        trips += len(trip_times)
+        for timestamp, predicted in predictions:
+            # Only predictions in the actionable range are scored
+            if predicted > reaction_time * 2:
+                continue
+            actual = next((trip for trip in trip_times if timestamp <= trip <= timestamp + reaction_time * 4), None)
+            if predicted <= reaction_time:
+                warnings += 1
+                if actual is None:
+                    false_alarms += 1
+            if actual is not None:
+                errors.append(abs(predicted - (actual - timestamp)))
+        for trip in trip_times:
+            first = next((timestamp for timestamp, predicted in predictions
+                          if timestamp <= trip and trip - timestamp <= reaction_time * 2 and predicted <= reaction_time), None)
+            if first is not None:
+                lead_times.append(trip - first)
+
+    errors.sort()
+    lead_times.sort()
+    return {
+        "trips": trips,
+        "predictions": len(errors),
+        "median_error": errors[len(errors) // 2] if errors else math.nan,
+        "p95_error": errors[int(len(errors) * 0.95)] if errors else math.nan,
+        "trips_warned": len(lead_times),
+        "median_lead_time": lead_times[len(lead_times) // 2] if lead_times else math.nan,
+        "false_alarm_rate": false_alarms / warnings if warnings else 0.0,
+    }
+
+
+def bench_p1_parser(count=5000, chunk_sizes=(64, 1024, 65536), seed=1):
+    """
+    Feed a stream of P1 telegrams to the incremental parser in chunks of different sizes.
+
+    Returns:
+        dict: chunk size -> (microseconds per telegram, MB/s, CRC share of the time)
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import p1_meter
+    import p1_simulator
+    rng = random.Random(seed)
+    stream = b"".join(
+        p1_simulator.build_telegram({"L1": rng.uniform(0, 25), "L2": rng.uniform(0, 25), "L3": rng.uniform(0, 25)}, 1.7e9 + i, 1)
+        for i in range(count))
+
+    start = time.perf_counter()
+    for offset in range(0, len(stream), len(stream) // count):
+        p1_meter.crc16(stream[offset:offset + len(stream) // count])
+    crc_time = time.perf_counter() - start
+
+    results = {}
+    for chunk_size in chunk_sizes:
+        parser = p1_meter.P1TelegramParser(p1_meter.PHASE_CURRENT_OBIS.values())
+        view = memoryview(stream)
+        start = time.perf_counter()
+        parsed = 0
+        for offset in range(0, len(stream), chunk_size):
+            parsed += len(parser.feed(view[offset:offset + chunk_size]))
+        elapsed = time.perf_counter() - start
+        assert parsed == count and parser.crc_errors == 0
+        results[chunk_size] = (elapsed / count * 1e6, len(stream) / elapsed / 1e6, min(crc_time / elapsed, 1.0))
+    return results
+
+
+def print_p1_parser_bench():
+    for chunk_size, (per_telegram, throughput, crc_share) in bench_p1_parser().items():
+        print(f"P1 parser, {chunk_size} byte chunks - {per_telegram:.1f} us per telegram, {throughput:.1f} MB/s ({crc_share:.0%} spent in the CRC)")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--p1"]:
+        print_p1_parser_bench()
+        sys.exit(0)
+    module = load_app_module()
+    if len(sys.argv) > 1 and sys.argv[1].endswith(".trace"):
+        import phase_trace
+        trace = [sample for sample in phase_trace.read_trace(sys.argv[1:]) if sample[2] == sample[2]]
+    elif len(sys.argv) > 1:
+        trace = load_csv_trace(sys.argv[1])
+    else:
+        trace = synthetic_trace()
+    rating = 16.0
+    reaction_time = 120.0
+
+    print(f"Samples: {len(trace)}")
+    print(f"Per-sample cost (window statistics and thermal model): {bench_per_sample_cost(module, trace, rating):.0f} ns")
+    accuracy = bench_prediction_accuracy(module, trace, rating, reaction_time)
+    print(f"Trips in trace: {accuracy['trips']}, warned in advance: {accuracy['trips_warned']}")
+    print(f"Median lead time: {accuracy['median_lead_time']:.0f} s")
+    print(f"Time-to-trip error over {accuracy['predictions']} predictions - median: {accuracy['median_error']:.1f} s, p95: {accuracy['p95_error']:.1f} s")
+    print(f"False alarm rate (warning without trip): {accuracy['false_alarm_rate']:.1%}")
+
+    for circuits in (3, 100, 500, 1000):
+        mean_tick, worst_tick = bench_scale(module, circuits)
+        print(f"{circuits} circuits at 1 Hz - mean tick: {mean_tick * 1000:.2f} ms, worst tick: {worst_tick * 1000:.2f} ms ({mean_tick:.1%} of the interval)")
+
+    print_p1_parser_bench()
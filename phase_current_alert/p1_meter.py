@@ -0,0 +1,231 @@
+import socket
+import threading
+import time
+
+# Reader of DSMR P1 telegrams from a smart meter, used by PhaseCurrentAlert to get
+# the phase currents straight from the meter instead of through Home Assistant.
+#
+# A telegram starts with "/", ends with "!" followed by the CRC16 of everything
+# from "/" to "!" as four hex digits (DSMR 4 and later; DSMR 2/3 telegrams have no
+# CRC and are accepted as they are), and carries one COSEM object per line:
+#
+#   /ISK5\2M550E-1012
+#
+#   1-0:31.7.0(002*A)
+#   1-0:51.7.0(011.5*A)
+#   1-0:71.7.0(000*A)
+#   !6F4A
+PHASE_CURRENT_OBIS = {"L1": "1-0:31.7.0", "L2": "1-0:51.7.0", "L3": "1-0:71.7.0"}
+MAX_TELEGRAM_SIZE = 16384
+
+
+def build_crc16_table():
+    """Build the lookup table of the CRC16/ARC (polynomial 0xA001, reflected) used by DSMR."""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC16_TABLE = build_crc16_table()
+
+
+def crc16(data):
+    """Return the DSMR CRC16 of a bytes-like object."""
+    crc = 0
+    table = CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+class P1TelegramParser:
+    """
+    Incremental parser of P1 telegrams.
+
+    Chunks of any size are appended to one buffer; complete telegrams are located,
+    checked and parsed in place with offsets into the buffer (only the value of a
+    wanted object is copied out), and consumed bytes are dropped once per chunk.
+    """
+
+    def __init__(self, obis_codes):
+        """
+        Args:
+            obis_codes (iterable): OBIS codes to extract, e.g. "1-0:31.7.0".
+        """
+        self.prefixes = {code: code.encode("ascii") + b"(" for code in obis_codes}
+        self.buffer = bytearray()
+        self.telegrams = 0
+        self.crc_errors = 0
+        self.bytes_received = 0
+
+    def feed(self, data):
+        """
+        Add received bytes and parse the telegrams they complete.
+
+        Returns:
+            list: {OBIS code: value} per complete telegram with a valid CRC.
+        """
+        buffer = self.buffer
+        buffer += data
+        self.bytes_received += len(data)
+        telegrams = []
+        position = 0
+        while True:
+            start = buffer.find(b"/", position)
+            if start < 0:
+                position = len(buffer)
+                break
+            end = buffer.find(b"!", start)
+            if end < 0:
+                # Incomplete telegram, unless the start was garbage
+                position = start if len(buffer) - start <= MAX_TELEGRAM_SIZE else start + 1
+                break
+            line_end = buffer.find(b"\n", end)
+            if line_end < 0:
+                position = start
+                break
+            checksum = bytes(buffer[end + 1:line_end]).strip()
+            if checksum:
+                try:
+                    with memoryview(buffer) as view:
+                        valid = len(checksum) == 4 and crc16(view[start:end + 1]) == int(checksum, 16)
+                except ValueError:
+                    valid = False
+                if not valid:
+                    # Resynchronize on the next "/", which may be the start of a good telegram
+                    self.crc_errors += 1
+                    position = start + 1
+                    continue
+            telegrams.append(self.extract(buffer, start, end))
+            self.telegrams += 1
+            position = line_end + 1
+        del buffer[:position]
+        return telegrams
+
+    def extract(self, buffer, start, end):
+        """Read the wanted objects of the telegram between start and end."""
+        values = {}
+        for code, prefix in self.prefixes.items():
+            index = buffer.find(prefix, start, end)
+            if index < 0:
+                continue
+            index += len(prefix)
+            close = buffer.find(b")", index, end)
+            if close < 0:
+                continue
+            unit = buffer.find(b"*", index, close)
+            try:
+                values[code] = float(buffer[index:unit if unit >= 0 else close])
+            except ValueError:
+                continue
+        return values
+
+
+class P1Reader(threading.Thread):
+    """
+    Background thread reading P1 telegrams from a serial device or a TCP socket.
+
+    A port of the form tcp://host:port is read with a socket (e.g. a P1 to
+    Ethernet/WiFi bridge or ser2net); anything else is opened as a serial device
+    with pyserial, which is only imported when it is needed. The connection is
+    reopened after reconnect_delay seconds when it fails.
+    """
+
+    def __init__(self, port, obis_codes, callback, baudrate=115200, reconnect_delay=5.0, log=None):
+        """
+        Args:
+            port (str): Serial device or tcp://host:port.
+            obis_codes (iterable): OBIS codes to extract.
+            callback (callable): Called with ({OBIS code: value}, receive time) for every telegram.
+            baudrate (int): Baud rate of the serial device (115200 for DSMR 4 and later, 9600 for DSMR 2/3).
+            reconnect_delay (float): Seconds to wait before reopening a failed connection.
+            log (callable): Called with (message, level) for connection errors.
+        """
+        super().__init__(name=f"P1Reader({port})", daemon=True)
+        self.port = port
+        self.parser = P1TelegramParser(obis_codes)
+        self.callback = callback
+        self.baudrate = baudrate
+        self.reconnect_delay = reconnect_delay
+        self.log = log or (lambda message, level: None)
+        self.stopping = threading.Event()
+        self.connection = None
+        self.connected = False
+        self.last_telegram = None
+
+    def run(self):
+        chunk = bytearray(4096)
+        view = memoryview(chunk)
+        while not self.stopping.is_set():
+            try:
+                self.connection, read_into = self.open()
+                self.connected = True
+                self.log(f"Connected to P1 port {self.port}", "INFO")
+                while not self.stopping.is_set():
+                    size = read_into(view)
+                    if size is None:
+                        continue
+                    if size == 0:
+                        raise ConnectionError("connection closed by the meter")
+                    received = time.time()
+                    for values in self.parser.feed(view[:size]):
+                        self.last_telegram = received
+                        self.callback(values, received)
+            except Exception as e:
+                if not self.stopping.is_set():
+                    self.log(f"P1 port {self.port} failed: {e}, reconnecting in {self.reconnect_delay} seconds", "WARNING")
+            finally:
+                self.connected = False
+                self.close()
+            self.stopping.wait(self.reconnect_delay)
+
+    def open(self):
+        """
+        Open the port.
+
+        Returns:
+            tuple: (connection, function reading into a buffer and returning the byte
+            count, None on a read timeout or 0 when the connection is closed)
+        """
+        if self.port.startswith("tcp://"):
+            host, _, port = self.port[len("tcp://"):].rpartition(":")
+            connection = socket.create_connection((host, int(port)), timeout=10)
+            connection.settimeout(1.0)
+
+            def read_into(buffer):
+                try:
+                    return connection.recv_into(buffer)
+                except socket.timeout:
+                    return None
+            return connection, read_into
+
+        import serial
+        connection = serial.Serial(self.port, self.baudrate, timeout=1.0)
+
+        def read_into(buffer):
+            # Wait for the first byte, then take everything that has arrived
+            size = connection.readinto(buffer[:1])
+            if not size:
+                return None
+            waiting = min(connection.in_waiting, len(buffer) - 1)
+            if waiting:
+                size += connection.readinto(buffer[1:1 + waiting])
+            return size
+        return connection, read_into
+
+    def close(self):
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def stop(self):
+        """Stop the thread and close the port."""
+        self.stopping.set()
+        self.close()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# p1_simulator.py - Stand-in for a smart meter P1 port, for testing the P1 ingestion of phase_current_alert.py
+# This file is NOT an AppDaemon app and should NOT be loaded by AppDaemon
+#
+# Serves DSMR 5 telegrams over TCP, one per --interval seconds, to every client that
+# connects (configure the app with p1_port: tcp://<host>:<port>). The phase currents
+# come from the synthetic load of bench_phase_current_alert.py or from a CSV trace.
+#
+# Usage:
+#   python p1_simulator.py                          # synthetic load on port 8088
+#   python p1_simulator.py --port 8088 trace.csv    # recorded trace (timestamp,phase,current)
+#   python p1_simulator.py --corrupt 0.01           # damage 1% of the telegrams
+
+import argparse
+import datetime
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from p1_meter import PHASE_CURRENT_OBIS, crc16
+
+
+def build_telegram(currents, timestamp, decimals=0):
+    """
+    Build a DSMR 5 telegram with a valid CRC.
+
+    Args:
+        currents (dict): Current per phase (L1, L2, L3) in amperes.
+        timestamp (float): Epoch time of the telegram.
+        decimals (int): Decimals of the currents (DSMR 5 meters report whole amperes).
+
+    Returns:
+        bytes: The telegram including the CRC line.
+    """
+    moment = datetime.datetime.fromtimestamp(timestamp).strftime("%y%m%d%H%M%S")
+    width = 3 + (decimals + 1 if decimals else 0)
+    lines = [
+        "/ISK5\\2M550E-1012",
+        "",
+        "1-3:0.2.8(50)",
+        f"0-0:1.0.0({moment}W)",
+        "0-0:96.1.1(4530303434303037313331363530373138)",
+        "1-0:1.8.1(012345.678*kWh)",
+        "1-0:1.8.2(023456.789*kWh)",
+        "0-0:96.14.0(0002)",
+        f"1-0:1.7.0({sum(currents.values()) * 0.23:06.3f}*kW)",
+        "1-0:2.7.0(00.000*kW)",
+        "1-0:32.7.0(230.1*V)",
+        "1-0:52.7.0(229.8*V)",
+        "1-0:72.7.0(231.0*V)",
+    ]
+    for phase, code in PHASE_CURRENT_OBIS.items():
+        lines.append(f"{code}({currents.get(phase, 0.0):0{width}.{decimals}f}*A)")
+    lines.append("0-1:24.2.1(" + moment + "W)(01234.567*m3)")
+    body = ("\r\n".join(lines) + "\r\n!").encode("ascii")
+    return body + f"{crc16(body):04X}\r\n".encode("ascii")
+
+
+def load_samples(paths):
+    """Yield {phase: current} once per second from CSV traces or the synthetic load."""
+    import bench_phase_current_alert
+    if paths:
+        trace = []
+        for path in paths:
+            trace.extend(bench_phase_current_alert.load_csv_trace(path))
+        trace.sort(key=lambda sample: sample[0])
+    else:
+        trace = bench_phase_current_alert.synthetic_trace(24, base_load=0.0)
+    currents = {}
+    second = None
+    for timestamp, phase, current in trace:
+        phase = phase.upper()[-2:]
+        if second is not None and int(timestamp) != second:
+            yield dict(currents)
+        second = int(timestamp)
+        currents[phase] = current
+
+
+class TelegramServer:
+    """Send every telegram to all connected clients."""
+
+    def __init__(self, port):
+        self.server = socket.create_server(("", port))
+        self.clients = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            client, address = self.server.accept()
+            print(f"Client connected: {address[0]}:{address[1]}")
+            with self.lock:
+                self.clients.append(client)
+
+    def send(self, data, chunk_size):
+        with self.lock:
+            for client in list(self.clients):
+                try:
+                    # Meters send slowly, so clients receive telegrams in pieces
+                    for offset in range(0, len(data), chunk_size):
+                        client.sendall(data[offset:offset + chunk_size])
+                except OSError:
+                    self.clients.remove(client)
+                    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve DSMR P1 telegrams over TCP")
+    parser.add_argument("traces", nargs="*", help="CSV traces (timestamp,phase,current); synthetic load if none")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between telegrams")
+    parser.add_argument("--decimals", type=int, default=0, help="Decimals of the currents")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Bytes per send, to exercise incremental parsing")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="Fraction of telegrams with a flipped byte")
+    options = parser.parse_args()
+
+    server = TelegramServer(options.port)
+    print(f"Serving P1 telegrams on tcp://0.0.0.0:{options.port}")
+    rng = random.Random(1)
+    for currents in load_samples(options.traces):
+        telegram = build_telegram(currents, time.time(), options.decimals)
+        if rng.random() < options.corrupt:
+            damaged = bytearray(telegram)
+            damaged[rng.randrange(1, len(damaged) - 8)] ^= 0x01
+            telegram = bytes(damaged)
+        server.send(telegram, options.chunk_size)
+        time.sleep(options.interval)
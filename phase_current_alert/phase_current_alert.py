@@ -1,13 +1,238 @@
 import hassapi as hass
-import datetime
+import re
+import threading
 import traceback
 
+import numpy as np
+
+from p1_meter import P1Reader, PHASE_CURRENT_OBIS
+
+# Statistics that an alert rule can be evaluated against
+RULE_METRICS = ("instant", "ewma", "mean", "max", "percentile", "sustained")
+
+# Default rule: the phase has to stay over its threshold for a few seconds,
+# so short motor inrush spikes do not trigger an alert on their own
+DEFAULT_ALERT_RULES = [{"metric": "sustained", "duration": 5}]
+
+# Miniature circuit breaker trip curves (IEC 60898). The thermal release behaves
+# the same on both curves; the magnetic release trips instantly somewhere between
+# the two multiples of the rated current, so the lower bound is used for prediction.
+TRIP_CURVES = {
+    "B": {"magnetic_min": 3.0, "magnetic_max": 5.0},
+    "C": {"magnetic_min": 5.0, "magnetic_max": 10.0},
+}
+
+
+def slugify(text):
+    """Turn a panel or circuit name into an entity id fragment."""
+    return re.sub(r"[^a-z0-9]+", "_", str(text).lower()).strip("_")
+
+
+class CircuitBank:
+    """
+    Rolling-window statistics and breaker thermal models for a set of circuits.
+
+    Every per-circuit quantity lives in a NumPy array indexed by circuit. Adding
+    a sample is a constant number of scalar array writes, and all circuits are
+    evaluated together in one vectorized pass.
+
+    Window statistics: samples are kept in a fixed-size ring buffer per circuit
+    (one row of a 2D array) with a running sum, an EWMA and the time the circuit
+    went over its threshold. Windowed maximum and percentiles are computed over
+    the whole buffer during the vectorized pass: a reduction and a row-wise sort
+    of the window array, which take well under a millisecond per tick for 1000
+    circuits of 60 samples, so no incremental max or quantile structure is kept.
+
+    Thermal model: the bimetal of each breaker is modelled as a first-order
+    system whose normalized heat approaches (I / I_rated)² with the given time
+    constant; the breaker trips when the heat reaches trip_level². The update
+    between two samples is solved exactly (the current is held constant in
+    between), so it costs a single exponential regardless of the sampling rate.
+    With the defaults (trip level 1.3, time constant 120 s) the model never trips
+    at 1.13 x I_rated and trips after about 3 minutes at 1.45 x I_rated and
+    36 seconds at 2.55 x I_rated, matching the IEC 60898 test points.
+
+    The heat integrates every raw sample, but the time to trip is predicted for
+    a smoothed current: a time-weighted moving average with smoothing_time as
+    its time constant, which also decays while the sensor does not report. A
+    single inrush spike heats the model a little without predicting a trip.
+    """
+
+    def __init__(self, thresholds, ratings, magnetic_multiples, window_size=60, ewma_alpha=0.2, time_constant=120.0, trip_level=1.3,
+                 smoothing_time=10.0):
+        """
+        Args:
+            thresholds (list): Alert threshold of every circuit in amperes.
+            ratings (list): Rated current of the breaker of every circuit in amperes.
+            magnetic_multiples (list): Multiple of the rated current the magnetic release trips at.
+            window_size (int): Number of samples kept in the window of each circuit.
+            ewma_alpha (float): Smoothing factor of the exponentially weighted moving average.
+            time_constant (float): Thermal time constant of the breakers in seconds.
+            trip_level (float): Multiple of the rated current the thermal release eventually trips at.
+            smoothing_time (float): Time constant of the smoothed current the trip is predicted for, in seconds.
+        """
+        size = len(thresholds)
+        self.size = size
+        self.window_size = window_size
+        self.ewma_alpha = ewma_alpha
+        self.time_constant = time_constant
+        self.smoothing_time = smoothing_time
+        self.trip_heat = trip_level * trip_level
+
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        self.ratings = np.asarray(ratings, dtype=float)
+        self.magnetic_currents = self.ratings * np.asarray(magnetic_multiples, dtype=float)
+
+        # Ring buffers; empty slots hold NaN so they never affect the window statistics
+        self.values = np.full((size, window_size), np.nan)
+        self.index = np.zeros(size, dtype=np.int64)
+        self.count = np.zeros(size, dtype=np.int64)
+        self.total = np.zeros(size)
+
+        self.ewma = np.full(size, np.nan)
+        self.over_since = np.full(size, np.nan)
+        self.last_value = np.full(size, np.nan)
+        self.last_time = np.full(size, np.nan)
+        self.heat = np.zeros(size)
+        self.smoothed = np.full(size, np.nan)
+
+    def add(self, circuit, value, timestamp):
+        """
+        Add a sample to a circuit.
+
+        Args:
+            circuit (int): Index of the circuit.
+            value (float): Current in amperes.
+            timestamp (float): Time of the sample in seconds.
+        """
+        slot = self.index[circuit]
+        if self.count[circuit] == self.window_size:
+            self.total[circuit] -= self.values[circuit, slot]
+        else:
+            self.count[circuit] += 1
+        self.values[circuit, slot] = value
+        self.index[circuit] = (slot + 1) % self.window_size
+        self.total[circuit] += value
+
+        ewma = self.ewma[circuit]
+        self.ewma[circuit] = value if ewma != ewma else ewma + self.ewma_alpha * (value - ewma)
+
+        if value >= self.thresholds[circuit]:
+            if self.over_since[circuit] != self.over_since[circuit]:
+                self.over_since[circuit] = timestamp
+        else:
+            self.over_since[circuit] = np.nan
+
+        # Integrate the heat and the smoothed current of the previous current up to this sample
+        last_time = self.last_time[circuit]
+        if last_time == last_time and timestamp > last_time:
+            current = abs(self.last_value[circuit])
+            target = (current / self.ratings[circuit]) ** 2
+            decay = np.exp(-(timestamp - last_time) / self.time_constant)
+            self.heat[circuit] = target + (self.heat[circuit] - target) * decay
+            decay = np.exp(-(timestamp - last_time) / self.smoothing_time)
+            self.smoothed[circuit] = current + (self.smoothed[circuit] - current) * decay
+        elif self.smoothed[circuit] != self.smoothed[circuit]:
+            self.smoothed[circuit] = abs(value)
+
+        self.last_value[circuit] = value
+        self.last_time[circuit] = timestamp
+
+    def heat_at(self, now):
+        """Return the heat of every breaker at a given time, assuming the last currents keep flowing."""
+        target = np.nan_to_num((np.abs(self.last_value) / self.ratings) ** 2)
+        elapsed = np.nan_to_num(np.maximum(now - self.last_time, 0.0))
+        return target + (self.heat - target) * np.exp(-elapsed / self.time_constant)
+
+    def smoothed_at(self, now):
+        """Return the smoothed current of every circuit at a given time, assuming the last currents keep flowing."""
+        current = np.abs(self.last_value)
+        elapsed = np.nan_to_num(np.maximum(now - self.last_time, 0.0))
+        return current + (self.smoothed - current) * np.exp(-elapsed / self.smoothing_time)
+
+    def thermal_load(self, now):
+        """Return the heat of every breaker as a percentage of its trip point."""
+        return self.heat_at(now) / self.trip_heat * 100.0
+
+    def time_to_trip(self, now):
+        """
+        Predict the seconds until every breaker trips if the smoothed currents keep flowing.
+
+        Returns:
+            numpy.ndarray: Seconds until the trip, 0 if it trips now, NaN if no trip is coming.
+        """
+        current = self.smoothed_at(now)
+        target = np.nan_to_num((current / self.ratings) ** 2)
+        heat = self.heat_at(now)
+        result = np.full(self.size, np.nan)
+        heating = target > self.trip_heat
+        with np.errstate(divide="ignore", invalid="ignore"):
+            remaining = self.time_constant * np.log((target - heat) / (target - self.trip_heat))
+        result[heating] = np.maximum(remaining[heating], 0.0)
+        result[heating & (heat >= self.trip_heat)] = 0.0
+        result[current >= self.magnetic_currents] = 0.0
+        return result
+
+    def statistics(self, now):
+        """Return the window statistics of every circuit as a dictionary of arrays."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = self.total / self.count
+        return {
+            "instant": self.last_value,
+            "ewma": self.ewma,
+            "mean": mean,
+            "max": np.fmax.reduce(self.values, axis=1),
+            "sustained": np.where(np.isnan(self.over_since), 0.0, now - self.over_since),
+        }
+
+    def percentile(self, percent):
+        """
+        Return a percentile of the window of every circuit, interpolated linearly
+        between the samples as numpy.nanpercentile does, NaN without samples.
+
+        The rows are sorted in one call, which moves the empty (NaN) slots to the
+        end, so the percentile is read at the same position of every row;
+        nanpercentile handles the rows one by one, which is two orders of
+        magnitude slower.
+        """
+        ordered = np.sort(self.values, axis=1)
+        last = np.maximum(self.count - 1, 0)
+        position = last * (percent / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, last)
+        rows = np.arange(self.size)
+        low = ordered[rows, lower]
+        return low + (ordered[rows, upper] - low) * (position - lower)
+
+    def evaluate(self, rules, now):
+        """
+        Evaluate alert rules against every circuit in one vectorized pass.
+
+        Returns:
+            tuple: (index of the first triggered rule per circuit or -1, statistics dictionary)
+        """
+        stats = self.statistics(now)
+        triggered = np.full(self.size, -1, dtype=np.int64)
+        for rule_index, rule in enumerate(rules):
+            metric = rule["metric"]
+            enough = self.count >= rule.get("min_samples", 1)
+            if metric == "sustained":
+                mask = ~np.isnan(self.over_since) & (stats["sustained"] >= rule.get("duration", 0))
+            else:
+                values = self.percentile(rule.get("percentile", 90)) if metric == "percentile" else stats[metric]
+                with np.errstate(invalid="ignore"):
+                    mask = values >= self.thresholds * rule.get("factor", 1.0)
+            triggered[enough & mask & (triggered < 0)] = rule_index
+        return triggered, stats
+
+
 class PhaseCurrentAlert(hass.Hass):
     """
-    AppDaemon app to monitor phase current sensors and send notifications when thresholds are exceeded.
+    AppDaemon app to monitor current sensors and send notifications when thresholds are exceeded.
     
-    This app monitors the current values of three phases (L1, L2, L3) and sends notifications
-    when any of them exceeds the configured threshold.
+    A single instance monitors any number of panels, each with any number of circuits
+    (by default the three phases L1, L2, L3 of one panel), and sends notifications when
+    any of them breaks one of the configured windowed alert rules.
     """
     
     def initialize(self):
@@ -15,15 +240,6 @@ class PhaseCurrentAlert(hass.Hass):
         try:
             self.log("Phase Current Alert app initializing")
             
-            # Get configuration parameters
-            self.threshold_l1 = float(self.args.get("threshold_l1", 16))
-            self.threshold_l2 = float(self.args.get("threshold_l2", 16))
-            self.threshold_l3 = float(self.args.get("threshold_l3", 32))
-            
-            self.sensor_l1 = self.args.get("sensor_l1", "sensor.pillanatnyi_aramerosseg_l1")
-            self.sensor_l2 = self.args.get("sensor_l2", "sensor.pillanatnyi_aramerosseg_l2")
-            self.sensor_l3 = self.args.get("sensor_l3", "sensor.pillanatnyi_aramerosseg_l3")
-            
             self.notification_service = self.args.get("notification_service", "notify/mobile_app")
             
             # Get notification interval in seconds (default: 60 seconds = 1 minute)
@@ -32,38 +248,165 @@ class PhaseCurrentAlert(hass.Hass):
             # Event name for threshold exceeded events
             self.event_name = self.args.get("event_name", "phase_current_alert.threshold_exceeded")
             
-            # Time tracking for notification throttling
-            self.last_notification_time = {
-                "l1": None,
-                "l2": None,
-                "l3": None
-            }
+            # Rolling window and alert rule configuration
+            self.window_size = int(self.args.get("window_size", 60))
+            self.ewma_alpha = float(self.args.get("ewma_alpha", 0.2))
+            self.evaluation_interval = int(self.args.get("evaluation_interval", 1))
+            self.alert_rules = self.parse_alert_rules(self.args.get("alert_rules", DEFAULT_ALERT_RULES))
+
+            # Breaker thermal model configuration (the rating defaults to the circuit threshold)
+            self.trip_curve = str(self.args.get("trip_curve", "C")).upper()
+            self.thermal_time_constant = float(self.args.get("thermal_time_constant", 120))
+            self.trip_level = float(self.args.get("trip_level", 1.3))
+            self.trip_warning_time = float(self.args.get("trip_warning_time", 300))
+            self.trip_warning_load = float(self.args.get("trip_warning_load", 25))
+            self.trip_smoothing_time = float(self.args.get("trip_smoothing_time", 10))
+            self.entity_prefix = self.args.get("entity_prefix", "sensor.phase_current_alert")
+            self.publish_interval = int(self.args.get("publish_interval", 10))
+
+            # Circuits of all panels, with a precomputed entity -> circuit index lookup
+            self.circuits = self.parse_circuits()
+            self.circuit_index = {}
+            for index, circuit in enumerate(self.circuits):
+                if circuit["sensor"] in self.circuit_index:
+                    self.log(f"Sensor {circuit['sensor']} is used by more than one circuit, ignoring {circuit['panel']}/{circuit['name']}", level="WARNING")
+                    continue
+                self.circuit_index[circuit["sensor"]] = index
+
+            # Optional direct ingestion of P1 telegrams from the smart meter, bypassing Home Assistant
+            self.p1_port = self.args.get("p1_port")
+            self.p1_baudrate = int(self.args.get("p1_baudrate", 115200))
+            self.p1_timeout = float(self.args.get("p1_timeout", 10))
+            self.p1_mirror_interval = int(self.args.get("p1_mirror_interval", 10))
+            self.p1_circuits = {circuit["obis"]: index for index, circuit in enumerate(self.circuits) if circuit["obis"]}
+            self.p1_sensors = {self.circuits[index]["sensor"] for index in self.p1_circuits.values()} if self.p1_port else set()
+            self.p1_values = {}
+            self.published_p1 = {}
+            self.p1_reader = None
+
+            self.bank = CircuitBank(
+                [circuit["threshold"] for circuit in self.circuits],
+                [circuit["rating"] for circuit in self.circuits],
+                [TRIP_CURVES[circuit["curve"]]["magnetic_min"] for circuit in self.circuits],
+                window_size=self.window_size,
+                ewma_alpha=self.ewma_alpha,
+                time_constant=self.thermal_time_constant,
+                trip_level=self.trip_level,
+                smoothing_time=self.trip_smoothing_time,
+            )
+            # The P1 reader thread feeds and evaluates the bank too
+            self.bank_lock = threading.RLock()
+
+            # Time tracking for notification throttling, one slot per circuit
+            self.last_notification_time = np.full(len(self.circuits), np.nan)
+
+            # Last published thermal values, so entities are only written when they change
+            self.published_thermal = {}
             
             # Store handles to listeners and timers
             self.listener_handles = []
             self.timer_handles = []
             
             # Set up listeners for current sensors
-            self.listener_handles.append(self.listen_state(self.current_changed, self.sensor_l1))
-            self.listener_handles.append(self.listen_state(self.current_changed, self.sensor_l2))
-            self.listener_handles.append(self.listen_state(self.current_changed, self.sensor_l3))
+            for sensor in self.circuit_index:
+                self.listener_handles.append(self.listen_state(self.current_changed, sensor))
             
-            # Schedule a regular check
-            self.timer_handles.append(self.run_every(self.check_current_values, "now", self.notification_interval))
+            # Schedule a regular vectorized evaluation of all circuits
+            self.timer_handles.append(self.run_every(self.check_current_values, "now", self.evaluation_interval))
+            self.timer_handles.append(self.run_every(self.publish_thermal_state, "now", self.publish_interval))
+
+            if self.p1_port and self.p1_circuits:
+                self.p1_reader = P1Reader(self.p1_port, self.p1_circuits, self.p1_telegram_received, self.p1_baudrate,
+                                          log=lambda message, level: self.log(message, level=level))
+                self.p1_reader.start()
+                self.timer_handles.append(self.run_every(self.mirror_p1_values, "now", self.p1_mirror_interval))
+                self.log(f"Reading P1 telegrams from {self.p1_port} for {len(self.p1_circuits)} circuits, mirrored every {self.p1_mirror_interval} seconds")
             
             self.log(f"Phase Current Alert initialized with event: {self.event_name}")
             
-            # Perform an initial check of all sensors
-            self.run_in(self.check_current_values, 5)  # Check after 5 seconds to ensure sensors are loaded
+            # Seed the windows once the sensors are loaded
+            self.run_in(self.seed_windows, 5)  # Check after 5 seconds to ensure sensors are loaded
             
-            self.log(f"Phase Current Alert initialized with thresholds - L1: {self.threshold_l1}A, L2: {self.threshold_l2}A, L3: {self.threshold_l3}A, notification interval: {self.notification_interval} seconds")
+            panels = sorted({circuit["panel"] for circuit in self.circuits})
+            self.log(f"Phase Current Alert monitoring {len(self.circuits)} circuits on panels {panels}, notification interval: {self.notification_interval} seconds")
+            for circuit in self.circuits:
+                self.log(f"- {circuit['panel']}/{circuit['name']}: {circuit['sensor']}, threshold {circuit['threshold']}A, breaker {circuit['rating']}A ({circuit['curve']} curve)", level="DEBUG")
+            self.log(f"Alert rules: {self.alert_rules}, window size: {self.window_size} samples, evaluation interval: {self.evaluation_interval} seconds")
         except Exception as e:
             self.log(f"Error during initialization: {e}", level="ERROR")
             self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def parse_circuits(self):
+        """
+        Build the list of monitored circuits from the configuration.
+
+        Without a `panels` option the legacy `sensor_l1..l3`/`threshold_l1..l3`
+        options describe a single panel with the three phases L1, L2 and L3.
+
+        Returns:
+            list: One dictionary per circuit.
+        """
+        panels = self.args.get("panels")
+        circuits = []
+
+        if not panels:
+            defaults = {"l1": 16, "l2": 16, "l3": 32}
+            for key, default_threshold in defaults.items():
+                threshold = float(self.args.get(f"threshold_{key}", default_threshold))
+                circuits.append({
+                    "panel": "main",
+                    "name": key.upper(),
+                    "key": key,
+                    "sensor": self.args.get(f"sensor_{key}", f"sensor.pillanatnyi_aramerosseg_{key}"),
+                    "threshold": threshold,
+                    "rating": float(self.args.get(f"breaker_rating_{key}", threshold)),
+                    "curve": self.trip_curve,
+                    "obis": self.args.get(f"obis_{key}", PHASE_CURRENT_OBIS[key.upper()]),
+                })
+            return circuits
+
+        for panel_name, panel in panels.items():
+            panel = panel or {}
+            for circuit_name, circuit in (panel.get("circuits") or {}).items():
+                if not circuit or not circuit.get("sensor"):
+                    self.log(f"Circuit {panel_name}/{circuit_name} has no sensor, skipping", level="WARNING")
+                    continue
+                threshold = float(circuit.get("threshold", panel.get("threshold", 16)))
+                curve = str(circuit.get("trip_curve", panel.get("trip_curve", self.trip_curve))).upper()
+                if curve not in TRIP_CURVES:
+                    self.log(f"Unknown trip curve {curve} for {panel_name}/{circuit_name}, using {self.trip_curve}", level="WARNING")
+                    curve = self.trip_curve
+                circuits.append({
+                    "panel": panel_name,
+                    "name": str(circuit_name),
+                    "key": slugify(f"{panel_name}_{circuit_name}"),
+                    "sensor": circuit["sensor"],
+                    "threshold": threshold,
+                    "rating": float(circuit.get("breaker_rating", panel.get("breaker_rating", threshold))),
+                    "curve": curve,
+                    "obis": circuit.get("obis"),
+                })
+        return circuits
+
+    def parse_alert_rules(self, rules):
+        """Validate the configured alert rules, dropping the invalid ones."""
+        valid_rules = []
+        for rule in rules or []:
+            if not isinstance(rule, dict) or rule.get("metric") not in RULE_METRICS:
+                self.log(f"Ignoring invalid alert rule: {rule}", level="WARNING")
+                continue
+            valid_rules.append(dict(rule))
+        if not valid_rules:
+            self.log("No valid alert rules configured, using defaults", level="WARNING")
+            valid_rules = [dict(rule) for rule in DEFAULT_ALERT_RULES]
+        return valid_rules
     
     def terminate(self):
         """Clean up when app is terminated."""
         try:
+            if self.p1_reader is not None:
+                self.p1_reader.stop()
+
             # Cancel all registered listeners
             for handle in self.listener_handles:
                 self.cancel_listen_state(handle)
@@ -79,79 +422,239 @@ class PhaseCurrentAlert(hass.Hass):
     def current_changed(self, entity, attribute, old, new, kwargs):
         """Handle state changes for current sensors."""
         try:
+            if entity in self.p1_sensors and self.p1_active(self.get_now_ts()):
+                return  # The circuit is fed by the P1 telegrams
             if new is not None and new != old:  
-                self.check_specific_sensor(entity)
+                self.add_sample(entity, new)
         except Exception as e:
             self.log(f"Error in current_changed: {e}", level="ERROR")
     
-    def check_specific_sensor(self, entity):
-        """Check a specific sensor against its threshold."""
+    def seed_windows(self, kwargs):
+        """Feed the current state of circuits that have not reported yet into their windows."""
         try:
-            # Get the current state, handling potential None or unavailable values
-            state = self.get_state(entity)
+            for entity, index in self.circuit_index.items():
+                if self.bank.count[index] == 0:
+                    self.add_sample(entity, self.get_state(entity))
+        except Exception as e:
+            self.log(f"Error seeding circuit windows: {e}", level="ERROR")
+
+    def add_sample(self, entity, state):
+        """Add a sensor state to the window of its circuit."""
+        try:
+            # Handle potential None or unavailable values
             if state is None or state in ["unavailable", "unknown"]:
-                self.log(f"Sensor {entity} is {state}, skipping check", level="WARNING")
+                self.log(f"Sensor {entity} is {state}, skipping sample", level="WARNING")
                 return
                 
-            current_value = float(state)
-            
-            # Determine which phase this is and get the corresponding threshold
-            if entity == self.sensor_l1:
-                phase = "L1"
-                threshold = self.threshold_l1
-                notification_key = "l1"
-            elif entity == self.sensor_l2:
-                phase = "L2"
-                threshold = self.threshold_l2
-                notification_key = "l2"
-            elif entity == self.sensor_l3:
-                phase = "L3"
-                threshold = self.threshold_l3
-                notification_key = "l3"
-            else:
+            index = self.circuit_index.get(entity)
+            if index is None:
                 return
             
-            # Check if current exceeds threshold
-            if current_value >= threshold:
-                self.log(f"Current on {phase} is {current_value}A, which exceeds the threshold of {threshold}A")
-                
-                # Check if we should send a notification (throttle based on notification interval)
-                now = datetime.datetime.now()
-                last_time = self.last_notification_time[notification_key]
-                
-                if last_time is None or (now - last_time).total_seconds() >= self.notification_interval:
-                    self.send_notification(phase, current_value, threshold)
-                    self.last_notification_time[notification_key] = now
-            
+            with self.bank_lock:
+                self.bank.add(index, float(state), self.get_now_ts())
         except (ValueError, TypeError) as e:
             self.log(f"Error processing current value for {entity}: {e}", level="ERROR")
         except Exception as e:
-            self.log(f"Unexpected error checking sensor {entity}: {e}", level="ERROR")
+            self.log(f"Unexpected error adding sample for {entity}: {e}", level="ERROR")
             self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
     
     def check_current_values(self, kwargs):
-        """Check all current sensors against their thresholds."""
+        """Evaluate every circuit against the alert rules in one vectorized pass."""
         try:
-            self.log("Running scheduled check of all current sensors", level="DEBUG")
-            self.check_specific_sensor(self.sensor_l1)
-            self.check_specific_sensor(self.sensor_l2)
-            self.check_specific_sensor(self.sensor_l3)
+            now = self.get_now_ts()
+            if self.p1_active(now):
+                return  # Evaluated on every telegram instead
+            with self.bank_lock:
+                alerts = self.evaluate_circuits(now)
+            for alert in alerts:
+                self.send_notification(*alert)
         except Exception as e:
             self.log(f"Error in scheduled check: {e}", level="ERROR")
-            # Re-register the timer if it failed to ensure continuous monitoring
-            self.timer_handles.append(self.run_every(self.check_current_values, "now", self.notification_interval))
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def evaluate_circuits(self, now):
+        """
+        Find the circuits that break an alert rule and are due a notification.
+
+        Called with bank_lock held; the notifications are sent by the caller after
+        releasing it, so a slow Home Assistant call does not hold up the bank.
+
+        Returns:
+            list: send_notification arguments of every circuit to notify about.
+        """
+        triggered, stats = self.bank.evaluate(self.alert_rules, now)
+        time_to_trip = self.bank.time_to_trip(now)
+        thermal_load = self.bank.thermal_load(now)
+
+        # Circuits whose breaker is predicted to trip soon alert even without a rule
+        with np.errstate(invalid="ignore"):
+            thermal = (triggered < 0) & (time_to_trip <= self.trip_warning_time) & (thermal_load >= self.trip_warning_load)
+        alerting = (triggered >= 0) | thermal
+        if not alerting.any():
+            return []
+
+        # Throttle notifications per circuit based on the notification interval
+        last_time = self.last_notification_time
+        due = alerting & (np.isnan(last_time) | (now - last_time >= self.notification_interval))
+
+        alerts = []
+        for index in np.flatnonzero(alerting):
+            circuit = self.circuits[index]
+            rule_name = self.alert_rules[triggered[index]]["metric"] if triggered[index] >= 0 else "thermal"
+            current_value = float(stats["instant"][index])
+            trip = None if np.isnan(time_to_trip[index]) else float(time_to_trip[index])
+            self.log(f"Current on {circuit['panel']}/{circuit['name']} is {current_value}A, alert rule '{rule_name}' triggered (threshold {circuit['threshold']}A, time to trip: {trip})")
+
+            if not due[index]:
+                continue
+            statistics = {
+                "ewma": round(float(stats["ewma"][index]), 2),
+                "window_mean": round(float(stats["mean"][index]), 2),
+                "window_max": float(stats["max"][index]),
+                "sustained_seconds": round(float(stats["sustained"][index]), 1),
+                "thermal_load": round(float(thermal_load[index]), 1),
+            }
+            statistics["sample_time"] = float(self.bank.last_time[index])
+            alerts.append((circuit, current_value, circuit["threshold"], rule_name, statistics, trip))
+            last_time[index] = now
+        return alerts
     
-    def send_notification(self, phase, current_value, threshold):
+    def publish_thermal_state(self, kwargs):
+        """Publish the time-to-trip and thermal load of every circuit as entities."""
+        try:
+            now = self.get_now_ts()
+            with self.bank_lock:
+                time_to_trip = self.bank.time_to_trip(now)
+                thermal_load = self.bank.thermal_load(now)
+                reporting = np.flatnonzero(~np.isnan(self.bank.last_time))
+            for index in reporting:
+                circuit = self.circuits[index]
+                trip = "unknown" if np.isnan(time_to_trip[index]) else round(float(time_to_trip[index]))
+                load = round(float(thermal_load[index]), 1)
+                if self.published_thermal.get(circuit["key"]) == (trip, load):
+                    continue
+                self.published_thermal[circuit["key"]] = (trip, load)
+
+                self.set_state(
+                    f"{self.entity_prefix}_{circuit['key']}_time_to_trip",
+                    state=trip,
+                    attributes={
+                        "unit_of_measurement": "s",
+                        "device_class": "duration",
+                        "friendly_name": f"{circuit['panel']} {circuit['name']} Breaker Time To Trip",
+                        "trip_curve": circuit["curve"],
+                        "breaker_rating": circuit["rating"],
+                    },
+                )
+                self.set_state(
+                    f"{self.entity_prefix}_{circuit['key']}_thermal_load",
+                    state=load,
+                    attributes={
+                        "unit_of_measurement": "%",
+                        "state_class": "measurement",
+                        "friendly_name": f"{circuit['panel']} {circuit['name']} Breaker Thermal Load",
+                    },
+                )
+        except Exception as e:
+            self.log(f"Error publishing thermal state: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def p1_active(self, now):
+        """Return True while P1 telegrams arrive, so the Home Assistant sensor states are not needed."""
+        return (self.p1_reader is not None and self.p1_reader.last_telegram is not None
+                and now - self.p1_reader.last_telegram < self.p1_timeout)
+
+    def p1_telegram_received(self, values, timestamp):
+        """Add the currents of a P1 telegram to the bank and evaluate the alert rules right away.
+
+        Runs on the P1 reader thread, so an overload is detected without waiting for
+        Home Assistant to update the sensors or for the next scheduled evaluation.
+        The events and notifications are handed to AppDaemon, so the reader never
+        waits for a Home Assistant call.
+        """
+        try:
+            with self.bank_lock:
+                for code, value in values.items():
+                    index = self.p1_circuits[code]
+                    self.bank.add(index, value, timestamp)
+                    self.p1_values[index] = value
+                alerts = self.evaluate_circuits(timestamp)
+            for alert in alerts:
+                self.run_in(self.send_p1_alert, 0, alert=alert)
+        except Exception as e:
+            self.log(f"Error processing P1 telegram: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def send_p1_alert(self, kwargs):
+        """Send the notification and event of an alert found on the P1 reader thread."""
+        try:
+            self.send_notification(*kwargs["alert"])
+        except Exception as e:
+            self.log(f"Error sending P1 alert: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def mirror_p1_values(self, kwargs):
+        """Publish the latest P1 currents and the state of the P1 connection as entities."""
+        try:
+            for index, value in list(self.p1_values.items()):
+                circuit = self.circuits[index]
+                if self.published_p1.get(circuit["key"]) == value:
+                    continue
+                self.published_p1[circuit["key"]] = value
+                self.set_state(
+                    f"{self.entity_prefix}_{circuit['key']}_current",
+                    state=value,
+                    attributes={
+                        "unit_of_measurement": "A",
+                        "device_class": "current",
+                        "state_class": "measurement",
+                        "friendly_name": f"{circuit['panel']} {circuit['name']} Current (P1)",
+                    },
+                )
+
+            reader = self.p1_reader
+            if not reader.connected:
+                state = "disconnected"
+            elif self.p1_active(self.get_now_ts()):
+                state = "receiving"
+            else:
+                state = "connected"
+            self.set_state(
+                f"{self.entity_prefix}_p1",
+                state=state,
+                attributes={
+                    "friendly_name": "Phase Current Alert P1 Port",
+                    "port": self.p1_port,
+                    "telegrams": reader.parser.telegrams,
+                    "crc_errors": reader.parser.crc_errors,
+                    "bytes_received": reader.parser.bytes_received,
+                },
+            )
+        except Exception as e:
+            self.log(f"Error mirroring P1 values: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def send_notification(self, circuit, current_value, threshold, rule=None, statistics=None, time_to_trip=None):
         """Send a notification about the high current and fire an event."""
-        message = f"⚠️ High Current Alert: {phase} is at {current_value:.1f}A (threshold: {threshold}A). Please reduce load to avoid tripping the breaker."
+        name = circuit["name"] if circuit["panel"] == "main" else f"{circuit['panel']} {circuit['name']}"
+        message = f"⚠️ High Current Alert: {name} is at {current_value:.1f}A (threshold: {threshold}A). Please reduce load to avoid tripping the breaker."
+        if time_to_trip is not None:
+            message += f" The breaker is expected to trip in {time_to_trip:.0f} seconds."
         
         # Fire an event that other apps can listen for
         event_data = {
-            "phase": phase,
+            "phase": circuit["name"],
+            "panel": circuit["panel"],
+            "circuit": circuit["key"],
             "current_value": current_value,
             "threshold": threshold,
-            "timestamp": str(datetime.datetime.now())
+            "rule": rule,
+            "time_to_trip": round(time_to_trip, 1) if time_to_trip is not None else None,
+            "timestamp": str(self.datetime()),
+            "event_time": self.get_now_ts()
         }
+        if statistics:
+            event_data.update(statistics)
         self.log(f"Firing event: {self.event_name} with data: {event_data}")
         self.fire_event(self.event_name, **event_data)
         
@@ -0,0 +1,222 @@
+import hassapi as hass
+import datetime
+import math
+import os
+import struct
+import traceback
+
+# Compact binary trace of phase current state changes.
+#
+# A trace file starts with a header (magic, version, base timestamp) followed by
+# records. A channel record maps a channel number to an entity id the first time
+# the entity appears in the file; a sample record stores the channel, the time
+# since the base timestamp in milliseconds and the value as a 32-bit float
+# (NaN for unavailable/unknown states). A sample takes 11 bytes on disk.
+TRACE_MAGIC = b"PCTR"
+TRACE_VERSION = 1
+HEADER = struct.Struct("<4sBd")
+CHANNEL_RECORD = struct.Struct("<BHH")
+SAMPLE_RECORD = struct.Struct("<BHIf")
+RECORD_CHANNEL = 0
+RECORD_SAMPLE = 1
+
+
+class TraceWriter:
+    """Append phase current samples to a compact binary trace file."""
+
+    def __init__(self, path, base_time):
+        """
+        Args:
+            path (str): Path of the trace file. An existing file is appended to.
+            base_time (float): Timestamp the sample offsets are relative to (used for new files).
+        """
+        self.path = path
+        self.channels = {}
+        self.buffer = bytearray()
+
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            # Continue an existing file with its own base time and channel table
+            self.base_time, self.channels, end = read_trace_file(path, with_channels=True)
+            if end < os.path.getsize(path):
+                # Drop the partial record of an interrupted write, or the appended records would be misaligned
+                with open(path, "r+b") as f:
+                    f.truncate(end)
+        else:
+            self.base_time = base_time
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(TRACE_MAGIC, TRACE_VERSION, base_time))
+
+    def add(self, entity, value, timestamp):
+        """Buffer a sample; call flush() to write it to disk."""
+        channel = self.channels.get(entity)
+        if channel is None:
+            channel = len(self.channels)
+            self.channels[entity] = channel
+            name = entity.encode("utf-8")
+            self.buffer += CHANNEL_RECORD.pack(RECORD_CHANNEL, channel, len(name)) + name
+        offset = max(int(round((timestamp - self.base_time) * 1000)), 0)
+        self.buffer += SAMPLE_RECORD.pack(RECORD_SAMPLE, channel, offset, value)
+
+    def flush(self):
+        """Write the buffered records to the trace file."""
+        if not self.buffer:
+            return 0
+        with open(self.path, "ab") as f:
+            f.write(self.buffer)
+        written = len(self.buffer)
+        self.buffer = bytearray()
+        return written
+
+
+def read_trace_file(path, with_channels=False):
+    """
+    Read a binary trace file.
+
+    Returns:
+        list: (timestamp, entity, value) tuples in file order, or
+        (base time, channel table, end of the last complete record) when with_channels is set.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, base_time = HEADER.unpack_from(data, 0)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION:
+        raise ValueError(f"{path} is not a phase current trace")
+
+    names = {}
+    samples = []
+    position = HEADER.size
+    size = len(data)
+    while position < size:
+        record_type = data[position]
+        if record_type == RECORD_CHANNEL:
+            if position + CHANNEL_RECORD.size > size:
+                break
+            _, channel, length = CHANNEL_RECORD.unpack_from(data, position)
+            if position + CHANNEL_RECORD.size + length > size:
+                break
+            position += CHANNEL_RECORD.size
+            names[channel] = data[position:position + length].decode("utf-8")
+            position += length
+        elif record_type == RECORD_SAMPLE:
+            if position + SAMPLE_RECORD.size > size:
+                break  # Truncated last record of a file that is still being written
+            _, channel, offset, value = SAMPLE_RECORD.unpack_from(data, position)
+            position += SAMPLE_RECORD.size
+            if not with_channels:
+                samples.append((base_time + offset / 1000.0, names[channel], value))
+        else:
+            raise ValueError(f"Corrupt record at byte {position} of {path}")
+
+    if with_channels:
+        return base_time, {name: channel for channel, name in names.items()}, position
+    return samples
+
+
+def read_trace(paths):
+    """Read one or more trace files and return their samples ordered by time."""
+    if isinstance(paths, str):
+        paths = [paths]
+    samples = []
+    for path in paths:
+        samples.extend(read_trace_file(path))
+    samples.sort(key=lambda sample: sample[0])
+    return samples
+
+
+class PhaseCurrentRecorder(hass.Hass):
+    """
+    AppDaemon app that records phase current state changes to compact daily trace files.
+
+    The traces can be replayed offline against PhaseCurrentAlert and EVChargeControl
+    with replay.py. The phase currents include the EV while it charges; recording the
+    current the charger draws as well (charger_current_sensor) lets the replay take
+    it out again.
+    """
+
+    def initialize(self):
+        """Initialize the app."""
+        try:
+            self.log("Phase Current Recorder initializing")
+
+            self.sensors = self.args.get("sensors", [
+                "sensor.pillanatnyi_aramerosseg_l1",
+                "sensor.pillanatnyi_aramerosseg_l2",
+                "sensor.pillanatnyi_aramerosseg_l3",
+            ])
+            charger_current_sensor = self.args.get("charger_current_sensor")
+            if charger_current_sensor and charger_current_sensor not in self.sensors:
+                self.sensors = self.sensors + [charger_current_sensor]
+            self.trace_dir = self.args.get("trace_dir", os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces"))
+            self.flush_interval = int(self.args.get("flush_interval", 60))
+            self.retention_days = int(self.args.get("retention_days", 60))
+
+            os.makedirs(self.trace_dir, exist_ok=True)
+            self.writer = None
+            self.writer_day = None
+            self.samples_recorded = 0
+
+            self.listener_handles = [self.listen_state(self.state_changed, sensor) for sensor in self.sensors]
+            self.timer_handles = [self.run_every(self.flush, "now", self.flush_interval)]
+
+            self.log(f"Recording {len(self.sensors)} sensors to {self.trace_dir}, flush interval: {self.flush_interval} seconds")
+        except Exception as e:
+            self.log(f"Error during initialization: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
+
+    def terminate(self):
+        """Flush buffered samples when the app is terminated."""
+        try:
+            self.flush({})
+            for handle in self.listener_handles:
+                self.cancel_listen_state(handle)
+            for handle in self.timer_handles:
+                self.cancel_timer(handle)
+            self.log(f"Phase Current Recorder terminated after recording {self.samples_recorded} samples")
+        except Exception as e:
+            self.log(f"Error during termination: {e}", level="ERROR")
+
+    def current_writer(self, now):
+        """Return the writer of the current day, rotating the file at midnight."""
+        day = now.strftime("%Y%m%d")
+        if day != self.writer_day:
+            if self.writer is not None:
+                self.writer.flush()
+            path = os.path.join(self.trace_dir, f"phase_current_{day}.trace")
+            self.writer = TraceWriter(path, now.timestamp())
+            self.writer_day = day
+            self.remove_old_traces(now)
+        return self.writer
+
+    def remove_old_traces(self, now):
+        """Delete trace files older than the retention period."""
+        cutoff = (now - datetime.timedelta(days=self.retention_days)).strftime("%Y%m%d")
+        for name in os.listdir(self.trace_dir):
+            if name.startswith("phase_current_") and name.endswith(".trace") and name[14:22] < cutoff:
+                os.remove(os.path.join(self.trace_dir, name))
+                self.log(f"Removed old trace {name}")
+
+    def state_changed(self, entity, attribute, old, new, kwargs):
+        """Record a state change of a phase current or charger current sensor."""
+        try:
+            if new == old:
+                return
+            try:
+                value = float(new)
+            except (TypeError, ValueError):
+                value = math.nan
+            now = self.datetime()
+            self.current_writer(now).add(entity, value, now.timestamp())
+            self.samples_recorded += 1
+        except Exception as e:
+            self.log(f"Error recording state change of {entity}: {e}", level="ERROR")
+
+    def flush(self, kwargs):
+        """Write buffered samples to disk."""
+        try:
+            if self.writer is not None:
+                written = self.writer.flush()
+                if written:
+                    self.log(f"Flushed {written} bytes to {self.writer.path}", level="DEBUG")
+        except Exception as e:
+            self.log(f"Error flushing trace: {e}", level="ERROR")
+            self.log(f"Traceback: {traceback.format_exc()}", level="ERROR")
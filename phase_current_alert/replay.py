@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# replay.py - Offline replay of recorded phase current traces
+# This file is NOT an AppDaemon app and should NOT be loaded by AppDaemon
+#
+# Drives PhaseCurrentAlert and EVChargeControl with a fake Hass and a virtual
+# clock, so weeks of recorded load can be replayed in seconds.
+#
+# Usage:
+#   python replay.py traces/phase_current_*.trace
+#   python replay.py trace.csv --ev-current 16 --charger-delay 30
+#   python replay.py --synthetic 24
+#   python replay.py --heat-pump 3 --ev-current 10 --oscillation-window 1800
+
+import argparse
+import datetime
+import heapq
+import itertools
+import math
+import os
+import sys
+import time
+import types
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CHARGE_APP_DIR = os.path.join(os.path.dirname(APP_DIR), "ev_charge_control")
+
+
+class VirtualClock:
+    """Virtual time with a timer heap; time only moves when the replay advances it."""
+
+    def __init__(self, start):
+        self.now = start
+        self.timers = []
+        self.sequence = itertools.count()
+        self.cancelled = set()
+
+    def schedule(self, when, callback, kwargs, interval=0):
+        handle = next(self.sequence)
+        heapq.heappush(self.timers, (when, handle, callback, kwargs, interval))
+        return handle
+
+    def cancel(self, handle):
+        self.cancelled.add(handle)
+
+    def advance(self, until, run):
+        """Run every timer due up to the given time, then move the clock there."""
+        while self.timers and self.timers[0][0] <= until:
+            when, handle, callback, kwargs, interval = heapq.heappop(self.timers)
+            if handle in self.cancelled:
+                self.cancelled.discard(handle)
+                continue
+            self.now = max(self.now, when)
+            if interval:
+                heapq.heappush(self.timers, (when + interval, handle, callback, kwargs, interval))
+            run(callback, kwargs)
+        self.now = max(self.now, until)
+
+
+class ReplayHarness:
+    """In-process stand-in for AppDaemon and Home Assistant shared by all fake apps."""
+
+    def __init__(self, start):
+        self.clock = VirtualClock(start)
+        self.states = {}
+        self.state_listeners = {}
+        self.event_listeners = {}
+        self.listener_sequence = itertools.count()
+        self.service_calls = []
+        self.service_handlers = {}
+        self.fired_events = []
+        self.callback_latency = {}
+        self.errors = 0
+
+    def run_callback(self, callback, *args):
+        """Run an app callback and record its wall-clock latency."""
+        start = time.perf_counter()
+        callback(*args)
+        elapsed = time.perf_counter() - start
+        self.callback_latency.setdefault(callback.__qualname__, []).append(elapsed)
+
+    def run_timer(self, callback, kwargs):
+        self.run_callback(callback, kwargs)
+
+    def set_state(self, entity, state):
+        old = self.states.get(entity)
+        self.states[entity] = state
+        if old == state:
+            return
+        for callback, kwargs in list(self.state_listeners.get(entity, {}).values()):
+            self.run_callback(callback, entity, "state", old, state, kwargs)
+
+    def fire_event(self, event, data):
+        self.fired_events.append((self.clock.now, event, data))
+        for callback, kwargs in list(self.event_listeners.get(event, {}).values()):
+            self.run_callback(callback, event, data, kwargs)
+
+    def call_service(self, service, data):
+        self.service_calls.append((self.clock.now, service, data))
+        handler = self.service_handlers.get(service)
+        if handler:
+            handler(service, data)
+
+
+class FakeHass:
+    """Implements the part of the AppDaemon Hass API the apps use, on top of ReplayHarness."""
+
+    harness = None
+    quiet = True
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def log(self, message, level="INFO"):
+        if level == "ERROR":
+            self.harness.errors += 1
+            print(f"[{self.name}] ERROR {message}", file=sys.stderr)
+        elif not self.quiet and level != "DEBUG":
+            print(f"[{self.name}] {level} {message}")
+
+    def get_now_ts(self):
+        return self.harness.clock.now
+
+    def datetime(self, aware=False):
+        return datetime.datetime.fromtimestamp(self.harness.clock.now)
+
+    def get_now(self):
+        return self.datetime()
+
+    def _start_time(self, start):
+        if start in (None, "now"):
+            return self.harness.clock.now
+        if isinstance(start, str) and start.startswith("now+"):
+            return self.harness.clock.now + float(start[4:])
+        if isinstance(start, datetime.datetime):
+            return start.timestamp()
+        return self.harness.clock.now
+
+    def run_in(self, callback, delay, **kwargs):
+        return self.harness.clock.schedule(self.harness.clock.now + delay, callback, kwargs)
+
+    def run_at(self, callback, start, **kwargs):
+        return self.harness.clock.schedule(self._start_time(start), callback, kwargs)
+
+    def run_every(self, callback, start, interval, **kwargs):
+        return self.harness.clock.schedule(self._start_time(start), callback, kwargs, interval)
+
+    def cancel_timer(self, handle):
+        self.harness.clock.cancel(handle)
+
+    def timer_running(self, handle):
+        return handle not in self.harness.clock.cancelled
+
+    def listen_state(self, callback, entity, **kwargs):
+        handle = next(self.harness.listener_sequence)
+        self.harness.state_listeners.setdefault(entity, {})[handle] = (callback, kwargs)
+        return handle
+
+    def cancel_listen_state(self, handle):
+        for listeners in self.harness.state_listeners.values():
+            listeners.pop(handle, None)
+
+    def listen_event(self, callback, event, **kwargs):
+        handle = next(self.harness.listener_sequence)
+        self.harness.event_listeners.setdefault(event, {})[handle] = (callback, kwargs)
+        return handle
+
+    def cancel_listen_event(self, handle):
+        for listeners in self.harness.event_listeners.values():
+            listeners.pop(handle, None)
+
+    def fire_event(self, event, **data):
+        self.harness.fire_event(event, data)
+
+    def get_state(self, entity=None, attribute=None, default=None):
+        if entity is None:
+            return {name: {"state": state, "attributes": {}} for name, state in self.harness.states.items()}
+        return self.harness.states.get(entity, default)
+
+    def set_state(self, entity, state=None, attributes=None, **kwargs):
+        self.harness.states[entity] = state
+
+    def call_service(self, service, **data):
+        self.harness.call_service(service, data)
+
+    def submit_to_executor(self, func, *args, callback=None, **kwargs):
+        """Run func on the next clock tick, as the AppDaemon executor would run it in the background."""
+        def run(timer_kwargs):
+            result = func(*args, **kwargs)
+            if callback is not None:
+                self.harness.run_callback(callback, {"result": result})
+        return self.harness.clock.schedule(self.harness.clock.now, run, {})
+
+
+def install_fake_hassapi():
+    """Register FakeHass as the Hass base class of both hassapi import styles."""
+    module = types.ModuleType("hassapi")
+    module.Hass = FakeHass
+    sys.modules["hassapi"] = module
+    for name in ("appdaemon", "appdaemon.plugins", "appdaemon.plugins.hass"):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules["appdaemon.plugins.hass.hassapi"] = module
+    for path in (APP_DIR, CHARGE_APP_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def load_config(path, default):
+    """Load the arguments of the first app in an AppDaemon YAML file."""
+    if not path:
+        return dict(default)
+    import yaml
+    with open(path) as f:
+        apps = yaml.safe_load(f) or {}
+    for args in apps.values():
+        if isinstance(args, dict) and "class" in args:
+            return {key: value for key, value in args.items() if key not in ("class", "module")}
+    return dict(default)
+
+
+class ChargerModel:
+    """
+    Simulated EV charger: adds its current to the phases while charging and
+    follows stop/start and set current service calls after a configurable cloud delay.
+
+    The phase samples of the trace are the household load. A trace recorded while
+    the EV was charging has to include the current the charger drew then (the
+    charger_current_sensor of the recorder), which is subtracted from the phase
+    samples so the EV is not counted twice.
+    """
+
+    def __init__(self, harness, charge_args, phase_sensors, ev_current, delay):
+        self.harness = harness
+        self.sensor = charge_args.get("charging_sensor")
+        self.phase_sensors = phase_sensors
+        self.ev_current = ev_current
+        self.delay = delay
+        self.charging = True
+        self.base_load = {sensor: 0.0 for sensor in phase_sensors}
+        self.recorded_load = {}
+        self.recorded_ev_current = 0.0
+        harness.service_handlers[charge_args.get("stop_charge_service")] = self.command
+        harness.service_handlers[charge_args.get("start_charge_service")] = self.command
+        self.stop_service = charge_args.get("stop_charge_service")
+        self.max_current = ev_current
+        self.current_field = charge_args.get("set_current_field", "current")
+        if charge_args.get("set_current_service"):
+            harness.service_handlers[charge_args.get("set_current_service")] = self.set_current
+        self.harness.states[self.sensor] = "on"
+
+    def command(self, service, data):
+        target = service != self.stop_service
+        self.harness.clock.schedule(self.harness.clock.now + self.delay, self.apply, {"charging": target})
+
+    def set_current(self, service, data):
+        current = min(float(data.get(self.current_field, self.max_current)), self.max_current)
+        self.harness.clock.schedule(self.harness.clock.now + self.delay, self.apply_current, {"current": current})
+
+    def apply_current(self, kwargs):
+        self.ev_current = kwargs["current"]
+        if self.charging:
+            for sensor in self.phase_sensors:
+                self.publish(sensor)
+
+    def apply(self, kwargs):
+        if kwargs["charging"] == self.charging:
+            return
+        self.charging = kwargs["charging"]
+        self.harness.set_state(self.sensor, "on" if self.charging else "off")
+        for sensor in self.phase_sensors:
+            self.publish(sensor)
+
+    def total(self, sensor):
+        return self.base_load[sensor] + (self.ev_current if self.charging else 0.0)
+
+    def publish(self, sensor):
+        self.harness.set_state(sensor, f"{self.total(sensor):.2f}")
+
+    def sample(self, sensor, value):
+        self.recorded_load[sensor] = value
+        self.base_load[sensor] = max(value - self.recorded_ev_current, 0.0)
+        self.publish(sensor)
+
+    def sample_recorded_charger(self, value):
+        """Take the current the EV drew when the trace was recorded out of the phase samples."""
+        self.recorded_ev_current = 0.0 if math.isnan(value) else max(value, 0.0)
+        for sensor, recorded in self.recorded_load.items():
+            self.sample(sensor, recorded)
+
+
+def percentile(values, percent):
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+
+def count_oscillations(calls, stop_service, start_service, window):
+    """Count the stops that followed a resume within window seconds."""
+    oscillations = 0
+    last_resume = None
+    for timestamp, service, data in calls:
+        if service == start_service:
+            last_resume = timestamp
+        elif service == stop_service and last_resume is not None:
+            if timestamp - last_resume <= window:
+                oscillations += 1
+            last_resume = None
+    return oscillations
+
+
+def replay(trace, alert_args, charge_args, ev_current=16.0, charger_delay=30.0, speed=0.0, oscillation_window=600.0,
+           charger_sensor=None):
+    """
+    Replay a trace of household load through both apps.
+
+    Args:
+        trace (list): (timestamp, entity, value) samples of the household load, without the EV
+            unless charger_sensor is given.
+        alert_args (dict): PhaseCurrentAlert configuration.
+        charge_args (dict): EVChargeControl configuration.
+        ev_current (float): Current the simulated EV draws on every phase while charging.
+        charger_delay (float): Seconds between a charger service call and the state change.
+        speed (float): Pace the replay at this multiple of real time (0 = as fast as possible).
+        oscillation_window (float): A stop this many seconds after a resume counts as an oscillation.
+        charger_sensor (str): Entity of the trace with the current the EV drew on every phase when
+            it was recorded, subtracted from the phase samples. None if the EV was not charging.
+
+    Returns:
+        dict: Replay report.
+    """
+    install_fake_hassapi()
+    from phase_current_alert import PhaseCurrentAlert
+    from ev_charge_control import EVChargeControl
+
+    harness = ReplayHarness(trace[0][0] - 10 if trace else 0.0)
+    FakeHass.harness = harness
+
+    phase_sensors = [charge_args.get(f"sensor_l{n}") for n in (1, 2, 3)]
+    thresholds = {charge_args.get(f"sensor_l{n}"): float(charge_args.get(f"threshold_l{n}", 16)) for n in (1, 2, 3)}
+    charger = ChargerModel(harness, charge_args, phase_sensors, ev_current, charger_delay)
+    for sensor in phase_sensors:
+        charger.publish(sensor)
+
+    alert = PhaseCurrentAlert("phase_current_alert", alert_args)
+    # Latencies are reported below instead of being appended to the app's log file, and
+    # every replay starts without learned load profiles
+    charge = EVChargeControl("ev_charge_control", dict(charge_args, latency_log_file="", forecast_profile_file=""))
+    alert.initialize()
+    charge.initialize()
+
+    over_time = {sensor: 0.0 for sensor in phase_sensors}
+    charging_time = 0.0
+    charged_amp_hours = 0.0
+    last_time = harness.clock.now
+    wall_start = time.perf_counter()
+    run_timer = harness.run_timer
+
+    for timestamp, entity, value in trace:
+        harness.clock.advance(timestamp, run_timer)
+        elapsed = timestamp - last_time
+        for sensor in phase_sensors:
+            if charger.total(sensor) > thresholds[sensor]:
+                over_time[sensor] += elapsed
+        if charger.charging:
+            charging_time += elapsed
+            charged_amp_hours += charger.ev_current * elapsed / 3600
+        last_time = timestamp
+
+        if entity == charger_sensor:
+            charger.sample_recorded_charger(value)
+        elif entity in charger.base_load and not math.isnan(value):
+            charger.sample(entity, value)
+        elif math.isnan(value):
+            harness.set_state(entity, "unavailable")
+
+        if speed:
+            ahead = (timestamp - trace[0][0]) / speed - (time.perf_counter() - wall_start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    wall_time = time.perf_counter() - wall_start
+    simulated = (trace[-1][0] - trace[0][0]) if trace else 0.0
+    calls = harness.service_calls
+    oscillations = count_oscillations(calls, charge_args.get("stop_charge_service"), charge_args.get("start_charge_service"), oscillation_window)
+    latencies = [latency for values in harness.callback_latency.values() for latency in values]
+    return {
+        "samples": len(trace),
+        "simulated_seconds": simulated,
+        "wall_seconds": wall_time,
+        "speedup": simulated / wall_time if wall_time else math.inf,
+        "stops": sum(1 for call in calls if call[1] == charge_args.get("stop_charge_service")),
+        "resumes": sum(1 for call in calls if call[1] == charge_args.get("start_charge_service")),
+        "oscillations": oscillations,
+        "oscillation_window": oscillation_window,
+        "oscillations_per_day": oscillations / (simulated / 86400) if simulated else 0.0,
+        "current_changes": sum(1 for call in calls if call[1] == charge_args.get("set_current_service")),
+        "notifications": sum(1 for call in calls if call[1].startswith("notify/")),
+        "events": len(harness.fired_events),
+        "over_threshold_seconds": over_time,
+        "charging_seconds": charging_time,
+        "charged_amp_hours": charged_amp_hours,
+        "callback_latency": {
+            name: (len(values), percentile(values, 50), percentile(values, 99))
+            for name, values in sorted(harness.callback_latency.items())
+        },
+        "callback_p99": percentile(latencies, 99),
+        "reaction_latency": {stage: histogram.summary() for stage, histogram in charge.latency_histograms.items() if histogram.count},
+        "errors": harness.errors,
+    }
+
+
+def print_report(report):
+    print(f"Replayed {report['samples']} samples covering {report['simulated_seconds'] / 3600:.1f} h in {report['wall_seconds']:.2f} s ({report['speedup']:.0f}x real time)")
+    print(f"Charging stopped {report['stops']} times, resumed {report['resumes']} times, charged for {report['charging_seconds'] / 3600:.1f} h")
+    print(f"Stopped within {report['oscillation_window']:.0f} s of resuming (oscillations): {report['oscillations']}, {report['oscillations_per_day']:.1f} per day")
+    print(f"Charging current changed {report['current_changes']} times, delivered {report['charged_amp_hours']:.1f} Ah per phase")
+    print(f"Notifications sent: {report['notifications']}, events fired: {report['events']}")
+    for sensor, seconds in report["over_threshold_seconds"].items():
+        print(f"Time over threshold on {sensor}: {seconds:.0f} s")
+    print("Callback latency (calls, p50 ms, p99 ms):")
+    for name, (calls, p50, p99) in report["callback_latency"].items():
+        print(f"  {name}: {calls}, {p50 * 1000:.3f}, {p99 * 1000:.3f}")
+    if report["reaction_latency"]:
+        print("Overload reaction latency in virtual time (stops, p50 s, p95 s, max s):")
+        for stage, summary in report["reaction_latency"].items():
+            print(f"  {stage}: {summary['count']}, {summary['p50']}, {summary['p95']}, {summary['max']}")
+    if report["errors"]:
+        print(f"Errors logged by the apps: {report['errors']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay phase current traces through PhaseCurrentAlert and EVChargeControl")
+    parser.add_argument("traces", nargs="*", help="Binary .trace files from PhaseCurrentRecorder or CSV files (timestamp,entity,current)")
+    parser.add_argument("--alert-config", default=os.path.join(APP_DIR, "phase_current_alert.yaml"))
+    parser.add_argument("--charge-config", default=os.path.join(CHARGE_APP_DIR, "ev_charge_control.yaml"))
+    parser.add_argument("--ev-current", type=float, default=16.0, help="Current drawn by the EV on every phase while charging")
+    parser.add_argument("--charger-delay", type=float, default=30.0, help="Seconds until the charger follows a stop/start command")
+    parser.add_argument("--charge-mode", choices=["switch", "modulate"], help="Override charge_mode of the charge config")
+    parser.add_argument("--forecast-horizon", type=float, help="Override forecast_horizon of the charge config (0 disables the load forecast)")
+    parser.add_argument("--oscillation-window", type=float, default=600.0, help="Count a stop this many seconds after a resume as an oscillation")
+    parser.add_argument("--speed", type=float, default=0.0, help="Pace the replay at this multiple of real time (default: as fast as possible)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Replay this many hours of synthetic load instead of trace files")
+    parser.add_argument("--heat-pump", type=int, default=0, help="Replay this many days of load with a heat pump cycling at the same times every day")
+    parser.add_argument("--charger-sensor", help="Entity of the traces with the recorded charger current, subtracted from the phase currents")
+    parser.add_argument("--verbose", action="store_true", help="Print the app logs")
+    options = parser.parse_args()
+
+    install_fake_hassapi()
+    alert_args = load_config(options.alert_config, {})
+    charge_args = load_config(options.charge_config, {})
+    if options.charge_mode:
+        charge_args["charge_mode"] = options.charge_mode
+        if options.charge_mode == "modulate":
+            charge_args.setdefault("set_current_service", "charger/set_charging_current")
+            charge_args.setdefault("max_charge_current", options.ev_current)
+    if options.forecast_horizon is not None:
+        charge_args["forecast_horizon"] = options.forecast_horizon
+
+    if options.heat_pump or options.synthetic or not options.traces:
+        import bench_phase_current_alert
+        sensors = {f"L{n}": alert_args.get(f"sensor_l{n}", f"sensor.pillanatnyi_aramerosseg_l{n}") for n in (1, 2, 3)}
+        if options.heat_pump:
+            samples = bench_phase_current_alert.heat_pump_trace(options.heat_pump)
+        else:
+            samples = bench_phase_current_alert.synthetic_trace(options.synthetic or 24, base_load=0.0)
+        trace = [(timestamp, sensors[phase], current) for timestamp, phase, current in samples]
+    else:
+        import phase_trace
+        import bench_phase_current_alert
+        binary = [path for path in options.traces if path.endswith(".trace")]
+        trace = phase_trace.read_trace(binary) if binary else []
+        for path in options.traces:
+            if not path.endswith(".trace"):
+                trace.extend(bench_phase_current_alert.load_csv_trace(path))
+        trace.sort(key=lambda sample: sample[0])
+
+    FakeHass.quiet = not options.verbose
+    report = replay(trace, alert_args, charge_args, options.ev_current, options.charger_delay, options.speed, options.oscillation_window,
+                    options.charger_sensor)
+    print_report(report)
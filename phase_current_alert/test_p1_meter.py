@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# test_p1_meter.py - Tests for the P1 telegram parser of p1_meter.py
+# This file is NOT an AppDaemon app and should NOT be loaded by AppDaemon
+#
+# Usage:
+#   python -m pytest test_p1_meter.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from p1_meter import MAX_TELEGRAM_SIZE, PHASE_CURRENT_OBIS, P1TelegramParser
+from p1_simulator import build_telegram
+
+CURRENTS = {"L1": 2.0, "L2": 11.5, "L3": 0.0}
+EXPECTED = {PHASE_CURRENT_OBIS[phase]: current for phase, current in CURRENTS.items()}
+
+
+def make_parser():
+    return P1TelegramParser(PHASE_CURRENT_OBIS.values())
+
+
+def test_valid_crc():
+    parser = make_parser()
+    assert parser.feed(build_telegram(CURRENTS, 0, decimals=1)) == [EXPECTED]
+    assert parser.telegrams == 1
+    assert parser.crc_errors == 0
+    assert not parser.buffer
+
+
+def test_bad_crc_resyncs():
+    parser = make_parser()
+    telegram = build_telegram(CURRENTS, 0, decimals=1)
+    damaged = telegram.replace(b"011.5*A", b"099.5*A")
+    # The damaged telegram is dropped and the next one is read
+    assert parser.feed(damaged + telegram) == [EXPECTED]
+    assert parser.crc_errors == 1
+    assert parser.telegrams == 1
+
+    # Garbage and a telegram cut off in the middle are skipped the same way
+    assert parser.feed(b"\x00noise" + telegram[:40] + telegram) == [EXPECTED]
+    assert parser.telegrams == 2
+
+
+def test_telegram_split_across_chunks():
+    parser = make_parser()
+    telegram = build_telegram(CURRENTS, 0, decimals=1)
+    results = []
+    for offset in range(0, len(telegram), 7):
+        results.extend(parser.feed(telegram[offset:offset + 7]))
+    assert results == [EXPECTED]
+
+    # Split right after "!", before the CRC line is complete
+    end = telegram.index(b"!") + 3
+    assert parser.feed(telegram[:end]) == []
+    assert parser.feed(telegram[end:]) == [EXPECTED]
+
+
+def test_oversize_telegram_is_abandoned():
+    parser = make_parser()
+    # A start without an end is kept up to MAX_TELEGRAM_SIZE bytes, then given up
+    assert parser.feed(b"/" + b"x" * (MAX_TELEGRAM_SIZE // 2)) == []
+    assert parser.buffer.startswith(b"/")
+    assert parser.feed(b"x" * MAX_TELEGRAM_SIZE) == []
+    assert not parser.buffer.startswith(b"/")
+
+    telegram = build_telegram(CURRENTS, 0, decimals=1)
+    assert parser.feed(telegram) == [EXPECTED]
+    assert not parser.buffer
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# test_phase_trace.py - Tests for the binary trace files of phase_trace.py
+# This file is NOT an AppDaemon app and should NOT be loaded by AppDaemon
+#
+# Usage:
+#   python -m pytest test_phase_trace.py
+
+import os
+import sys
+import types
+
+# phase_trace.py imports hassapi for the recorder app; the trace files do not use it
+sys.modules.setdefault("hassapi", types.SimpleNamespace(Hass=object))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from phase_trace import CHANNEL_RECORD, SAMPLE_RECORD, TraceWriter, read_trace_file
+
+BASE = 1700000000.0
+L1 = "sensor.current_l1"
+L2 = "sensor.current_l2"
+
+
+def write(path, samples):
+    writer = TraceWriter(str(path), BASE)
+    for entity, value, timestamp in samples:
+        writer.add(entity, value, timestamp)
+    writer.flush()
+
+
+def test_append_keeps_channels(tmp_path):
+    path = tmp_path / "phase.trace"
+    write(path, [(L1, 10.0, BASE + 1)])
+    write(path, [(L1, 11.0, BASE + 2), (L2, 3.5, BASE + 3)])
+    assert read_trace_file(str(path)) == [(BASE + 1, L1, 10.0), (BASE + 2, L1, 11.0), (BASE + 3, L2, 3.5)]
+
+
+def test_append_drops_partial_sample(tmp_path):
+    path = tmp_path / "phase.trace"
+    write(path, [(L1, 10.0, BASE + 1)])
+    complete = os.path.getsize(path)
+    # A crash in the middle of a write leaves part of a sample record
+    with open(path, "ab") as f:
+        f.write(SAMPLE_RECORD.pack(1, 0, 2000, 12.0)[:5])
+
+    write(path, [(L1, 11.0, BASE + 3)])
+    assert os.path.getsize(path) == complete + SAMPLE_RECORD.size
+    assert read_trace_file(str(path)) == [(BASE + 1, L1, 10.0), (BASE + 3, L1, 11.0)]
+
+
+def test_append_drops_partial_channel(tmp_path):
+    path = tmp_path / "phase.trace"
+    write(path, [(L1, 10.0, BASE + 1)])
+    # The channel record is complete but its name is cut off
+    name = L2.encode("utf-8")
+    with open(path, "ab") as f:
+        f.write(CHANNEL_RECORD.pack(0, 1, len(name)) + name[:6])
+
+    write(path, [(L2, 3.5, BASE + 2)])
+    assert read_trace_file(str(path)) == [(BASE + 1, L1, 10.0), (BASE + 2, L2, 3.5)]
+    _, channels, end = read_trace_file(str(path), with_channels=True)
+    assert channels == {L1: 0, L2: 1}
+    assert end == os.path.getsize(path)
@@ -0,0 +1,689 @@
+#!/usr/bin/env python3
+# bench_sensor_unavailable.py - Benchmark script for sensor_unavailable.py
+# This file is NOT an AppDaemon app and should NOT be loaded by AppDaemon
+#
+# Drives SensorUnavailable with simulated sensors on a virtual clock and compares the
+# single deadline scheduler with the previous design of one AppDaemon timer per sensor,
+# and measures saving and restoring the monitor snapshot and the startup with sensors
+# listed in the configuration versus discovered by rules, a configuration reload, and the
+# accuracy of the stuck value and flapping detection on synthetic faulty sensors.
+#
+# With --suite it instead runs the app at several scales with a realistic mix of update
+# rates and some failing sensors, and reports state callbacks per second, timer churn,
+# memory per monitored entity and alert latency, to catch regressions in the hot path.
+#
+# Usage:
+#   python bench_sensor_unavailable.py              # 10000 sensors, 1 simulated hour
+#   python bench_sensor_unavailable.py 50000 6      # 50000 sensors, 6 simulated hours
+#   python bench_sensor_unavailable.py --suite      # 100, 1000, 10000 and 50000 sensors
+#   python bench_sensor_unavailable.py --suite --scales 100,5000 --hours 2
+
+import argparse
+import bisect
+import heapq
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+
+class VirtualClock:
+    """Timers of the fake Hass, run in order of their due time as the clock advances."""
+
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+        self.timers = []
+        self.active = {}
+        self.sequence = itertools.count()
+        self.scheduled = 0
+        self.cancelled = 0
+        self.peak_active = 0
+
+    def schedule(self, callback, delay, kwargs, interval=0):
+        handle = next(self.sequence)
+        heapq.heappush(self.timers, (self.now + delay, handle, callback, kwargs, interval))
+        self.active[handle] = True
+        self.scheduled += 1
+        self.peak_active = max(self.peak_active, len(self.active))
+        return handle
+
+    def cancel(self, handle):
+        if self.active.pop(handle, None):
+            self.cancelled += 1
+
+    def advance(self, until):
+        while self.timers and self.timers[0][0] <= until:
+            due, handle, callback, kwargs, interval = heapq.heappop(self.timers)
+            if handle not in self.active:
+                continue
+            self.now = due
+            if interval:
+                heapq.heappush(self.timers, (due + interval, handle, callback, kwargs, interval))
+            else:
+                del self.active[handle]
+            callback(kwargs)
+        self.now = until
+
+
+class FakeHass:
+    """Implements the part of the AppDaemon Hass API sensor_unavailable uses."""
+
+    clock = None
+
+    def __init__(self, args=None):
+        self.name = "bench"
+        self.args = args or {}
+        self.states = {}
+        self.attributes = {}
+        self.listeners = {}
+        self.event_listeners = []
+        self.notifications = []
+
+    def log(self, message, level="INFO"):
+        pass
+
+    def get_now_ts(self):
+        return self.clock.now
+
+    def listen_state(self, callback, entity, **kwargs):
+        self.listeners.setdefault(entity, []).append((callback, kwargs))
+        return (entity, len(self.listeners[entity]) - 1)
+
+    def cancel_listen_state(self, handle):
+        entity, index = handle
+        self.listeners[entity][index] = None
+
+    def listen_event(self, callback, event, **kwargs):
+        self.event_listeners.append((callback, event, kwargs))
+
+    def run_in(self, callback, delay, **kwargs):
+        return self.clock.schedule(callback, delay, kwargs)
+
+    def run_every(self, callback, start, interval, **kwargs):
+        return self.clock.schedule(callback, 0 if start == "now" else interval, kwargs, interval)
+
+    def cancel_timer(self, handle):
+        self.clock.cancel(handle)
+
+    def get_state(self, entity=None, **kwargs):
+        if entity is None:
+            return {name: {"state": state, "attributes": self.attributes.get(name, {})} for name, state in self.states.items()}
+        return self.states.get(entity)
+
+    def call_service(self, service, *args, **data):
+        self.notifications.append((self.clock.now, service, args, data))
+
+    def set_sensor(self, entity, state, attributes=None):
+        old = self.states.get(entity)
+        self.states[entity] = state
+        if attributes is not None:
+            self.attributes[entity] = attributes
+        for listener in self.listeners.get(entity, ()):
+            if listener is not None:
+                callback, kwargs = listener
+                callback(entity, "state", old, state, kwargs)
+        if self.event_listeners:
+            old_state = None if old is None else {"state": old, "attributes": self.attributes.get(entity, {})}
+            new_state = {"state": state, "attributes": self.attributes.get(entity, {})}
+            self.fire_state_changed(entity, old_state, new_state)
+
+    def remove_entity(self, entity):
+        old = self.states.pop(entity)
+        self.fire_state_changed(entity, {"state": old, "attributes": self.attributes.pop(entity, {})}, None)
+
+    def fire_state_changed(self, entity, old_state, new_state):
+        data = {"entity_id": entity, "old_state": old_state, "new_state": new_state}
+        for callback, event, kwargs in self.event_listeners:
+            if event == "state_changed":
+                callback(event, data, kwargs)
+
+
+def load_app_module():
+    """Import sensor_unavailable with the fake Hass instead of AppDaemon."""
+    sys.modules["hassapi"] = types.SimpleNamespace(Hass=FakeHass)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import sensor_unavailable
+    return sensor_unavailable
+
+
+class PerTimerMonitor:
+    """The previous design: every state change cancels and re-creates an AppDaemon timer per sensor."""
+
+    def __init__(self, app, entity_name, check_interval):
+        self.app = app
+        self.entity_name = entity_name
+        self.check_interval = check_interval
+        self.unavailable_timer = None
+        self.previous_value = None
+        self.app.listen_state(self.on_entity_changed, entity_name)
+        self.same_val_timer = self.app.run_in(self.on_sensor_stays_same, check_interval)
+
+    def on_entity_changed(self, entity, attribute, old, new, kwargs):
+        if new in ("unknown", "unavailable"):
+            if not self.unavailable_timer:
+                self.unavailable_timer = self.app.run_in(self.notify_unavailable, 1800)
+        else:
+            if self.unavailable_timer:
+                self.app.cancel_timer(self.unavailable_timer)
+                self.unavailable_timer = None
+            if self.same_val_timer:
+                self.app.cancel_timer(self.same_val_timer)
+            self.previous_value = new
+            self.same_val_timer = self.app.run_in(self.on_sensor_stays_same, self.check_interval)
+
+    def notify_unavailable(self, kwargs):
+        self.unavailable_timer = None
+        self.app.call_service("notify/bench", message="unavailable")
+
+    def on_sensor_stays_same(self, kwargs):
+        if self.app.get_state(self.entity_name) == self.previous_value:
+            self.app.call_service("notify/bench", message="unchanged")
+        self.same_val_timer = self.app.run_in(self.on_sensor_stays_same, self.check_interval)
+
+
+def sensor_updates(sensors, seconds, start, seed=1):
+    """
+    Yield (timestamp, entity, state) for sensors reporting every 10 to 300 seconds,
+    with an occasional unavailable period.
+    """
+    rng = random.Random(seed)
+    queue = [(start + rng.uniform(0, 300), entity, rng.uniform(10, 300)) for entity in sensors]
+    heapq.heapify(queue)
+    end = start + seconds
+    while queue and queue[0][0] < end:
+        timestamp, entity, period = heapq.heappop(queue)
+        state = "unavailable" if rng.random() < 0.001 else f"{rng.uniform(18, 24):.1f}"
+        yield timestamp, entity, state
+        heapq.heappush(queue, (timestamp + period * rng.uniform(0.8, 1.2), entity, period))
+
+
+def run(design, sensor_count, hours, seed=1):
+    """
+    Replay the simulated updates through one design.
+
+    Returns:
+        dict: Wall time, updates, timer operations and live timers.
+    """
+    module = load_app_module()
+    FakeHass.clock = clock = VirtualClock()
+    sensors = [f"sensor.bench_{index}_temperature" for index in range(sensor_count)]
+    config = {entity: {"check_interval": 21600} for entity in sensors}
+
+    start = time.perf_counter()
+    if design == "scheduler":
+        app = module.SensorUnavailable({"notification_service": "notify/bench", "sensors": config, "cadence_file": "", "snapshot_file": "",
+                                        "adaptive_staleness": True})
+        app.initialize()
+    else:
+        app = FakeHass({})
+        app.monitors = [PerTimerMonitor(app, entity, 21600) for entity in sensors]
+    setup = time.perf_counter() - start
+
+    updates = 0
+    start = time.perf_counter()
+    for timestamp, entity, state in sensor_updates(sensors, hours * 3600, clock.now, seed):
+        clock.advance(timestamp)
+        app.set_sensor(entity, state)
+        updates += 1
+    clock.advance(clock.now + 1)
+    elapsed = time.perf_counter() - start
+    return {
+        "setup": setup,
+        "elapsed": elapsed,
+        "updates": updates,
+        "per_update_us": elapsed / updates * 1e6 if updates else 0.0,
+        "timer_operations": clock.scheduled + clock.cancelled,
+        "peak_timers": clock.peak_active,
+        "pending": len(app.scheduler) if design == "scheduler" else len(clock.active),
+    }
+
+
+def run_snapshot(sensor_count, hours, seed=1):
+    """
+    Save the snapshot of monitors that ran for a while, and restore it into a new app.
+
+    Returns:
+        dict: Save and restore time, snapshot size, and the queued deadlines before and after.
+    """
+    module = load_app_module()
+    FakeHass.clock = clock = VirtualClock()
+    sensors = [f"sensor.bench_{index}_temperature" for index in range(sensor_count)]
+    args = {
+        "notification_service": "notify/bench",
+        "sensors": {entity: {"check_interval": 21600} for entity in sensors},
+        "cadence_file": "",
+        "snapshot_file": "",
+        "adaptive_staleness": True,
+    }
+    app = module.SensorUnavailable(dict(args))
+    app.initialize()
+    for timestamp, entity, state in sensor_updates(sensors, hours * 3600, clock.now, seed):
+        clock.advance(timestamp)
+        app.set_sensor(entity, state)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app.snapshot_file = os.path.join(directory, "snapshot.json")
+        start = time.perf_counter()
+        app.save_snapshot({})
+        save = time.perf_counter() - start
+        size = os.path.getsize(app.snapshot_file)
+
+        # A restart 5 minutes later, with the sensor states kept by Home Assistant
+        clock.advance(clock.now + 300)
+        restarted = module.SensorUnavailable(dict(args))
+        restarted.states = app.states
+        start = time.perf_counter()
+        restarted.initialize()
+        startup = time.perf_counter() - start
+        restarted.snapshot_file = app.snapshot_file
+        start = time.perf_counter()
+        restarted.restore_snapshot()
+        restore = time.perf_counter() - start
+
+    def pending(app):
+        return sum(deadline is not None for monitor in app.entities_to_watch.values() for deadline in monitor.deadlines.values())
+    return {"save": save, "size": size, "startup": startup, "restore": restore, "before": pending(app), "after": pending(restarted)}
+
+
+def run_discovery(sensor_count, other_count=None):
+    """
+    Start the app with the sensors listed under sensors and selected by discover rules,
+    among as many entities that are not monitored.
+
+    Returns:
+        dict: Startup time of both configurations and the number of monitors.
+    """
+    module = load_app_module()
+    FakeHass.clock = VirtualClock()
+    other_count = sensor_count if other_count is None else other_count
+    states, attributes = {}, {}
+    for index in range(sensor_count):
+        entity = f"sensor.bench_{index}_temperature"
+        states[entity], attributes[entity] = "21.5", {"device_class": "temperature", "friendly_name": f"Bench {index}"}
+    for index in range(other_count):
+        entity = f"light.bench_{index}" if index % 2 else f"sensor.bench_{index}_power"
+        states[entity], attributes[entity] = "on", {"device_class": "power"} if index % 2 == 0 else {}
+
+    args = {"notification_service": "notify/bench", "cadence_file": "", "snapshot_file": ""}
+    result = {}
+    for name, config in (
+        ("listed", {"sensors": {entity: {"check_interval": 21600} for entity in states if entity.endswith("_temperature")}}),
+        ("discovered", {"discover": {"include": [{"domain": "sensor", "device_class": "temperature", "check_interval": 21600}],
+                                     "exclude": [{"glob": "sensor.bench_1_*"}]}}),
+    ):
+        app = module.SensorUnavailable(dict(args, **config))
+        app.states, app.attributes = dict(states), dict(attributes)
+        start = time.perf_counter()
+        app.initialize()
+        result[name] = time.perf_counter() - start
+        result[f"{name}_monitors"] = len(app.entities_to_watch)
+
+    # Entities appearing and disappearing while running
+    app.set_sensor("sensor.new_temperature", "20.0", {"device_class": "temperature"})
+    app.remove_entity("sensor.bench_0_temperature")
+    result["tracked"] = "sensor.new_temperature" in app.entities_to_watch and "sensor.bench_0_temperature" not in app.entities_to_watch
+    return result
+
+
+def run_reload(sensor_count, discover=False):
+    """
+    Reload the configuration with one changed check_interval, as AppDaemon does: terminate
+    the running instance and initialize a new one.
+
+    Returns:
+        dict: Time of the first start and of the reload, and whether the elapsed time was kept.
+    """
+    module = load_app_module()
+    FakeHass.clock = clock = VirtualClock()
+    sensors = [f"sensor.bench_{index}_temperature" for index in range(sensor_count)]
+    args = {"notification_service": "notify/bench", "cadence_file": "", "snapshot_file": ""}
+    if discover:
+        args["discover"] = {"include": [{"domain": "sensor", "check_interval": 21600}]}
+        args["sensors"] = {sensors[0]: {"check_interval": 21600}}
+    else:
+        args["sensors"] = {entity: {"check_interval": 21600} for entity in sensors}
+
+    app = module.SensorUnavailable(dict(args))
+    for entity in sensors:
+        app.states[entity] = "21.5"
+    start = time.perf_counter()
+    app.initialize()
+    first = time.perf_counter() - start
+    clock.advance(clock.now + 3600)
+
+    changed = dict(args["sensors"])
+    changed[sensors[0]] = {"check_interval": 7200}
+    start = time.perf_counter()
+    app.terminate()
+    reloaded = module.SensorUnavailable(dict(args, sensors=changed))
+    reloaded.states = app.states
+    reloaded.initialize()
+    reload = time.perf_counter() - start
+    deadline = reloaded.entities_to_watch[sensors[0]].deadlines["stale"]
+    return {"first": first, "reload": reload, "kept": deadline - clock.now == 3600, "monitors": len(reloaded.entities_to_watch)}
+
+
+def detection_streams(sensor_count, seconds, start, seed=1):
+    """
+    Synthetic sensors, a quarter of each kind, the faulty ones failing at a random time
+    in the first half:
+      healthy:  temperature random walk sampled every minute, rounded to 0.1
+      jitter:   healthy, then frozen while toggling between two neighbouring values
+      binary:   motion sensor, on for a minute a few times an hour
+      flapping: motion sensor that starts toggling every few seconds
+
+    Returns:
+        tuple: (sorted list of (timestamp, entity, state), {entity: (kind, fault time or None)})
+    """
+    rng = random.Random(seed)
+    events = []
+    sensors = {}
+    kinds = ("healthy", "jitter", "binary", "flapping")
+    for index in range(sensor_count):
+        kind = kinds[index % 4]
+        fault = start + rng.uniform(0.1, 0.5) * seconds if kind in ("jitter", "flapping") else None
+        entity = f"{'binary_' if kind in ('binary', 'flapping') else ''}sensor.{kind}_{index}"
+        sensors[entity] = (kind, fault)
+        timestamp = start + rng.uniform(0, 60)
+        if kind in ("healthy", "jitter"):
+            value, state = rng.uniform(18, 24), None
+            while timestamp < start + seconds:
+                if fault is not None and timestamp >= fault:
+                    new = f"{round(value, 1) + 0.1 * (int(timestamp // 60) % 2):.1f}"
+                else:
+                    value += rng.gauss(0, 0.1)
+                    new = f"{value:.1f}"
+                if new != state:
+                    events.append((timestamp, entity, new))
+                    state = new
+                timestamp += 60
+        else:
+            while timestamp < start + seconds:
+                if fault is not None and fault <= timestamp < fault + 600:
+                    events.append((timestamp, entity, "on"))
+                    events.append((timestamp + rng.uniform(2, 6), entity, "off"))
+                    timestamp += rng.uniform(8, 15)
+                else:
+                    following = timestamp + rng.expovariate(1 / 1200)
+                    if fault is not None and timestamp < fault <= following:
+                        timestamp = fault
+                        continue
+                    events.append((following, entity, "on"))
+                    events.append((following + 60, entity, "off"))
+                    timestamp = following + 60
+    events = [event for event in events if event[0] < start + seconds]
+    events.sort(key=lambda event: event[0])
+    return events, sensors
+
+
+def run_detection(sensor_count, hours, seed=1):
+    """
+    Replay the synthetic sensors through each stuck detection mode.
+
+    Returns:
+        dict: Per mode the time per update, detected faults, false alerts and mean detection latency.
+    """
+    module = load_app_module()
+    FakeHass.clock = clock = VirtualClock()
+    start = clock.now
+    events, sensors = detection_streams(sensor_count, hours * 3600, start, seed)
+    results = {}
+    for mode, tolerance in (("exact", 0), ("epsilon", 0.15), ("range", 0.15), ("variance", 0.08)):
+        FakeHass.clock = clock = VirtualClock(start)
+        config = {}
+        for entity, (kind, fault) in sensors.items():
+            if entity.startswith("binary_"):
+                config[entity] = {"same_val_check_enabled": False, "flap_count": 10, "flap_window": 120}
+            else:
+                config[entity] = {"check_interval": 1800, "stuck_detection": mode, "stuck_tolerance": tolerance}
+        app = module.SensorUnavailable({"notification_service": "notify/bench", "sensors": config, "cadence_file": "",
+                                        "snapshot_file": "", "adaptive_staleness": False, "group_by": "prefix"})
+        app.initialize()
+        alerts = {}
+        report = app.report
+
+        def record(monitor, kind, recovered=False):
+            if not recovered and kind in ("stale", "flapping"):
+                alerts.setdefault(monitor.entity_name, clock.now)
+            report(monitor, kind, recovered)
+        app.report = record
+
+        elapsed = 0.0
+        for timestamp, entity, state in events:
+            clock.advance(timestamp)
+            begin = time.perf_counter()
+            app.set_sensor(entity, state)
+            elapsed += time.perf_counter() - begin
+        clock.advance(start + hours * 3600)
+
+        detected, false_alerts, latencies = 0, 0, []
+        faulty = sum(fault is not None for kind, fault in sensors.values())
+        for entity, (kind, fault) in sensors.items():
+            alerted = alerts.get(entity)
+            if alerted is None or alerted > start + hours * 3600:
+                continue
+            if fault is not None and alerted >= fault:
+                detected += 1
+                latencies.append(alerted - fault)
+            else:
+                false_alerts += 1
+        results[mode] = {
+            "per_update_us": elapsed / len(events) * 1e6,
+            "detected": detected,
+            "faulty": faulty,
+            "false_alerts": false_alerts,
+            "healthy": len(sensors) - faulty,
+            "latency": sum(latencies) / len(latencies) if latencies else 0.0,
+        }
+    return results
+
+
+# Update periods in seconds of the realistic mix: (share of the sensors, shortest, longest)
+UPDATE_PROFILE = (
+    (0.1, 10, 30),      # power and current sensors
+    (0.7, 60, 600),     # temperature, humidity, illuminance
+    (0.2, 1800, 7200),  # batteries, contacts, slow counters
+)
+
+
+def realistic_updates(sensors, seconds, start, seed=1, fault_share=0.01):
+    """
+    Plan the updates of sensors with the UPDATE_PROFILE mix; fault_share of them go silent
+    and as many become unavailable, at a random time in the first half.
+
+    Returns:
+        tuple: (generator of (timestamp, entity, state), {entity: (fault, last update before
+        the fault)} filled in as the generator runs, {entity: check_interval})
+    """
+    rng = random.Random(seed)
+    queue = []
+    faults = {}
+    intervals = {}
+    for entity in sensors:
+        draw = rng.random()
+        for share, shortest, longest in UPDATE_PROFILE:
+            if draw < share:
+                break
+            draw -= share
+        period = rng.uniform(shortest, longest)
+        # The unchanged value check is set well above the sensor's period
+        intervals[entity] = max(600, int(period * 4))
+        draw = rng.random()
+        fault = None
+        if draw < 2 * fault_share:
+            fault = ("silent" if draw < fault_share else "unavailable", start + rng.uniform(0, seconds / 2))
+            faults[entity] = [fault, None]
+            if fault[0] == "unavailable":
+                queue.append((fault[1], entity, None, fault))
+        queue.append((start + rng.uniform(0, period), entity, period, fault))
+    heapq.heapify(queue)
+
+    def updates():
+        end = start + seconds
+        while queue and queue[0][0] < end:
+            timestamp, entity, period, fault = heapq.heappop(queue)
+            if period is None:
+                yield timestamp, entity, "unavailable"
+                continue
+            if fault is not None and timestamp >= fault[1]:
+                continue
+            yield timestamp, entity, f"{rng.uniform(0, 1000):.1f}"
+            if fault is not None:
+                faults[entity][1] = timestamp
+            heapq.heappush(queue, (timestamp + period * rng.uniform(0.8, 1.2), entity, period, fault))
+    return updates(), faults, intervals
+
+
+def run_scale(sensor_count, hours, seed=1):
+    """
+    Run the app with sensor_count sensors of the realistic mix.
+
+    Returns:
+        dict: Callbacks per second, timer churn, memory per entity and alert latencies.
+    """
+    module = load_app_module()
+    sensors = [f"sensor.scale_{index}" for index in range(sensor_count)]
+    updates, faults, intervals = realistic_updates(sensors, hours * 3600, VirtualClock().now, seed)
+    args = {
+        "notification_service": "notify/bench",
+        "sensors": {entity: {"check_interval": intervals[entity]} for entity in sensors},
+        "cadence_file": "",
+        "snapshot_file": "",
+        "adaptive_staleness": False,
+        # The fake Home Assistant has no registries to read
+        "group_by": "prefix",
+    }
+
+    # Memory of the monitors after setup and one update of every sensor
+    FakeHass.clock = VirtualClock()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    app = module.SensorUnavailable(dict(args))
+    app.initialize()
+    for entity in sensors:
+        app.set_sensor(entity, "1.0")
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del app
+
+    FakeHass.clock = clock = VirtualClock()
+    simulation_start = clock.now
+    app = module.SensorUnavailable(dict(args))
+    app.initialize()
+    reports = {}
+    report = app.report
+
+    def record(monitor, kind, recovered=False):
+        if not recovered:
+            reports.setdefault((monitor.entity_name, kind), clock.now)
+        report(monitor, kind, recovered)
+    app.report = record
+    ticks = 0
+    on_tick = app.on_tick
+
+    def tick(kwargs):
+        nonlocal ticks
+        ticks += 1
+        on_tick(kwargs)
+    # The tick timer was created by initialize, so it is swapped in the clock's heap
+    clock.timers = [(due, handle, tick if callback == on_tick else callback, kwargs, interval)
+                    for due, handle, callback, kwargs, interval in clock.timers]
+
+    count = 0
+    elapsed = 0.0
+    for timestamp, entity, state in updates:
+        clock.advance(timestamp)
+        start = time.perf_counter()
+        app.set_sensor(entity, state)
+        elapsed += time.perf_counter() - start
+        count += 1
+    start = time.perf_counter()
+    clock.advance(clock.now + 3600)
+    tick_time = time.perf_counter() - start
+
+    # next() of the scheduler's sequence is the number of entries pushed on its heap
+    pushes = next(app.scheduler.sequence)
+    sent = [timestamp for timestamp, service, args_, data in app.notifications]
+    detection, notification, missed = [], [], 0
+    for entity, ((kind, fault_time), last_update) in faults.items():
+        if kind == "unavailable":
+            due = fault_time + app.entities_to_watch[entity].unavailable_check_interval
+            reported = reports.get((entity, "unavailable"))
+        else:
+            # A sensor silent from the start is watched from the start of the simulation
+            due = (last_update if last_update is not None else simulation_start) + intervals[entity]
+            reported = reports.get((entity, "stale"))
+        if due > clock.now - 3600:
+            continue  # Due after the simulated period
+        if reported is None:
+            missed += 1
+            continue
+        detection.append(reported - due)
+        index = bisect.bisect_left(sent, reported)
+        if index < len(sent):
+            notification.append(sent[index] - due)
+    return {
+        "sensors": sensor_count,
+        "updates": count,
+        "callbacks_per_second": (count + ticks) / (elapsed + tick_time) if elapsed else 0.0,
+        "per_update_us": elapsed / count * 1e6 if count else 0.0,
+        "timer_operations": clock.scheduled + clock.cancelled,
+        "heap_pushes_per_update": pushes / count if count else 0.0,
+        "memory_per_entity": memory / sensor_count,
+        "faults": len(detection) + missed,
+        "missed": missed,
+        "detection_latency": (sum(detection) / len(detection), max(detection)) if detection else (0.0, 0.0),
+        "notification_latency": (sum(notification) / len(notification), max(notification)) if notification else (0.0, 0.0),
+    }
+
+
+def run_suite(scales, hours):
+    print(f"{'sensors':>8} {'updates':>9} {'callbacks/s':>12} {'us/update':>10} {'timer ops':>10} {'pushes/update':>14} "
+          f"{'bytes/entity':>13} {'faults':>7} {'missed':>7} {'detection s (mean/max)':>23} {'notified s (mean/max)':>22}")
+    for sensor_count in scales:
+        result = run_scale(sensor_count, hours)
+        print(f"{result['sensors']:>8} {result['updates']:>9} {result['callbacks_per_second']:>12.0f} {result['per_update_us']:>10.2f} "
+              f"{result['timer_operations']:>10} {result['heap_pushes_per_update']:>14.3f} {result['memory_per_entity']:>13.0f} "
+              f"{result['faults']:>7} {result['missed']:>7} "
+              f"{result['detection_latency'][0]:>11.1f}/{result['detection_latency'][1]:<11.1f} "
+              f"{result['notification_latency'][0]:>10.1f}/{result['notification_latency'][1]:<11.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sensor_unavailable.py on a virtual clock")
+    parser.add_argument("sensors", type=int, nargs="?", default=10000)
+    parser.add_argument("hours", type=float, nargs="?", default=1)
+    parser.add_argument("--suite", action="store_true", help="Run the scale suite instead")
+    parser.add_argument("--scales", default="100,1000,10000,50000", help="Sensor counts of the suite")
+    parser.add_argument("--hours", dest="suite_hours", type=float, default=1.5, help="Simulated hours per scale of the suite")
+    options = parser.parse_args()
+    if options.suite:
+        run_suite([int(scale) for scale in options.scales.split(",")], options.suite_hours)
+        sys.exit(0)
+
+    sensor_count = options.sensors
+    hours = options.hours
+    print(f"{sensor_count} sensors, {hours:g} simulated hours")
+    for design in ("per-timer", "scheduler"):
+        result = run(design, sensor_count, hours)
+        print(f"{design}: setup {result['setup'] * 1000:.0f} ms, {result['updates']} updates in {result['elapsed']:.2f} s "
+              f"({result['per_update_us']:.2f} us per update), {result['timer_operations']} AppDaemon timer operations, "
+              f"{result['peak_timers']} live timers at peak, {result['pending']} timers or deadlines queued at the end")
+    result = run_snapshot(sensor_count, hours)
+    print(f"snapshot: saved in {result['save'] * 1000:.0f} ms ({result['size'] // 1024} KiB), restored in {result['restore'] * 1000:.0f} ms "
+          f"(startup without it {result['startup'] * 1000:.0f} ms), {result['before']} deadlines before, {result['after']} after")
+    result = run_discovery(sensor_count)
+    print(f"startup: {result['listed_monitors']} listed sensors in {result['listed'] * 1000:.0f} ms, "
+          f"{result['discovered_monitors']} of {sensor_count * 2} entities discovered in {result['discovered'] * 1000:.0f} ms, "
+          f"added and removed entities tracked: {result['tracked']}")
+    for mode, result in run_detection(min(sensor_count, 2000), 6).items():
+        print(f"detection ({mode}): {result['per_update_us']:.2f} us per update, {result['detected']} of {result['faulty']} faulty sensors "
+              f"detected after {result['latency'] / 60:.0f} minutes on average, {result['false_alerts']} false alerts on {result['healthy']} healthy sensors")
+    for discover in (False, True):
+        result = run_reload(sensor_count, discover)
+        print(f"reload ({'discovered' if discover else 'listed'}): {result['monitors']} sensors started in {result['first'] * 1000:.0f} ms, "
+              f"reloaded with one changed check_interval in {result['reload'] * 1000:.0f} ms, elapsed time kept: {result['kept']}")
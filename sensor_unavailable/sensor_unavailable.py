@@ -1,7 +1,377 @@
 import hassapi as hass
+import fnmatch
+import heapq
+import itertools
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+# Number of sensor names listed per group in a digest before "and N more"
+DIGEST_MAX_NAMES = 15
+
+# Home Assistant template expressions naming the area, device or integration of `entity`, for group_by
+GROUP_TEMPLATES = {
+    "area": "area_name(entity)",
+    "device": "device_attr(device_id(entity), 'name_by_user') or device_attr(device_id(entity), 'name')",
+    "integration": "config_entry_attr(config_entry_id(entity), 'title')",
+}
+
+# Sensor options passed on to SensorMonitor.configure_detectors
+DETECTOR_OPTIONS = ("stuck_detection", "stuck_tolerance", "flap_count", "flap_window")
+
+# Instances terminated for a configuration reload, by app name, handing their monitors over to the next instance:
+# (time terminated, app). An instance not picked up within RELOAD_TIMEOUT seconds (app removed or renamed) is dropped.
+RELOADING_APPS = {}
+RELOAD_TIMEOUT = 60
+
+
+def drop_stale_reloads(now):
+    """Drops the terminated instances that no new instance picked up within RELOAD_TIMEOUT seconds."""
+    for name, (terminated, _) in list(RELOADING_APPS.items()):
+        if now - terminated > RELOAD_TIMEOUT:
+            del RELOADING_APPS[name]
+
+
+def take_reloading_app(name, now):
+    """Returns the instance of the app terminated for a configuration reload, or None."""
+    drop_stale_reloads(now)
+    entry = RELOADING_APPS.pop(name, None)
+    return entry[1] if entry is not None else None
+
+
+class DeadlineScheduler:
+    """
+    Per-sensor deadlines in a single heap, serviced by one periodic tick of the app.
+
+    Moving a deadline later (the common case: a sensor reported a new value) only
+    updates the monitor and costs O(1); the queued heap entry is moved when it
+    comes due. Moving it earlier or scheduling a new one pushes an entry, O(log n).
+    Cancelled and superseded entries are dropped when they reach the top.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.sequence = itertools.count()
+
+    def schedule(self, monitor, kind, deadline):
+        """Set the deadline of a monitor's check ("unavailable" or "stale")."""
+        monitor.deadlines[kind] = deadline
+        queued = monitor.queued.get(kind)
+        if queued is None or deadline < queued:
+            monitor.queued[kind] = deadline
+            heapq.heappush(self.heap, (deadline, next(self.sequence), monitor, kind))
+
+    def cancel(self, monitor, kind):
+        """Cancel a monitor's check."""
+        monitor.deadlines[kind] = None
+
+    def pending(self, monitor, kind):
+        """Return True if the monitor's check is scheduled."""
+        return monitor.deadlines.get(kind) is not None
+
+    def pop_due(self, now):
+        """Remove and return the (monitor, kind) checks that are due."""
+        due = []
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            deadline, _, monitor, kind = heapq.heappop(heap)
+            if monitor.queued.get(kind) != deadline:
+                continue  # Superseded by an earlier entry
+            monitor.queued[kind] = None
+            current = monitor.deadlines.get(kind)
+            if current is None:
+                continue
+            if current > now:
+                # The deadline was moved later since this entry was queued
+                monitor.queued[kind] = current
+                heapq.heappush(heap, (current, next(self.sequence), monitor, kind))
+                continue
+            monitor.deadlines[kind] = None
+            due.append((monitor, kind))
+        return due
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class CadenceEstimator:
+    """
+    Streaming estimate of one quantile of a sensor's intervals between value changes.
+
+    Uses the P-square algorithm (Jain and Chlamtac, 1985): five markers whose heights
+    track the minimum, the quantile, the maximum and two points in between, moved
+    with a parabolic fit as observations arrive. The state is a few numbers per
+    sensor, no matter how many intervals it has seen.
+    """
+
+    __slots__ = ("quantile", "count", "heights", "positions", "desired")
+
+    def __init__(self, quantile=0.95, state=None):
+        """
+        Args:
+            quantile (float): The quantile to estimate, between 0 and 1.
+            state (dict): State saved by to_dict, to continue a previous estimate.
+        """
+        self.quantile = quantile
+        self.count = 0
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * quantile, 4 * quantile, 2 + 2 * quantile, 4]
+        if state and state.get("quantile") == quantile:
+            self.count = state["count"]
+            self.heights = list(state["heights"])
+            self.positions = list(state["positions"])
+            self.desired = list(state["desired"])
+
+    def add(self, interval):
+        """Add an observed interval in seconds."""
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(interval)
+            heights.sort()
+            return
+
+        positions = self.positions
+        if interval < heights[0]:
+            heights[0] = interval
+            cell = 0
+        elif interval >= heights[4]:
+            heights[4] = interval
+            cell = 3
+        else:
+            cell = 0
+            while interval >= heights[cell + 1]:
+                cell += 1
+        for index in range(cell + 1, 5):
+            positions[index] += 1
+        quantile = self.quantile
+        desired = self.desired
+        desired[1] += quantile / 2
+        desired[2] += quantile
+        desired[3] += (1 + quantile) / 2
+        desired[4] += 1
+
+        # Move the middle markers towards their desired positions
+        for index in (1, 2, 3):
+            offset = desired[index] - positions[index]
+            if (offset >= 1 and positions[index + 1] - positions[index] > 1) or \
+                    (offset <= -1 and positions[index - 1] - positions[index] < -1):
+                step = 1 if offset > 0 else -1
+                height = self.parabolic(index, step)
+                if not heights[index - 1] < height < heights[index + 1]:
+                    height = heights[index] + step * (heights[index + step] - heights[index]) / (positions[index + step] - positions[index])
+                heights[index] = height
+                positions[index] += step
+
+    def parabolic(self, index, step):
+        """Return the piecewise-parabolic prediction of a marker moved by step."""
+        heights = self.heights
+        positions = self.positions
+        return heights[index] + step / (positions[index + 1] - positions[index - 1]) * (
+            (positions[index] - positions[index - 1] + step) * (heights[index + 1] - heights[index]) / (positions[index + 1] - positions[index])
+            + (positions[index + 1] - positions[index] - step) * (heights[index] - heights[index - 1]) / (positions[index] - positions[index - 1])
+        )
+
+    def value(self):
+        """Return the estimated quantile, or None before the first interval."""
+        if not self.heights:
+            return None
+        if self.count <= 5:
+            return self.heights[min(int(self.quantile * len(self.heights)), len(self.heights) - 1)]
+        return self.heights[2]
+
+    def to_dict(self):
+        """Return the state as a JSON serializable dict."""
+        return {
+            "quantile": self.quantile,
+            "count": self.count,
+            "heights": self.heights,
+            "positions": self.positions,
+            "desired": self.desired,
+        }
+
+
+class DiscoveryRule:
+    """
+    Selects entities by domain, device_class, glob and regex; an entity has to match
+    every criterion given. Each criterion except regex may be a single value or a list.
+    """
+
+    def __init__(self, config):
+        """
+        Args:
+            config (dict): The rule from the discover section, with the sensor options
+                (check_interval, same_val_check_enabled, group, adaptive_staleness)
+                of the entities it selects.
+        """
+        self.domains = self.as_set(config.get("domain"))
+        self.device_classes = self.as_set(config.get("device_class"))
+        globs = self.as_set(config.get("glob")) or set()
+        # The globs are combined into one regex, any of them may match
+        self.globs = re.compile("|".join(fnmatch.translate(glob) for glob in globs)) if globs else None
+        self.regex = re.compile(config["regex"]) if config.get("regex") else None
+        self.options = config
+
+    @staticmethod
+    def as_set(value):
+        if value is None:
+            return None
+        return {value} if isinstance(value, str) else set(value)
+
+    def matches(self, entity_id, attributes):
+        """Returns True if the entity with the given state attributes is selected by the rule."""
+        if self.domains is not None and entity_id.split(".", 1)[0] not in self.domains:
+            return False
+        if self.device_classes is not None and attributes.get("device_class") not in self.device_classes:
+            return False
+        if self.globs is not None and not self.globs.match(entity_id):
+            return False
+        if self.regex is not None and not self.regex.search(entity_id):
+            return False
+        return True
+
+    def resolve(self, index):
+        """
+        Returns the entities of the index selected by the rule.
+
+        Domain and device_class are looked up in the index, so only their entities
+        are matched against the globs and the regex.
+        """
+        candidates = None
+        if self.domains is not None:
+            candidates = set().union(*(index.by_domain.get(domain, ()) for domain in self.domains))
+        if self.device_classes is not None:
+            by_class = set().union(*(index.by_device_class.get(device_class, ()) for device_class in self.device_classes))
+            candidates = by_class if candidates is None else candidates & by_class
+        if candidates is None:
+            candidates = index.states.keys()
+        return [
+            entity_id for entity_id in candidates
+            if (self.globs is None or self.globs.match(entity_id)) and (self.regex is None or self.regex.search(entity_id))
+        ]
+
+
+class StateIndex:
+    """The entities of one bulk get_state() read, indexed by domain and device_class."""
+
+    def __init__(self, states):
+        self.states = states
+        self.by_domain = {}
+        self.by_device_class = {}
+        for entity_id, state in states.items():
+            self.by_domain.setdefault(entity_id.split(".", 1)[0], []).append(entity_id)
+            device_class = (state.get("attributes") or {}).get("device_class")
+            if device_class is not None:
+                self.by_device_class.setdefault(device_class, []).append(entity_id)
+
+
+class StuckDetector:
+    """
+    Decides whether a numeric sensor really moved, so jitter within a tolerance does not
+    count as a change and a frozen sensor that toggles between close values is caught.
+
+    The values since the last real change are summarized in a few numbers:
+      epsilon:  moved if the value is more than tolerance away from the last change
+      range:    moved if maximum - minimum of the values exceeds tolerance
+      variance: moved if the standard deviation of the values exceeds tolerance
+    Non-numeric values are compared exactly.
+    """
+
+    MODES = ("epsilon", "range", "variance")
+
+    __slots__ = ("mode", "tolerance", "reference", "count", "mean", "m2", "low", "high")
+
+    def __init__(self, mode, tolerance):
+        """
+        Args:
+            mode (str): "epsilon", "range" or "variance".
+            tolerance (float): The movement that counts as a change, in the sensor's unit.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown stuck_detection {mode!r}, expected exact or one of {', '.join(self.MODES)}")
+        self.mode = mode
+        self.tolerance = float(tolerance)
+        self.reference = None
+        self.count = 0
+
+    def reset(self, value):
+        self.reference = value
+        self.count = 1
+        self.mean = self.low = self.high = value
+        self.m2 = 0.0
+
+    def add(self, state):
+        """
+        Adds a new state of the sensor.
+
+        Returns:
+            bool: True if the sensor moved beyond the tolerance, which starts a new window.
+        """
+        try:
+            value = float(state)
+        except (TypeError, ValueError):
+            moved = state != self.reference
+            self.reference = state
+            self.count = 0
+            return moved
+        if not self.count:
+            self.reset(value)
+            return True
+
+        mode = self.mode
+        if mode == "epsilon":
+            moved = abs(value - self.reference) > self.tolerance
+        elif mode == "range":
+            if value < self.low:
+                self.low = value
+            elif value > self.high:
+                self.high = value
+            moved = self.high - self.low > self.tolerance
+        else:
+            # Welford's running variance
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+            moved = self.m2 / self.count > self.tolerance * self.tolerance
+        if moved:
+            self.reset(value)
+        return moved
+
+
+class FlapDetector:
+    """
+    Detects a sensor flapping: count state changes within window seconds. The times of
+    the last count changes are kept in a fixed-size ring.
+    """
+
+    __slots__ = ("count", "window", "times", "index")
+
+    def __init__(self, count, window):
+        """
+        Args:
+            count (int): Number of state changes that make a sensor flapping.
+            window (float): Seconds the changes have to fall within.
+        """
+        self.count = count
+        self.window = window
+        self.times = [None] * count
+        self.index = 0
+
+    def add(self, timestamp):
+        """Adds a state change, and returns True if the sensor is flapping."""
+        times = self.times
+        times[self.index] = timestamp
+        self.index = (self.index + 1) % self.count
+        oldest = times[self.index]
+        return oldest is not None and timestamp - oldest <= self.window
+
 
 class SensorMonitor:
-    def __init__(self, app, entity_name, friendly_name, check_interval, same_val_check_enabled=True):
+    def __init__(self, app, entity_name, friendly_name, check_interval, same_val_check_enabled=True, group=None, cadence=None, listen=True):
         """
         Monitors a specific sensor entity for availability and value changes.
 
@@ -11,35 +381,220 @@ class SensorMonitor:
             friendly_name (str): A human-readable name for the sensor.
             check_interval (int): Time in seconds to check for changes or availability.
             same_val_check_enabled (bool): Whether to monitor for unchanged values.
+            group (str): Group the sensor's findings are reported under in digests.
+            cadence (CadenceEstimator): Learns the interval between value changes, None to always use check_interval.
+            listen (bool): Whether to listen to the entity's state, False when the app passes state changes on.
         """
         self.app = app
         self.entity_name = entity_name
         self.friendly_name = friendly_name
         self.check_interval = check_interval
         self.same_val_check_enabled = same_val_check_enabled
+        self.group = group
         self.unavailable = False
-        self.unavailable_timer = None
+        self.stale = False
         self.unavailable_check_interval=30*60
         self.previous_value = None
-        self.same_val_timer = None
+        self.cadence = cadence
+        self.last_change = None
+        self.stale_after = check_interval
+        # Deadlines of the "unavailable" and "stale" checks in the app's scheduler
+        self.deadlines = {}
+        self.queued = {}
+        self.discovered = False
+        self.current_value = None
+        self.stuck = None
+        self.flap = None
+        self.flapping = False
 
         # Listen for state changes of the entity
-        self.app.listen_state(self.on_entity_changed, self.entity_name)
+        self.listen_handle = self.app.listen_state(self.on_entity_changed, self.entity_name) if listen else None
+
+        # If enabled, set a deadline to monitor for unchanged values
+        if self.same_val_check_enabled:
+            self.schedule_stale_check()
+
+    def stale_interval(self):
+        """
+        Returns the seconds without a value change after which the sensor is reported.
+
+        Once enough intervals are learned this is a multiple of their quantile, capped
+        by check_interval; until then it is check_interval.
+        """
+        cadence = self.cadence
+        app = self.app
+        if cadence is None or cadence.count < app.cadence_min_samples:
+            return self.check_interval
+        learned = app.cadence_multiple * cadence.value()
+        return int(min(self.check_interval, max(app.cadence_min_interval, learned)))
 
-        # If enabled, set a timer to monitor for unchanged values
+    def schedule_stale_check(self):
+        """Sets the deadline of the unchanged value check."""
+        self.stale_after = self.stale_interval()
+        self.app.scheduler.schedule(self, "stale", self.app.get_now_ts() + self.stale_after)
+
+    def seed(self, state, now):
+        """
+        Starts from the state the entity is in when it is discovered, instead of waiting for its first change.
+
+        The unchanged value deadline counts from the entity's last_changed, so a sensor
+        that was already frozen when it was discovered is not given a whole new interval.
+
+        Args:
+            state (dict): The state of the entity from get_state or a state_changed event.
+            now (float): The current timestamp.
+        """
+        value = state.get("state")
+        self.current_value = value
+        if value and value.lower() in ["unknown", "unavailable"]:
+            self.app.scheduler.schedule(self, "unavailable", now + self.unavailable_check_interval)
+            return
+        self.previous_value = value
+        try:
+            changed = min(datetime.fromisoformat(state["last_changed"]).timestamp(), now)
+        except (KeyError, TypeError, ValueError):
+            return
+        if self.cadence is not None:
+            self.last_change = changed
         if self.same_val_check_enabled:
-            self.same_val_timer = self.app.run_in(self.on_sensor_stays_same, self.check_interval)
+            self.app.scheduler.schedule(self, "stale", max(changed + self.stale_after, now))
+
+    def configure_detectors(self, stuck_detection="exact",  stuck_tolerance=0.0, flap_count=0, flap_window=300):
+        """
+        Sets up the stuck value and flapping detectors, keeping their state if their options did not change.
+
+        Args:
+            stuck_detection (str): "exact" to report a value that did not change at all, or
+                "epsilon", "range" or "variance" to report a value that did not move more than stuck_tolerance.
+            stuck_tolerance (float): The movement that counts as a change.
+            flap_count (int): Number of state changes within flap_window that make the sensor flapping, 0 to disable.
+            flap_window (int): Seconds for flap_count.
+        """
+        if stuck_detection == "exact":
+            self.stuck = None
+        elif self.stuck is None or (self.stuck.mode, self.stuck.tolerance) != (stuck_detection, float(stuck_tolerance)):
+            self.stuck = StuckDetector(stuck_detection, stuck_tolerance)
+        if not flap_count:
+            self.flap = None
+            self.app.scheduler.cancel(self, "flapping")
+            self.flapping = False
+        elif self.flap is None or (self.flap.count, self.flap.window) != (flap_count, flap_window):
+            self.flap = FlapDetector(int(flap_count), flap_window)
+
+    def reconfigure(self, app, friendly_name, check_interval, same_val_check_enabled, group, cadence, listen):
+        """
+        Takes over the options of a reloaded configuration, keeping the time elapsed since the last change.
+
+        Args:
+            app: The new instance of the parent AppDaemon app.
+            friendly_name (str): A human-readable name for the sensor.
+            check_interval (int): Time in seconds to check for changes or availability.
+            same_val_check_enabled (bool): Whether to monitor for unchanged values.
+            group (str): Group the sensor's findings are reported under in digests.
+            cadence (CadenceEstimator): The cadence estimate to keep using, or None.
+            listen (bool): Whether to listen to the entity's state.
+
+        Returns:
+            bool: True if an option of the monitor changed.
+        """
+        changed = (friendly_name, check_interval, same_val_check_enabled, group, cadence is None) != \
+            (self.friendly_name, self.check_interval, self.same_val_check_enabled, self.group, self.cadence is None)
+        self.app = app
+        self.friendly_name = friendly_name
+        self.group = group
+        self.cadence = cadence
+        # AppDaemon cancels the state listeners of a terminated app
+        self.listen_handle = app.listen_state(self.on_entity_changed, self.entity_name) if listen else None
+
+        if (check_interval, same_val_check_enabled) != (self.check_interval, self.same_val_check_enabled):
+            deadline = self.deadlines.get("stale")
+            started = deadline - self.stale_after if deadline is not None else app.get_now_ts()
+            self.check_interval = check_interval
+            self.same_val_check_enabled = same_val_check_enabled
+            if same_val_check_enabled:
+                self.stale_after = self.stale_interval()
+                app.scheduler.schedule(self, "stale", started + self.stale_after)
+            else:
+                app.scheduler.cancel(self, "stale")
+        return changed
+
+    def stop(self):
+        """Stops monitoring, when the entity is removed."""
+        if self.listen_handle is not None:
+            self.app.cancel_listen_state(self.listen_handle)
+            self.listen_handle = None
+        self.app.scheduler.cancel(self, "unavailable")
+        self.app.scheduler.cancel(self, "stale")
+        self.app.scheduler.cancel(self, "flapping")
+
+    def snapshot(self):
+        """Returns the state to restore after a restart: [value, last change, unavailable deadline, stale deadline, unavailable, stale]."""
+        deadlines = self.deadlines
+        return [self.previous_value, self.last_change, deadlines.get("unavailable"), deadlines.get("stale"), self.unavailable, self.stale]
+
+    def restore(self, snapshot, current, now):
+        """
+        Continues from the state saved before a restart.
+
+        Deadlines keep their remaining time as long as the sensor is in the same
+        state as when the snapshot was taken; a sensor that changed while AppDaemon
+        was down starts over like a fresh state change.
+
+        Args:
+            snapshot (list): The state returned by snapshot.
+            current (str): The current state of the sensor.
+            now (float): The current timestamp.
+        """
+        value, last_change, unavailable_deadline, stale_deadline, unavailable, stale = snapshot
+        scheduler = self.app.scheduler
+        self.current_value = current
+        is_unavailable = bool(current) and current.lower() in ["unknown", "unavailable"]
+        if is_unavailable:
+            self.unavailable = unavailable
+            if unavailable_deadline is not None:
+                scheduler.schedule(self, "unavailable", unavailable_deadline)
+            elif not unavailable:
+                scheduler.schedule(self, "unavailable", now + self.unavailable_check_interval)
+        elif unavailable:
+            self.unavailable = True
+            self.on_entity_changed(self.entity_name, "state", None, current, {})
+            return
+
+        if current is None or current == value or is_unavailable:
+            # Unchanged since the snapshot, so the countdown continues
+            self.previous_value = value
+            self.last_change = last_change
+            self.stale = stale
+            if self.same_val_check_enabled and stale_deadline is not None:
+                self.stale_after = self.stale_interval()
+                scheduler.schedule(self, "stale", min(stale_deadline, now + self.stale_after))
+        elif self.same_val_check_enabled:
+            self.previous_value = current
+            self.stale = False
+            if stale:
+                self.app.report(self, "stale", recovered=True)
+            self.schedule_stale_check()
 
     def on_entity_changed(self, entity, attribute, old, new, kwargs):
         """Handles changes in the sensor's state."""
+        scheduler = self.app.scheduler
+        self.current_value = new
         if new and new.lower() in ["unknown", "unavailable"]:
-            if not self.unavailable_timer:
-                self.unavailable_timer = self.app.run_in(self.notify_unavailable, self.unavailable_check_interval)
+            if not scheduler.pending(self, "unavailable"):
+                scheduler.schedule(self, "unavailable", self.app.get_now_ts() + self.unavailable_check_interval)
+            # The interval spanning an outage says nothing about the sensor's cadence
+            self.last_change = None
         else:
-            # Reset the "unavailable" state timer if the sensor becomes available
-            if self.unavailable_timer:
-                self.app.cancel_timer(self.unavailable_timer)
-                self.unavailable_timer = None
+            # Reset the "unavailable" deadline if the sensor becomes available
+            scheduler.cancel(self, "unavailable")
+            if self.unavailable:
+                self.unavailable = False
+                self.app.report(self, "unavailable", recovered=True)
+            # Every state change counts, unless a stuck detector tolerates small ones
+            changed = self.stuck is None or self.stuck.add(new)
+            if self.stale and changed and new != self.previous_value:
+                self.stale = False
+                self.app.report(self, "stale", recovered=True)
         #     if not self.unavailable:
         #         self.unavailable = True
         #         self.app.call_service(
@@ -54,39 +609,59 @@ class SensorMonitor:
         #             message=f"{self.friendly_name} sensor is back online."
         #         )
 
+            now = self.app.get_now_ts()
+            if self.cadence is not None and changed and new != self.previous_value:
+                if self.last_change is not None:
+                    self.cadence.add(now - self.last_change)
+                self.last_change = now
+
+            if self.flap is not None and old is not None and new != old and self.flap.add(now):
+                if not self.flapping:
+                    self.flapping = True
+                    self.app.report(self, "flapping")
+                # Flapping ends when a whole window passes without a change
+                scheduler.schedule(self, "flapping", now + self.flap.window)
+
             # Reset value change monitoring if enabled
-            if self.same_val_check_enabled:
-                if self.same_val_timer:
-                    self.app.cancel_timer(self.same_val_timer)
+            if self.same_val_check_enabled and changed:
                 self.previous_value = new
-                self.same_val_timer = self.app.run_in(self.on_sensor_stays_same, self.check_interval)
+                self.schedule_stale_check()
 
 
     def notify_unavailable(self, kwargs):
-        """Sends a notification if the sensor remains unavailable."""
+        """Reports the sensor if it remains unavailable."""
         self.app.log(f"Sensor {self.friendly_name} is still unavailable after {self.unavailable_check_interval} seconds.")
-        message=f"{self.friendly_name} sensor is unavailable for {self.unavailable_check_interval // 60} minutes."
-        escaped_msg = self.escape_markdown_v2(message)
-        self.app.call_service(self.app.notification_service, escaped_msg)
-        self.unavailable_timer = None  # Reset the timer
+        self.unavailable = True
+        self.app.report(self, "unavailable")
+
 
+    def on_flapping_ended(self, kwargs):
+        """Reports the sensor when it stopped flapping."""
+        if self.flapping:
+            self.flapping = False
+            self.app.report(self, "flapping", recovered=True)
 
     def on_sensor_stays_same(self, kwargs):
         """Handles cases where the sensor value does not change over the interval."""
-        current_value = self.app.get_state(self.entity_name)
-        if current_value == self.previous_value:
-            self.unavailable = True
-            interval_minutes = convert_to_minutes(self.check_interval)
-            message=f"{self.friendly_name} sensor value has not changed for {interval_minutes} minutes."
-            escaped_msg = self.escape_markdown_v2(message)
-            self.app.call_service(self.app.notification_service, escaped_msg)
+        # The state is tracked by on_entity_changed, it is only read for a sensor that has not reported since startup
+        if self.current_value is None:
+            self.current_value = self.app.get_state(self.entity_name)
+        current_value = self.current_value
+        if self.stuck is not None and current_value and current_value.lower() not in ["unknown", "unavailable"]:
+            # No movement beyond the tolerance, or the deadline would have been moved
+            stuck = True
+        else:
+            stuck = current_value == self.previous_value
+        if stuck:
+            self.stale = True
+            self.app.report(self, "stale")
         else:
-            self.unavailable = False
+            self.stale = False
             self.previous_value = current_value
 
         # Reschedule the same value check if still enabled
         if self.same_val_check_enabled:
-            self.same_val_timer = self.app.run_in(self.on_sensor_stays_same, self.check_interval)
+            self.schedule_stale_check()
 
 def convert_to_minutes(seconds):
     interval_minutes = seconds // 60  # Convert seconds to minutes
@@ -100,9 +675,60 @@ class SensorUnavailable(hass.Hass):
         """
         self.entities_to_watch = {}
         
+        # After a configuration reload the monitors of the previous instance are reconciled with the new configuration
+        previous = take_reloading_app(self.name, time.monotonic())
+        self.handover = dict(previous.entities_to_watch) if previous is not None else {}
+        self.reconfigured = 0
+
         # Get notification service from config
         self.notification_service = self.args.get("notification_service", "notify/soulphone")
 
+        # All unavailable/unchanged value deadlines are kept in one scheduler, checked every tick_interval seconds
+        self.tick_interval = int(self.args.get("tick_interval", 10))
+        self.scheduler = previous.scheduler if previous is not None else DeadlineScheduler()
+
+        # Findings are collected for correlation_window seconds and sent as one digest per group
+        self.correlation_window = int(self.args.get("correlation_window", 60))
+        self.groups = self.args.get("groups", {})
+        # Sensors without a configured group are grouped by their integration, area or device, read from the registries
+        self.group_by = self.args.get("group_by", "integration")
+        if self.group_by not in GROUP_TEMPLATES and self.group_by != "prefix":
+            self.log(f"Unknown group_by {self.group_by}, grouping by entity ID prefix", level="ERROR")
+            self.group_by = "prefix"
+        self.registry_groups = {}
+        self.findings = dict(previous.findings) if previous is not None else {}
+        self.findings_since = previous.findings_since if previous is not None else None
+
+        # Runtime files are kept in data_dir, AppDaemon's configuration directory by default
+        self.data_dir = self.args.get("data_dir") or getattr(self, "config_dir", None) or os.path.dirname(os.path.abspath(__file__))
+
+        # Unchanged value deadlines can be learned from each sensor's cadence, with check_interval as the upper bound
+        self.adaptive_staleness = self.args.get("adaptive_staleness", False)
+        self.cadence_quantile = float(self.args.get("cadence_quantile", 0.95))
+        self.cadence_multiple = float(self.args.get("cadence_multiple", 3))
+        self.cadence_min_samples = int(self.args.get("cadence_min_samples", 20))
+        self.cadence_min_interval = int(self.args.get("cadence_min_interval", 600))
+        self.cadence_file = self.data_file("cadence_file", "sensor_cadence.json")
+        self.cadence_states = self.load_cadence_states() if previous is None else {}
+
+        # Monitor state is saved every snapshot_interval seconds and restored on startup
+        self.snapshot_file = self.data_file("snapshot_file", "sensor_snapshot.json")
+        self.snapshot_interval = int(self.args.get("snapshot_interval", 300))
+
+        # Entities can also be selected by include/exclude rules instead of being listed under sensors
+        discover = self.args.get("discover") or {}
+        self.include_rules = [DiscoveryRule(rule) for rule in discover.get("include", [])]
+        self.exclude_rules = [DiscoveryRule(rule) for rule in discover.get("exclude", [])]
+        self.discovery_interval = int(discover.get("interval", 3600))
+        # With discovery one state_changed listener passes state changes on to all monitors
+        self.dispatch_events = bool(self.include_rules)
+
+        start = time.perf_counter()
+        # Unchanged discover rules keep the discovered monitors, so the entities need not be read again
+        rediscover = self.dispatch_events and (previous is None or previous.args.get("discover") != self.args.get("discover"))
+        restore = self.snapshot_file and previous is None
+        states = self.get_state() if rediscover or restore else None
+
         # Add sensors to monitor from configuration
         sensors_config = self.args.get("sensors", {})
         
@@ -117,14 +743,296 @@ class SensorUnavailable(hass.Hass):
                     entity_id, 
                     friendly_name, 
                     check_interval=check_interval,
-                    same_val_check_enabled=same_val_check
+                    same_val_check_enabled=same_val_check,
+                    group=config.get("group"),
+                    adaptive=config.get("adaptive_staleness", self.adaptive_staleness),
+                    detectors={option: config[option] for option in DETECTOR_OPTIONS if option in config}
                 )
 
+        discovered = 0
+        if self.dispatch_events:
+            if rediscover:
+                discovered = self.discover_entities(states or {})
+            else:
+                for entity_id, monitor in list(self.handover.items()):
+                    if monitor.discovered:
+                        self.handover.pop(entity_id)
+                        monitor.reconfigure(self, monitor.friendly_name, monitor.check_interval, monitor.same_val_check_enabled,
+                                            monitor.group, monitor.cadence, listen=False)
+                        self.entities_to_watch[entity_id] = monitor
+                        discovered += 1
+            self.listen_event(self.on_state_changed, "state_changed")
+            if self.discovery_interval > 0:
+                self.run_every(self.rescan_entities, f"now+{self.discovery_interval}", self.discovery_interval)
+
+        # Monitors of the previous instance that are no longer configured
+        removed = len(self.handover)
+        for entity_id in list(self.handover):
+            self.entities_to_watch[entity_id] = self.handover[entity_id]
+            self.remove_monitor(entity_id)
+        self.handover = {}
+
+        if restore:
+            self.restore_snapshot(states)
+
+        self.run_every(self.on_tick, "now", self.tick_interval)
+        if self.cadence_file:
+            self.run_every(self.save_cadence_states, "now+3600", 3600)
+        if self.snapshot_file:
+            self.run_every(self.save_snapshot, f"now+{self.snapshot_interval}", self.snapshot_interval)
+
+        if previous is not None:
+            added = len(self.entities_to_watch) - (len(previous.entities_to_watch) - removed)
+            self.log(f"Configuration reloaded in {(time.perf_counter() - start) * 1000:.0f} ms: {added} sensors added, "
+                     f"{self.reconfigured} changed, {removed} removed, {len(self.entities_to_watch)} monitored")
+            return
+
         # Log the sensors being monitored
-        self.log("Monitoring started for the following sensors:")
+        self.log(f"Monitoring started for {len(self.entities_to_watch)} sensors ({discovered} discovered) in {(time.perf_counter() - start) * 1000:.0f} ms:")
         for entity_name, monitor in self.entities_to_watch.items():
+            if monitor.discovered:
+                continue
             interval_minutes = convert_to_minutes(monitor.check_interval)
-            self.log(f"- {entity_name} ({monitor.friendly_name}): Check interval {interval_minutes} minutes")
+            if monitor.stale_after < monitor.check_interval:
+                self.log(f"- {entity_name} ({monitor.friendly_name}): Check interval {interval_minutes} minutes, learned {convert_to_minutes(monitor.stale_after)} minutes")
+            else:
+                self.log(f"- {entity_name} ({monitor.friendly_name}): Check interval {interval_minutes} minutes")
+
+    def discovery_config(self, entity_id, attributes):
+        """Returns the options of the first include rule selecting the entity, or None if it is not selected or excluded."""
+        for rule in self.exclude_rules:
+            if rule.matches(entity_id, attributes):
+                return None
+        for rule in self.include_rules:
+            if rule.matches(entity_id, attributes):
+                return rule.options
+        return None
+
+    def discover_entities(self, states):
+        """
+        Creates monitors for the entities selected by the discover rules.
+
+        Args:
+            states (dict): All states, as returned by get_state().
+
+        Returns:
+            int: The number of monitors created.
+        """
+        index = StateIndex(states)
+        excluded = set()
+        for rule in self.exclude_rules:
+            excluded.update(rule.resolve(index))
+        created = 0
+        for rule in self.include_rules:
+            for entity_id in rule.resolve(index):
+                if entity_id in excluded or entity_id in self.entities_to_watch:
+                    continue
+                self.add_discovered_monitor(entity_id, states[entity_id], rule.options)
+                created += 1
+        return created
+
+    def add_discovered_monitor(self, entity_id, state, config):
+        """Creates the monitor of a discovered entity, starting from its current state."""
+        attributes = state.get("attributes") or {}
+        handed_over = entity_id in self.handover
+        monitor = self.create_sensor_monitor(
+            entity_id,
+            attributes.get("friendly_name", entity_id),
+            check_interval=config.get("check_interval", 6 * 60 * 60),
+            same_val_check_enabled=config.get("same_val_check_enabled", True),
+            group=config.get("group"),
+            adaptive=config.get("adaptive_staleness", self.adaptive_staleness),
+            detectors={option: config[option] for option in DETECTOR_OPTIONS if option in config}
+        )
+        monitor.discovered = True
+        if not handed_over:
+            monitor.seed(state, self.get_now_ts())
+        return monitor
+
+    def remove_monitor(self, entity_id):
+        """Stops and drops the monitor of an entity."""
+        monitor = self.entities_to_watch.pop(entity_id, None)
+        if monitor is None:
+            return
+        if monitor.app is not self:
+            # Handed over by the terminated instance, whose listeners AppDaemon has already cancelled
+            monitor.listen_handle = None
+        monitor.stop()
+        for kind in ("unavailable", "stale", "flapping"):
+            self.findings.pop((entity_id, kind), None)
+        if not self.findings:
+            self.findings_since = None
+
+    def rescan_entities(self, kwargs):
+        """Reconciles the discovered monitors with the current entities, in case a state_changed event was missed."""
+        # Areas and devices may have been renamed or reassigned since they were read
+        self.registry_groups = {}
+        states = self.get_state() or {}
+        for entity_id, monitor in list(self.entities_to_watch.items()):
+            if monitor.discovered and (entity_id not in states or self.discovery_config(entity_id, states[entity_id].get("attributes") or {}) is None):
+                self.log(f"Stopped monitoring {entity_id}")
+                self.remove_monitor(entity_id)
+        added = self.discover_entities(states)
+        if added:
+            self.log(f"Discovered {added} new sensors")
+
+    def on_state_changed(self, event_name, data, kwargs):
+        """Passes state changes on to the monitors, and adds or removes monitors as entities appear and disappear."""
+        entity_id = data.get("entity_id")
+        new_state = data.get("new_state")
+        old_state = data.get("old_state")
+        monitor = self.entities_to_watch.get(entity_id)
+        if new_state is None:
+            # The entity was removed
+            if monitor is not None and monitor.discovered:
+                self.log(f"Stopped monitoring removed entity {entity_id}")
+                self.remove_monitor(entity_id)
+            return
+        new = new_state.get("state")
+        old = old_state.get("state") if old_state else None
+        if monitor is None:
+            if old_state is not None:
+                return
+            config = self.discovery_config(entity_id, new_state.get("attributes") or {})
+            if config is None:
+                return
+            self.log(f"Discovered new entity {entity_id}")
+            monitor = self.add_discovered_monitor(entity_id, new_state, config)
+        if monitor.listen_handle is None and new != old:
+            monitor.on_entity_changed(entity_id, "state", old, new, {})
+
+    def on_tick(self, kwargs):
+        """Runs the checks whose deadline has passed."""
+        if RELOADING_APPS:
+            drop_stale_reloads(time.monotonic())
+        for monitor, kind in self.scheduler.pop_due(self.get_now_ts()):
+            try:
+                if kind == "unavailable":
+                    monitor.notify_unavailable({})
+                elif kind == "flapping":
+                    monitor.on_flapping_ended({})
+                else:
+                    monitor.on_sensor_stays_same({})
+            except Exception as e:
+                # One failing check must not drop the other due checks
+                self.log(f"Error in {kind} check of {monitor.entity_name}: {e}", level="ERROR")
+
+        if self.findings and self.get_now_ts() - self.findings_since >= self.correlation_window:
+            self.send_digest()
+
+    def report(self, monitor, kind, recovered=False):
+        """
+        Adds a finding to the digest of the current correlation window.
+
+        Args:
+            monitor (SensorMonitor): The monitor of the sensor.
+            kind (str): "unavailable", "stale" or "flapping".
+            recovered (bool): Whether the sensor recovered from an earlier finding of this kind.
+        """
+        key = (monitor.entity_name, kind)
+        if recovered and key in self.findings and not self.findings[key][1]:
+            # The alert has not been sent yet, so neither is the recovery
+            del self.findings[key]
+            return
+        if not self.findings:
+            self.findings_since = self.get_now_ts()
+        self.findings[key] = (monitor, recovered)
+
+    def configured_group(self, monitor):
+        """Returns the group option of a sensor or the first matching pattern of groups, or None."""
+        if monitor.group:
+            return monitor.group
+        for group, patterns in self.groups.items():
+            if any(fnmatch.fnmatch(monitor.entity_name, pattern) for pattern in patterns):
+                return group
+        return None
+
+    def group_of(self, monitor):
+        """Returns the group of a sensor: its configured group, its group_by name from the registries, or its entity id prefix."""
+        return (self.configured_group(monitor) or self.registry_groups.get(monitor.entity_name)
+                or monitor.entity_name.split(".", 1)[-1].split("_", 1)[0])
+
+    def lookup_groups(self, entity_ids):
+        """
+        Reads the group_by name of the entities from the Home Assistant registries with one template.
+
+        Entities without one, or all of them if the template fails, are cached as None,
+        so they fall back to the entity id prefix until the next rescan.
+        """
+        template = ("{% set ns = namespace(names=[]) %}{% for entity in " + json.dumps(entity_ids) + " %}"
+                    "{% set ns.names = ns.names + [(" + GROUP_TEMPLATES[self.group_by] + ") or ''] %}"
+                    "{% endfor %}{{ ns.names | tojson }}")
+        names = []
+        try:
+            names = self.render_template(template)
+            if isinstance(names, str):
+                names = json.loads(names)
+        except Exception as e:
+            self.log(f"Could not read the {self.group_by} of {len(entity_ids)} sensors, grouping by entity ID prefix: {e}", level="WARNING")
+        for index, entity_id in enumerate(entity_ids):
+            name = names[index] if isinstance(names, list) and index < len(names) else None
+            self.registry_groups[entity_id] = name or None
+
+    def send_digest(self):
+        """Sends the findings of the correlation window, one notification per group."""
+        findings = self.findings
+        self.findings = {}
+        self.findings_since = None
+
+        if self.group_by != "prefix":
+            unknown = {monitor.entity_name for monitor, _ in findings.values()
+                       if monitor.entity_name not in self.registry_groups and self.configured_group(monitor) is None}
+            if unknown:
+                self.lookup_groups(sorted(unknown))
+
+        sections = {}
+        for (_, kind), (monitor, recovered) in findings.items():
+            sections.setdefault(self.group_of(monitor), {}).setdefault((kind, recovered), []).append(monitor)
+
+        self.log(f"Sending digest of {len(findings)} findings in {len(sections)} groups")
+        for group in sorted(sections):
+            section = sections[group]
+            if sum(len(monitors) for monitors in section.values()) == 1:
+                [((kind, recovered), [monitor])] = section.items()
+                message = self.finding_message(monitor, kind, recovered)
+            else:
+                message = "\n".join(f"{group}: {self.digest_line(monitors, kind, recovered)}" for (kind, recovered), monitors in sorted(section.items()))
+            self.call_service(self.notification_service, message=self.escape_markdown_v2(message))
+
+    def finding_message(self, monitor, kind, recovered):
+        """Returns the notification text of a single finding."""
+        if kind == "unavailable":
+            if recovered:
+                return f"{monitor.friendly_name} sensor is back online."
+            return f"{monitor.friendly_name} sensor is unavailable for {monitor.unavailable_check_interval // 60} minutes."
+        if kind == "flapping":
+            if recovered:
+                return f"{monitor.friendly_name} sensor stopped flapping."
+            return f"{monitor.friendly_name} sensor is flapping: {monitor.flap.count} changes within {convert_to_minutes(monitor.flap.window)} minutes."
+        if recovered:
+            return f"{monitor.friendly_name} sensor value is changing again."
+        if monitor.stuck is not None:
+            return f"{monitor.friendly_name} sensor value has not moved more than {monitor.stuck.tolerance:g} for {convert_to_minutes(monitor.stale_after)} minutes."
+        return f"{monitor.friendly_name} sensor value has not changed for {convert_to_minutes(monitor.stale_after)} minutes."
+
+    def digest_line(self, monitors, kind, recovered):
+        """Returns the digest line of the sensors of a group with the same finding."""
+        if len(monitors) == 1:
+            return self.finding_message(monitors[0], kind, recovered)
+        if kind == "stale" and not recovered:
+            names = [f"{monitor.friendly_name} ({convert_to_minutes(monitor.stale_after)} min)" for monitor in monitors]
+        else:
+            names = [monitor.friendly_name for monitor in monitors]
+        listed = ", ".join(names[:DIGEST_MAX_NAMES])
+        if len(names) > DIGEST_MAX_NAMES:
+            listed += f" and {len(names) - DIGEST_MAX_NAMES} more"
+        if kind == "unavailable":
+            state = "are back online" if recovered else f"are unavailable for {monitors[0].unavailable_check_interval // 60} minutes"
+        elif kind == "flapping":
+            state = "stopped flapping" if recovered else "are flapping"
+        else:
+            state = "are changing again" if recovered else "have not changed"
+        return f"{len(monitors)} sensors {state}: {listed}"
 
     def escape_markdown_v2(self, text):
         """
@@ -134,7 +1042,7 @@ class SensorUnavailable(hass.Hass):
         escape_chars = r"_*[]()~`>#+-=|{}.!"
         return ''.join(['\\' + c if c in escape_chars else c for c in text])
 
-    def create_sensor_monitor(self, entity_name, friendly_name, check_interval=6*60*60, same_val_check_enabled=True):
+    def create_sensor_monitor(self, entity_name, friendly_name, check_interval=6*60*60, same_val_check_enabled=True, group=None, adaptive=False, detectors=None):
         """
         Creates a monitor for a given sensor entity.
 
@@ -143,8 +1051,122 @@ class SensorUnavailable(hass.Hass):
             friendly_name (str): A human-readable name for the sensor.
             check_interval (int): Interval to check for unchanged values.
             same_val_check_enabled (bool): Whether to enable unchanged value monitoring.
-            entity_prefix (str): The prefix to prepend to the entity ID.
+            group (str): Group of the sensor in digest notifications.
+            adaptive (bool): Whether to learn the unchanged value deadline from the sensor's cadence.
+            detectors (dict): Stuck value and flapping detection options, see SensorMonitor.configure_detectors.
         """
         full_entity_name = f"{entity_name}"
-        monitor = SensorMonitor(self, full_entity_name, friendly_name, check_interval, same_val_check_enabled)
+        monitor = self.handover.pop(full_entity_name, None)
+        if monitor is not None:
+            # Handed over by the instance before a configuration reload
+            cadence = (monitor.cadence or CadenceEstimator(self.cadence_quantile)) if adaptive else None
+            if monitor.reconfigure(self, friendly_name, check_interval, same_val_check_enabled, group, cadence, listen=not self.dispatch_events):
+                self.reconfigured += 1
+            monitor.discovered = False
+        else:
+            cadence = None
+            if adaptive:
+                cadence = CadenceEstimator(self.cadence_quantile, self.cadence_states.get(full_entity_name))
+            monitor = SensorMonitor(self, full_entity_name, friendly_name, check_interval, same_val_check_enabled, group, cadence,
+                                    listen=not self.dispatch_events)
+        try:
+            monitor.configure_detectors(**(detectors or {}))
+        except ValueError as e:
+            self.log(f"Invalid detection options of {full_entity_name}, using exact comparison: {e}", level="ERROR")
         self.entities_to_watch[full_entity_name] = monitor
+        return monitor
+
+    def data_file(self, option, default):
+        """Returns the path of a runtime file: the option or default, relative to data_dir; empty if disabled."""
+        name = self.args.get(option, default)
+        return os.path.join(self.data_dir, name) if name else ""
+
+    def load_cadence_states(self):
+        """Returns the cadence estimates saved by a previous run, by entity ID."""
+        if not self.cadence_file or not os.path.exists(self.cadence_file):
+            return {}
+        try:
+            with open(self.cadence_file) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.log(f"Could not load the sensor cadences from {self.cadence_file}: {e}", level="WARNING")
+            return {}
+
+    def save_cadence_states(self, kwargs):
+        """Saves the cadence estimates, so they survive restarts."""
+        try:
+            states = {
+                entity_name: monitor.cadence.to_dict()
+                for entity_name, monitor in self.entities_to_watch.items()
+                if monitor.cadence is not None and monitor.cadence.count
+            }
+            temporary = f"{self.cadence_file}.tmp"
+            with open(temporary, "w") as f:
+                json.dump(states, f)
+            os.replace(temporary, self.cadence_file)
+        except Exception as e:
+            self.log(f"Error saving the sensor cadences: {e}", level="ERROR")
+
+    def save_snapshot(self, kwargs):
+        """Saves the state of all monitors, to be restored by the next start."""
+        try:
+            snapshot = {
+                "saved": self.get_now_ts(),
+                "monitors": {entity_name: monitor.snapshot() for entity_name, monitor in self.entities_to_watch.items()},
+            }
+            temporary = f"{self.snapshot_file}.tmp"
+            with open(temporary, "w") as f:
+                # dumps uses the C encoder, dump writes through the much slower pure Python one
+                f.write(json.dumps(snapshot, separators=(",", ":")))
+            os.replace(temporary, self.snapshot_file)
+        except Exception as e:
+            self.log(f"Error saving the monitor snapshot: {e}", level="ERROR")
+
+    def restore_snapshot(self, states=None):
+        """
+        Restores the monitors saved by the previous run, with the remaining time of their deadlines.
+
+        Args:
+            states (dict): All states, as returned by get_state(), read here if not given.
+        """
+        if not os.path.exists(self.snapshot_file):
+            return
+        start = time.perf_counter()
+        try:
+            with open(self.snapshot_file) as f:
+                saved = json.load(f)["monitors"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.log(f"Could not load the monitor snapshot from {self.snapshot_file}: {e}", level="WARNING")
+            return
+
+        # One bulk read of all states instead of a get_state call per sensor
+        if states is None:
+            states = self.get_state()
+        states = states or {}
+        now = self.get_now_ts()
+        restored = 0
+        for entity_name, monitor in self.entities_to_watch.items():
+            snapshot = saved.get(entity_name)
+            if snapshot is None:
+                continue
+            current = states.get(entity_name, {}).get("state")
+            try:
+                monitor.restore(snapshot, current, now)
+                restored += 1
+            except Exception as e:
+                self.log(f"Could not restore the monitor of {entity_name}: {e}", level="WARNING")
+        self.log(f"Restored {restored} monitors from the snapshot in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def terminate(self):
+        """
+        Saves the cadence estimates and the monitor snapshot when the app is terminated.
+
+        The monitors are also handed over to the next instance of the app, so a
+        configuration reload only changes what changed in the configuration. If
+        AppDaemon reloads the module instead, the next instance restores the snapshot.
+        """
+        if self.cadence_file:
+            self.save_cadence_states({})
+        if self.snapshot_file:
+            self.save_snapshot({})
+        RELOADING_APPS[self.name] = (time.monotonic(), self)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# test_sensor_unavailable.py - Tests for the building blocks of sensor_unavailable.py
+# This file is NOT an AppDaemon app and should NOT be loaded by AppDaemon
+#
+# Usage:
+#   python -m pytest test_sensor_unavailable.py
+
+import json
+import math
+import os
+import random
+from datetime import datetime, timezone
+import sys
+import types
+
+# sensor_unavailable.py imports hassapi; the classes tested here do not use it
+sys.modules.setdefault("hassapi", types.SimpleNamespace(Hass=object))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sensor_unavailable import (RELOAD_TIMEOUT, RELOADING_APPS, CadenceEstimator, DeadlineScheduler, FlapDetector,
+                                SensorMonitor, SensorUnavailable, StuckDetector, take_reloading_app)
+
+
+class Monitor:
+    """The scheduler state of a SensorMonitor."""
+
+    def __init__(self):
+        self.deadlines = {}
+        self.queued = {}
+
+
+def test_scheduler_reschedule_later():
+    scheduler = DeadlineScheduler()
+    monitor = Monitor()
+    scheduler.schedule(monitor, "stale", 100)
+    scheduler.schedule(monitor, "stale", 200)
+    # Moving a deadline later keeps the queued entry
+    assert len(scheduler) == 1
+    assert scheduler.pop_due(150) == []
+    assert scheduler.pending(monitor, "stale")
+    assert scheduler.pop_due(199) == []
+    assert scheduler.pop_due(200) == [(monitor, "stale")]
+    assert not scheduler.pending(monitor, "stale")
+    assert len(scheduler) == 0
+
+
+def test_scheduler_reschedule_earlier():
+    scheduler = DeadlineScheduler()
+    monitor = Monitor()
+    scheduler.schedule(monitor, "unavailable", 200)
+    scheduler.schedule(monitor, "unavailable", 100)
+    assert len(scheduler) == 2
+    assert scheduler.pop_due(100) == [(monitor, "unavailable")]
+    # The superseded entry does not fire again
+    assert scheduler.pop_due(300) == []
+    assert len(scheduler) == 0
+
+
+def test_scheduler_cancel():
+    scheduler = DeadlineScheduler()
+    first, second = Monitor(), Monitor()
+    scheduler.schedule(first, "stale", 100)
+    scheduler.schedule(second, "stale", 100)
+    scheduler.schedule(first, "unavailable", 100)
+    scheduler.cancel(first, "stale")
+    assert not scheduler.pending(first, "stale")
+    assert sorted(kind for _, kind in scheduler.pop_due(100)) == ["stale", "unavailable"]
+    # A cancelled check can be scheduled again
+    scheduler.schedule(first, "stale", 150)
+    assert scheduler.pop_due(150) == [(first, "stale")]
+
+
+def test_cadence_quantile():
+    rng = random.Random(1)
+    for quantile in (0.5, 0.95):
+        estimator = CadenceEstimator(quantile)
+        for _ in range(20000):
+            estimator.add(rng.expovariate(1 / 60))
+        expected = -60 * math.log(1 - quantile)
+        assert abs(estimator.value() - expected) < 0.05 * expected, (quantile, estimator.value(), expected)
+
+
+def test_cadence_few_intervals_and_state():
+    estimator = CadenceEstimator(0.5)
+    assert estimator.value() is None
+    for interval in (30, 10, 20):
+        estimator.add(interval)
+    assert estimator.value() == 20
+
+    rng = random.Random(2)
+    for _ in range(1000):
+        estimator.add(rng.uniform(0, 100))
+    restored = CadenceEstimator(0.5, state=estimator.to_dict())
+    assert restored.value() == estimator.value()
+    # State saved for another quantile is not reused
+    assert CadenceEstimator(0.95, state=estimator.to_dict()).value() is None
+
+
+def test_stuck_epsilon():
+    detector = StuckDetector("epsilon", 0.5)
+    assert detector.add("10")
+    assert not detector.add("10.3")
+    assert not detector.add("9.6")
+    # Drift is measured from the last change, not from the previous value
+    assert detector.add("10.6")
+    assert not detector.add("10.2")
+
+
+def test_stuck_range():
+    detector = StuckDetector("range", 0.5)
+    assert detector.add(10)
+    assert not detector.add(10.4)
+    assert not detector.add(9.9)
+    # Maximum - minimum of the window exceeds the tolerance, though the last step is small
+    assert detector.add(9.8)
+    assert not detector.add(10.2)
+
+
+def test_stuck_variance():
+    detector = StuckDetector("variance", 1.0)
+    assert detector.add(10)
+    # A sensor toggling between close values stays stuck
+    for value in (10.5, 10, 10.5, 10, 10.5) * 20:
+        assert not detector.add(value)
+    assert detector.add(40)
+
+
+def test_stuck_non_numeric():
+    detector = StuckDetector("epsilon", 0.5)
+    assert detector.add("on")
+    assert not detector.add("on")
+    assert detector.add("off")
+    assert detector.add("10")
+
+
+def test_stuck_unknown_mode():
+    try:
+        StuckDetector("median", 1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown mode accepted")
+
+
+def test_flap_window():
+    detector = FlapDetector(3, 60)
+    assert not detector.add(0)
+    assert not detector.add(30)
+    # The third change within the window, the first one included at its edge
+    assert detector.add(60)
+    assert not detector.add(100)
+    assert not detector.add(130)
+    assert detector.add(140)
+    # Changes spread over more than the window
+    detector = FlapDetector(3, 60)
+    for timestamp in (0, 31, 62, 93, 124):
+        assert not detector.add(timestamp)
+
+
+def test_reload_handover_expires():
+    RELOADING_APPS.clear()
+    RELOADING_APPS["kept"] = (100.0, "old kept")
+    RELOADING_APPS["removed"] = (100.0, "old removed")
+    assert take_reloading_app("kept", 101.0) == "old kept"
+    assert take_reloading_app("kept", 101.0) is None
+    # An app that was removed or renamed is not kept once the timeout has passed
+    assert take_reloading_app("other", 101.0 + RELOAD_TIMEOUT) is None
+    assert not RELOADING_APPS
+
+
+class GroupingApp(SensorUnavailable):
+    """A SensorUnavailable with registry names answered by render_template."""
+
+    def __init__(self, names, group_by="integration", groups=None):
+        self.names = names
+        self.group_by = group_by
+        self.groups = groups or {}
+        self.registry_groups = {}
+        self.templates = []
+        self.logs = []
+
+    def render_template(self, template):
+        self.templates.append(template)
+        entities = json.loads(template.split(" in ", 1)[1].split(" %}", 1)[0])
+        return json.dumps([self.names.get(entity, "") for entity in entities])
+
+    def log(self, message, level="INFO"):
+        self.logs.append(message)
+
+
+def test_group_of_registry():
+    app = GroupingApp({"sensor.kitchen_temperature": "Zigbee2MQTT"}, groups={"Phases": ["sensor.phase_*"]})
+    monitors = [types.SimpleNamespace(entity_name=entity, group=group) for entity, group in
+                [("sensor.kitchen_temperature", None), ("sensor.cellar_humidity", None), ("sensor.phase_l1", None),
+                 ("sensor.outdoor_temperature", "Garden")]]
+    app.lookup_groups(["sensor.cellar_humidity", "sensor.kitchen_temperature"])
+    assert len(app.templates) == 1
+    # The configured group comes first, the entity ID prefix is the last resort
+    assert [app.group_of(monitor) for monitor in monitors] == ["Zigbee2MQTT", "cellar", "Phases", "Garden"]
+    assert app.registry_groups == {"sensor.cellar_humidity": None, "sensor.kitchen_temperature": "Zigbee2MQTT"}
+
+
+def test_group_of_without_templates():
+    app = GroupingApp({})
+    app.render_template = None
+    app.lookup_groups(["sensor.kitchen_temperature"])
+    assert app.group_of(types.SimpleNamespace(entity_name="sensor.kitchen_temperature", group=None)) == "kitchen"
+    assert len(app.logs) == 1
+
+
+def test_discovered_monitor_seeded_from_state():
+    now = datetime(2026, 1, 1, 12, tzinfo=timezone.utc).timestamp()
+    app = types.SimpleNamespace(scheduler=DeadlineScheduler(), get_now_ts=lambda: now)
+    monitor = SensorMonitor(app, "sensor.kitchen_temperature", "Kitchen", 6 * 3600, True, None, None, listen=False)
+    monitor.seed({"state": "21.5", "last_changed": "2026-01-01T10:00:00+00:00"}, now)
+    assert monitor.previous_value == monitor.current_value == "21.5"
+    # The deadline counts from the last change, not from the discovery
+    assert monitor.deadlines["stale"] == now + 4 * 3600
+
+    # Unchanged for longer than check_interval: due right away
+    monitor.seed({"state": "21.5", "last_changed": "2026-01-01T02:00:00+00:00"}, now)
+    assert monitor.deadlines["stale"] == now
+
+    unavailable = SensorMonitor(app, "sensor.cellar_humidity", "Cellar", 6 * 3600, True, None, None, listen=False)
+    unavailable.seed({"state": "unavailable", "last_changed": "2026-01-01T10:00:00+00:00"}, now)
+    assert unavailable.previous_value is None
+    assert unavailable.deadlines["unavailable"] == now + unavailable.unavailable_check_interval